@@ -0,0 +1,229 @@
+# Compact binary encoding of Expr ASTs
+'''
+dump_ast() turns an Expr into bytes and load_ast() turns them back into an
+equal Expr, so a program can be parsed once (e.g. at upload time) and
+stored. Unlike pickle, loading only ever builds interp Expr nodes, so it is
+safe on bytes from untrusted storage: anything malformed raises
+AstFormatError.
+
+Layout (all integers are LEB128 varints, signed ones zigzag-encoded first):
+
+    b'EXPR' version
+    string table     count, then (byte length, UTF-8 bytes) per string
+    pitch table      the same, for Note pitches
+    node count
+    nodes            in post-order, each an opcode byte followed by its
+                     inline fields (string/pitch indices, ints, list lengths)
+
+Post-order means a node's sub-expressions come right before it, so the
+loader is a single loop over a value stack (no recursion, however deep the
+tree) and each opcode pops exactly the children it needs.
+
+Opcodes are part of the format: never renumber them, only add new ones,
+and bump VERSION for any change older loaders can't read.
+'''
+from dataclasses import fields
+
+from interp import Expr, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, Name, Eq, Neq, Lt, \
+    LorE, Gt, GorE, If, Ifnz, Letfun, App, Assign, Seq, Block, Import, Show, Read, Note, Tune, \
+    ConcatTunes, Transpose, Repeat, Volume, Track
+
+MAGIC = b'EXPR'
+VERSION = 1
+
+class AstFormatError(ValueError):
+    pass
+
+# ----- Schema ----- #
+# field kinds: 'e' sub-expression, 'l' list of sub-expressions, 's' string,
+# 'p' pitch, 'i' int
+
+_LIT_INT, _LIT_TRUE, _LIT_FALSE = 1, 2, 3
+_SCHEMA: dict[type, tuple[int, str]] = {
+    Add: (4, 'ee'), Sub: (5, 'ee'), Mul: (6, 'ee'), Div: (7, 'ee'), Neg: (8, 'e'),
+    And: (9, 'ee'), Or: (10, 'ee'), Not: (11, 'e'),
+    Let: (12, 'see'), Name: (13, 's'),
+    Eq: (14, 'ee'), Neq: (15, 'ee'), Lt: (16, 'ee'), LorE: (17, 'ee'), Gt: (18, 'ee'), GorE: (19, 'ee'),
+    If: (20, 'eee'), Ifnz: (21, 'eee'),
+    Letfun: (22, 'ssee'), App: (23, 'ee'), Assign: (24, 'se'),
+    Seq: (25, 'ee'), Block: (26, 'l'), Show: (27, 'e'), Read: (28, ''),
+    Note: (29, 'pei'), Tune: (30, 'le'), ConcatTunes: (31, 'ee'), Transpose: (32, 'ee'),
+    Repeat: (33, 'ee'), Volume: (34, 'ee'), Track: (35, 'l'), Import: (36, 's'),
+}
+_DECODE: dict[int, tuple[type, str]] = {op: (cls, kinds) for cls, (op, kinds) in _SCHEMA.items()}
+_FIELDS: dict[type, tuple[str, ...]] = {cls: tuple(f.name for f in fields(cls)) for cls in _SCHEMA}
+
+# ----- Encoding ----- #
+
+def _varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _zigzag(n: int) -> int:
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def dump_ast(expr: Expr) -> bytes:
+    '''Encodes expr in the binary format'''
+    body = bytearray()
+    strings: dict[str, int] = {}
+    pitches: dict[str, int] = {}
+    count = 0
+    stack: list[tuple[object, bool]] = [(expr, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if isinstance(node, Lit):
+            v = node.value
+            if v is True or v is False:
+                body.append(_LIT_TRUE if v else _LIT_FALSE)
+            elif isinstance(v, int):
+                body.append(_LIT_INT)
+                _varint(body, _zigzag(v))
+            else:
+                raise TypeError(f"can't encode literal {v!r}")
+            count += 1
+            continue
+        entry = _SCHEMA.get(type(node))
+        if entry is None:
+            raise TypeError(f"can't encode {type(node).__name__} {node!r}")
+        op, kinds = entry
+        values = [getattr(node, name) for name in _FIELDS[type(node)]]
+        if not expanded:
+            # children go first, in field order, so push them in reverse
+            stack.append((node, True))
+            for kind, value in zip(reversed(kinds), reversed(values)):
+                if kind == 'e':
+                    stack.append((value, False))
+                elif kind == 'l':
+                    stack.extend((item, False) for item in reversed(value))
+            continue
+        body.append(op)
+        for kind, value in zip(kinds, values):
+            match kind:
+                case 's':
+                    _varint(body, strings.setdefault(value, len(strings)))
+                case 'p':
+                    _varint(body, pitches.setdefault(value, len(pitches)))
+                case 'i':
+                    _varint(body, _zigzag(value))
+                case 'l':
+                    _varint(body, len(value))
+        count += 1
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    for table in (strings, pitches):
+        _varint(out, len(table))
+        for s in table:   # dicts keep insertion order, i.e. index order
+            data = s.encode('utf-8')
+            _varint(out, len(data))
+            out += data
+    _varint(out, count)
+    out += body
+    return bytes(out)
+
+# ----- Decoding ----- #
+
+class _Reader:
+    __slots__ = ('data', 'pos')
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def varint(self) -> int:
+        data, pos = self.data, self.pos
+        n = shift = 0
+        try:
+            while True:
+                b = data[pos]
+                pos += 1
+                n |= (b & 0x7f) << shift
+                if b < 0x80:
+                    break
+                shift += 7
+        except IndexError:
+            raise AstFormatError("truncated data") from None
+        self.pos = pos
+        return n
+
+    def table(self) -> list[str]:
+        items = []
+        for _ in range(self.varint()):
+            n = self.varint()
+            chunk = self.data[self.pos:self.pos + n]
+            if len(chunk) != n:
+                raise AstFormatError("truncated data")
+            try:
+                items.append(chunk.decode('utf-8'))
+            except UnicodeDecodeError:
+                raise AstFormatError("bad string in table") from None
+            self.pos += n
+        return items
+
+def load_ast(data: bytes) -> Expr:
+    '''Decodes bytes made by dump_ast() back into an Expr'''
+    if data[:4] != MAGIC:
+        raise AstFormatError("not an encoded AST")
+    if len(data) < 5 or data[4] != VERSION:
+        raise AstFormatError(f"unsupported AST format version {data[4:5].hex() or 'none'}")
+    r = _Reader(data)
+    r.pos = 5
+    strings = r.table()
+    pitches = r.table()
+    count = r.varint()
+    stack: list[Expr] = []
+    try:
+        for _ in range(count):
+            op = data[r.pos]
+            r.pos += 1
+            if op == _LIT_INT:
+                n = r.varint()
+                stack.append(Lit(n >> 1 if not n & 1 else -((n + 1) >> 1)))
+                continue
+            if op == _LIT_TRUE or op == _LIT_FALSE:
+                stack.append(Lit(op == _LIT_TRUE))
+                continue
+            cls, kinds = _DECODE[op]
+            inline = []
+            need = 0
+            for kind in kinds:
+                match kind:
+                    case 'e':
+                        need += 1
+                    case 'l':
+                        n = r.varint()
+                        inline.append(n)
+                        need += n
+                    case 's':
+                        inline.append(strings[r.varint()])
+                    case 'p':
+                        inline.append(pitches[r.varint()])
+                    case 'i':
+                        n = r.varint()
+                        inline.append(n >> 1 if not n & 1 else -((n + 1) >> 1))
+            if need > len(stack):
+                raise AstFormatError(f"{cls.__name__} is missing sub-expressions")
+            children = stack[len(stack) - need:]
+            del stack[len(stack) - need:]
+            args = []
+            c = i = 0
+            for kind in kinds:
+                if kind == 'e':
+                    args.append(children[c])
+                    c += 1
+                elif kind == 'l':
+                    n = inline[i]
+                    args.append(tuple(children[c:c + n]))
+                    c += n
+                    i += 1
+                else:
+                    args.append(inline[i])
+                    i += 1
+            stack.append(cls(*args))
+    except (IndexError, KeyError):
+        raise AstFormatError("corrupt AST data") from None
+    if r.pos != len(data):
+        raise AstFormatError("trailing data after AST")
+    if len(stack) != 1:
+        raise AstFormatError("AST data doesn't hold exactly one expression")
+    return stack[0]
@@ -0,0 +1,86 @@
+# Benchmark: memory of a 1M-note AST, slotted vs. plain dataclass nodes vs. flat
+'''
+Builds the AST of `tune [ note ... for k seconds, ... ] (1)` with a million
+notes twice: once with interp's node classes (frozen, __slots__) and once
+with plain @dataclass copies of Tune, Note and Lit that keep a __dict__
+per instance, as the nodes used to. Prints the memory each tree takes
+(measured with tracemalloc) and how long building and evaluating take.
+Then does the same for the tree as a flat_ast.FlatAst, and times a full
+gc.collect() while each form of the program is alive.
+
+    python bench_ast_memory.py [notes]
+'''
+from dataclasses import dataclass
+import gc
+import sys
+import time
+import tracemalloc
+
+from flat_ast import to_flat, eval_flat
+
+from interp import Expr, Tune, Note, Lit, evalInEnv
+
+PITCHES = ['C4', 'D4', 'E4', 'F4', 'G4', 'A4', 'B4', 'R']
+
+@dataclass
+class PlainLit:
+    value: int | bool
+
+@dataclass
+class PlainNote:
+    pitch: str
+    duration: Expr
+    volume: int = 100
+
+@dataclass
+class PlainTune:
+    notes: list
+    instrument: Expr
+
+def build(tune, note, lit, n: int):
+    # one Lit per note, as the parser builds for `note X for k seconds`
+    return tune([note(PITCHES[i % len(PITCHES)], lit(i % 4 + 1)) for i in range(n)], lit(1))
+
+def measure(label: str, tune, note, lit, n: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    ast = build(tune, note, lit, n)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>8}: {size / 2**20:7.1f} MiB  {size / n:6.1f} bytes/note  built in {elapsed:.2f}s")
+    return ast, size
+
+def main(n: int):
+    print(f"AST of a {n:,}-note tune")
+    _, plain = measure("plain", PlainTune, PlainNote, PlainLit, n)
+    ast, slotted = measure("slotted", Tune, Note, Lit, n)
+    print(f"slotted nodes use {slotted / plain:.0%} of the memory ({plain / slotted:.1f}x less)")
+    start = time.perf_counter()
+    evalInEnv((), ast)
+    print(f"evalInEnv on the slotted tree: {time.perf_counter() - start:.2f}s")
+
+    tracemalloc.start()
+    flat = to_flat(ast)
+    flat_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'flat':>8}: {flat_size / 2**20:7.1f} MiB  {flat_size / n:6.1f} bytes/note"
+          f"  ({slotted / flat_size:.1f}x less than slotted)")
+    start = time.perf_counter()
+    eval_flat(flat)
+    print(f"eval_flat on the flat program: {time.perf_counter() - start:.2f}s")
+
+    tree_pause = gc_pause()
+    del ast
+    flat_pause = gc_pause()
+    print(f"gc.collect() with the tree alive: {tree_pause * 1000:.1f}ms, "
+          f"with only the flat program: {flat_pause * 1000:.1f}ms")
+
+def gc_pause() -> float:
+    gc.collect()
+    start = time.perf_counter()
+    gc.collect()
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
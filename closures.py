@@ -0,0 +1,179 @@
+# Closure compilation: an Expr turned into nested Python functions
+'''
+compile_expr() walks an Expr once and returns, for every node, a Python
+function of the environment that computes the node's value. Each function
+holds the functions of its children, so running the program is plain
+calls, with none of evalInEnv's matching on the node's type at every visit
+(or at every call of a recursive letfun).
+
+    code = compile_expr(parse_to_ast(source))
+    code(emptyEnv)
+
+or run(expr, engine='closure'). The operators are interp's functions on
+values, so results and EvalErrors are the same as evalInEnv's, and an error
+is raised when the faulty node runs, not when it is compiled. A function a
+compiled program defines is a Closure whose body is its compiled code.
+'''
+from typing import Callable
+
+from interp import Expr, Env, Loc, Value, EvalError, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, \
+    Name, Eq, Neq, Lt, LorE, Gt, GorE, If, Ifnz, Letfun, App, Assign, Seq, Block, Import, Show, Read, \
+    Note, Tune, ConcatTunes, Transpose, Repeat, Volume, Track, extendEnv, newLoc, setLoc, bindLetfun, \
+    evalInEnv, evalStatement, addValues, subValues, mulValues, divValues, negValue, boolOperand, eqValues, \
+    neqValues, ltValues, loreValues, gtValues, goreValues, ifCondition, ifnzCondition, ifnzResult, \
+    lookupValue, callee, callEnv, assignableLoc, showValue, readValue, checkPitch, noteValue, \
+    tuneInstrument, checkTuneItem, concatValues, checkTransposable, transposeSteps, TransposeNote, \
+    repeatValue, volumeValue, trackValue
+
+type Code = Callable[[Env[Loc[Value]]], Value]
+
+# operators that only combine their operands' values
+_BINARY: dict[type, Callable[[Value, Value], Value]] = {
+    Add: addValues, Sub: subValues, Mul: mulValues, Div: divValues,
+    Eq: eqValues, Neq: neqValues, Lt: ltValues, LorE: loreValues, Gt: gtValues, GorE: goreValues,
+    ConcatTunes: concatValues, Repeat: repeatValue, Volume: volumeValue,
+}
+
+def compile_expr(expr: Expr) -> Code:
+    '''The function of an environment that evaluates expr in it'''
+    op = _BINARY.get(type(expr))
+    if op is not None:
+        left, right = (compile_expr(getattr(expr, f)) for f in expr.__match_args__)
+        return lambda env: op(left(env), right(env))
+
+    match expr:
+        case Lit(v):
+            return lambda env: v
+
+        case Neg(e):
+            e = compile_expr(e)
+            return lambda env: negValue(e(env))
+
+        case And(l, r):
+            l, r = compile_expr(l), compile_expr(r)
+            return lambda env: boolOperand(l(env), "And") and boolOperand(r(env), "And")
+
+        case Or(l, r):
+            l, r = compile_expr(l), compile_expr(r)
+            return lambda env: boolOperand(l(env), "Or") or boolOperand(r(env), "Or")
+
+        case Not(e):
+            e = compile_expr(e)
+            return lambda env: not boolOperand(e(env), "Not")
+
+        case Name(name):
+            return lambda env: lookupValue(env, name)
+
+        case Let(name, defn, body):
+            defn, body = compile_expr(defn), compile_expr(body)
+            def let(env):
+                if name == "":
+                    raise EvalError("Name cannot be empty")
+                if not isinstance(name, str):
+                    raise EvalError("Name must be a string")
+                return body(extendEnv(name, newLoc(defn(env)), env))
+            return let
+
+        case If(c, t, e):
+            c, t, e = compile_expr(c), compile_expr(t), compile_expr(e)
+            return lambda env: t(env) if ifCondition(c(env)) else e(env)
+
+        case Ifnz(c, t, e):
+            c, t, e = compile_expr(c), compile_expr(t), compile_expr(e)
+            def ifnz(env):
+                if ifnzCondition(c(env)):
+                    return ifnzResult(t(env), "then")
+                return ifnzResult(e(env), "else")
+            return ifnz
+
+        case Letfun(n, p, b, i):
+            b, i = compile_expr(b), compile_expr(i)
+            return lambda env: i(bindLetfun(env, n, p, b))
+
+        case App(f, a):
+            f, a = compile_expr(f), compile_expr(a)
+            def app(env):
+                fun = callee(f(env))
+                newEnv = callEnv(fun, a(env))
+                if callable(fun.body):
+                    return fun.body(newEnv)
+                return evalInEnv(newEnv, fun.body)   # e.g. a function from an imported module
+            return app
+
+        case Assign(n, e1):
+            e1 = compile_expr(e1)
+            def assign(env):
+                loc = assignableLoc(env, n)
+                v = e1(env)
+                setLoc(loc, v)
+                return v
+            return assign
+
+        case Seq(e1, e2):
+            e1, e2 = compile_expr(e1), compile_expr(e2)
+            return lambda env: (e1(env), e2(env))[1]
+
+        case Block(stmts):
+            # an import is left to evalStatement, as it changes the environment
+            parts = [(stmt, None) if isinstance(stmt, Import) else (stmt, compile_expr(stmt)) for stmt in stmts]
+            def block(env):
+                v = None
+                for stmt, code in parts:
+                    if code is None:
+                        env, v = evalStatement(env, stmt)
+                    else:
+                        v = code(env)
+                return v
+            return block
+
+        case Import():
+            return lambda env: evalStatement(env, expr)[1]
+
+        case Show(e):
+            e = compile_expr(e)
+            return lambda env: showValue(e(env))
+
+        case Read():
+            return lambda env: readValue()
+
+        # ----- Domain-specific extension (Tunes) ----- #
+        case Note(name, d, volume):
+            d = compile_expr(d)
+            def note(env):
+                checkPitch(name)
+                return noteValue(name, d(env), volume)
+            return note
+
+        case Tune(n, ins) if isinstance(n, tuple):
+            ins = compile_expr(ins)
+            items = [(type(note), compile_expr(note)) for note in n]
+            def tune(env):
+                instrument = tuneInstrument(ins(env))
+                result = []
+                for kind, code in items:
+                    checkTuneItem(kind)
+                    result.append(code(env))
+                return Tune(tuple(result), instrument - 1)
+            return tune
+
+        case Tune():
+            def bad_tune(env):
+                raise EvalError("Tunes must be a list of notes")
+            return bad_tune
+
+        case Transpose(t, s):
+            kind, t, s = type(t), compile_expr(t), compile_expr(s)
+            def transpose(env):
+                checkTransposable(kind)
+                steps = transposeSteps(s(env))
+                return TransposeNote(t(env), steps)
+            return transpose
+
+        case Track(t):
+            t = [compile_expr(e) for e in t]
+            return lambda env: trackValue([e(env) for e in t])
+
+        case _:
+            def unknown(env):
+                raise EvalError(f"unknown expression: {expr}")
+            return unknown
@@ -0,0 +1,370 @@
+# Compiling Expr programs to Python code objects
+'''
+lower() turns an Expr into a Python ast.Module that defines one function,
+__program__(_env), returning the program's value:
+
+    let x = 5 in x := x + 1; x end            ->   ((x_1 := 5), (x_1 := ...), x_1)[-1]
+    letfun f(n) = ... in f(3) end             ->   def f_fn_2(n_3): return ...
+                                                   f_1 = Closure('n', f_fn_2, ())
+                                                   ... f_fn_2(3) ...
+    if c then t else e                        ->   (t if ifCondition(c) else e)
+
+Every binding gets its own Python name, so shadowing needs no bookkeeping,
+and since a Python function shares its outer variables rather than copying
+them, an Assign is seen by every function that uses the name, as with
+interp's Locs. The operators and music nodes become calls to interp's
+functions on values (the runtime helpers in RUNTIME), so results and
+EvalErrors are the same as evalInEnv's. A name with no binding in the
+program (e.g. one from an import) is looked up in _env at run time, and so
+is a let or letfun name read after an import in its scope, which may
+shadow it (see importedOr).
+
+compile_program() compiles the module with compile(), and code_cache keeps
+the code objects keyed by a hash of the AST (see vm.BytecodeCache), so a
+batch that renders the same program many times compiles it once:
+
+    execute(code_cache.compile(expr))
+
+or run(expr, engine='python'). Python's own compiler limits how deeply a
+program can nest (around a hundred levels of parentheses).
+'''
+import ast
+import keyword
+import re
+from types import CodeType
+
+from interp import Expr, Env, Loc, Value, EvalError, Closure, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, \
+    Name, Eq, Neq, Lt, LorE, Gt, GorE, If, Ifnz, Letfun, App, Assign, Seq, Block, Import, Show, Read, Note, \
+    Tune, ConcatTunes, Transpose, Repeat, Volume, Track, emptyEnv, lookupEnv, getLoc, setLoc, evalInEnv, \
+    evalStatement, callEnv, addValues, subValues, mulValues, divValues, negValue, boolOperand, eqValues, \
+    neqValues, ltValues, loreValues, gtValues, goreValues, ifCondition, ifnzCondition, ifnzResult, lookupValue, \
+    callee, assignableLoc, showValue, readValue, checkPitch, noteValue, tuneInstrument, checkTuneItem, \
+    concatValues, checkTransposable, transposeSteps, TransposeNote, repeatValue, volumeValue, trackValue
+from vm import BytecodeCache
+
+# ----- Runtime helpers ----- #
+
+def call(fun: Closure, arg: Value) -> Value:
+    if callable(fun.body):
+        return fun.body(arg)
+    return evalInEnv(callEnv(fun, arg), fun.body)   # e.g. a function from an imported module
+
+def assignable(value: Value, name: str) -> None:
+    '''Raises the error of assigning to name, bound to value, if it is a function'''
+    if isinstance(value, Closure):
+        raise EvalError(f"cannot assign to function name {name}")
+
+def assignLoc(loc: Loc[Value], value: Value) -> Value:
+    setLoc(loc, value)
+    return value
+
+def imported(env: Env[Loc[Value]], outer: Env[Loc[Value]], name: str) -> Loc[Value] | None:
+    '''Where the imports that extended outer to env bound name, if they did'''
+    return lookupEnv(name, env[:len(env) - len(outer)])
+
+def importedOr(env: Env[Loc[Value]], outer: Env[Loc[Value]], name: str, value: Value) -> Value:
+    loc = imported(env, outer, name)
+    return value if loc is None else getLoc(loc)
+
+def importModule(env: Env[Loc[Value]], path: str) -> Env[Loc[Value]]:
+    return evalStatement(env, Import(path))[0]
+
+def importValue(env: Env[Loc[Value]], path: str) -> Value:
+    return evalStatement(env, Import(path))[1]
+
+def fail(message: str):
+    raise EvalError(message)
+
+def tune(instrument: int, items: tuple[Value, ...]) -> Tune:
+    return Tune(items, instrument - 1)
+
+def transpose(steps: int, tune: Value) -> Tune:
+    return TransposeNote(tune, steps)
+
+RUNTIME = {f.__name__: f for f in [
+    call, assignable, assignLoc, imported, importedOr, importModule, importValue, fail, tune, transpose,
+    addValues, subValues, mulValues, divValues, negValue, boolOperand, eqValues, neqValues, ltValues,
+    loreValues, gtValues, goreValues, ifCondition, ifnzCondition, ifnzResult, lookupValue, callee,
+    assignableLoc, showValue, readValue, noteValue, tuneInstrument, concatValues, transposeSteps,
+    repeatValue, volumeValue, trackValue]}
+RUNTIME['Closure'] = Closure
+
+_BINARY = {Add: 'addValues', Sub: 'subValues', Mul: 'mulValues', Div: 'divValues', Eq: 'eqValues',
+           Neq: 'neqValues', Lt: 'ltValues', LorE: 'loreValues', Gt: 'gtValues', GorE: 'goreValues',
+           ConcatTunes: 'concatValues', Repeat: 'repeatValue', Volume: 'volumeValue'}
+
+# ----- Lowering ----- #
+
+def _const(value) -> ast.expr:
+    return ast.Constant(value)
+
+def _load(name: str) -> ast.expr:
+    return ast.Name(name, ast.Load())
+
+def _call(fn: str, *args: ast.expr) -> ast.expr:
+    return ast.Call(_load(fn), list(args), [])
+
+def _walrus(name: str, value: ast.expr) -> ast.expr:
+    return ast.NamedExpr(ast.Name(name, ast.Store()), value)
+
+def _last(*exprs: ast.expr) -> ast.expr:
+    '''Evaluates exprs in order, giving the value of the last one'''
+    return ast.Subscript(ast.Tuple(list(exprs), ast.Load()), _const(-1), ast.Load())
+
+class _Function:
+    '''A Python function being generated: its hoisted defs, the names it
+    binds and the outer names it assigns to'''
+    def __init__(self, params: list[str]):
+        self.defs: list[ast.stmt] = []
+        self.bound: set[str] = set(params)
+        self.nonlocals: set[str] = set()
+
+class _Binding:
+    def __init__(self, pyname: str, depth: int, function: str | None = None):
+        self.pyname = pyname
+        self.depth = depth         # its index in _Lowering.scopes
+        self.function = function   # a letfun's def, called directly
+
+class _Lowering:
+    def __init__(self):
+        self.count = 0
+        self.scopes: list[tuple[str, _Binding]] = []   # innermost last
+        self.functions: list[_Function] = []
+        # (_env saved at the start of a Block, len(scopes) there) for the
+        # Blocks that have imported something so far, outermost first
+        self.imports: list[tuple[str, int]] = []
+
+    def fresh(self, name: str) -> str:
+        self.count += 1
+        safe = re.sub(r'\W', '_', name)
+        return f"{safe}_{self.count}" if safe.isidentifier() and not keyword.iskeyword(safe) else f"v_{self.count}"
+
+    def resolve(self, name: str) -> _Binding | None:
+        for n, binding in reversed(self.scopes):
+            if n == name:
+                return binding
+        return None
+
+    def push(self, name: str, pyname: str, function: str | None = None) -> None:
+        self.scopes.append((name, _Binding(pyname, len(self.scopes), function)))
+
+    def imported_since(self, binding: _Binding) -> str | None:
+        '''The saved _env of the outermost Block that imported something in
+        binding's scope: a name imported since then shadows binding'''
+        for saved, depth in self.imports:
+            if depth > binding.depth:
+                return saved
+        return None
+
+    def load(self, name: str, binding: _Binding) -> ast.expr:
+        saved = self.imported_since(binding)
+        if saved is None:
+            return _load(binding.pyname)
+        return _call('importedOr', _load('_env'), _load(saved), _const(name), _load(binding.pyname))
+
+    def bind(self, pyname: str) -> None:
+        self.functions[-1].bound.add(pyname)
+
+    def assign(self, pyname: str, value: ast.expr) -> ast.expr:
+        if pyname not in self.functions[-1].bound:
+            self.functions[-1].nonlocals.add(pyname)
+        return _walrus(pyname, value)
+
+    def function(self, name: str, params: list[str], body: Expr) -> ast.FunctionDef:
+        '''def name(*params): return body, with its own hoisted defs'''
+        self.functions.append(_Function(params))
+        result = self.expr(body)
+        f = self.functions.pop()
+        stmts: list[ast.stmt] = []
+        if f.nonlocals:
+            stmts.append(ast.Nonlocal(sorted(f.nonlocals)))
+        stmts += f.defs
+        stmts.append(ast.Return(result))
+        args = ast.arguments([], [ast.arg(p) for p in params], None, [], [], None, [])
+        return ast.FunctionDef(name, args, stmts, [], None)
+
+    def assign_global(self, name: str, value: Expr) -> ast.expr:
+        '''name := value for a name bound in _env: like evalInEnv, finds it
+        (or raises) before evaluating value'''
+        loc = self.fresh("loc")
+        self.bind(loc)
+        return _last(_walrus(loc, _call('assignableLoc', _load('_env'), _const(name))),
+                     _call('assignLoc', _load(loc), self.expr(value)))
+
+    def fail_with(self, check, *args) -> ast.expr | None:
+        '''A call raising check's error, if check(*args) fails now'''
+        try:
+            check(*args)
+        except EvalError as e:
+            return _call('fail', _const(str(e)))
+        return None
+
+    def expr(self, expr: Expr) -> ast.expr:
+        fn = _BINARY.get(type(expr))
+        if fn is not None:
+            left, right = (getattr(expr, f) for f in expr.__match_args__)
+            return _call(fn, self.expr(left), self.expr(right))
+
+        match expr:
+            case Lit(v):
+                return _const(v)
+
+            case Neg(e):
+                return _call('negValue', self.expr(e))
+
+            case Not(e):
+                return ast.UnaryOp(ast.Not(), _call('boolOperand', self.expr(e), _const("Not")))
+
+            case And(l, r) | Or(l, r):
+                op = "And" if isinstance(expr, And) else "Or"
+                return ast.BoolOp(ast.And() if op == "And" else ast.Or(),
+                                  [_call('boolOperand', self.expr(l), _const(op)),
+                                   _call('boolOperand', self.expr(r), _const(op))])
+
+            case Name(name):
+                binding = self.resolve(name)
+                if binding is None:
+                    return _call('lookupValue', _load('_env'), _const(name))
+                return self.load(name, binding)
+
+            case Let(name, defn, body):
+                if name == "":
+                    return _call('fail', _const("Name cannot be empty"))
+                if not isinstance(name, str):
+                    return _call('fail', _const("Name must be a string"))
+                value = self.expr(defn)
+                pyname = self.fresh(name)
+                self.bind(pyname)
+                self.push(name, pyname)
+                result = self.expr(body)
+                self.scopes.pop()
+                return _last(_walrus(pyname, value), result)
+
+            case If(c, t, e):
+                return ast.IfExp(_call('ifCondition', self.expr(c)), self.expr(t), self.expr(e))
+
+            case Ifnz(c, t, e):
+                return ast.IfExp(_call('ifnzCondition', self.expr(c)),
+                                 _call('ifnzResult', self.expr(t), _const("then")),
+                                 _call('ifnzResult', self.expr(e), _const("else")))
+
+            case Letfun(n, p, b, i):
+                pyname, fname, param = self.fresh(n), self.fresh(n + "_fn"), self.fresh(p)
+                self.bind(pyname)
+                self.bind(fname)
+                self.push(n, pyname, fname)
+                self.push(p, param)
+                definition = self.function(fname, [param], b)
+                self.scopes.pop()
+                # the def can come first in the enclosing function, as it only
+                # refers to variables, which Python looks up when it runs
+                self.functions[-1].defs += [
+                    definition,
+                    ast.Assign([ast.Name(pyname, ast.Store())],
+                               _call('Closure', _const(p), _load(fname), ast.Tuple([], ast.Load()))),
+                ]
+                result = self.expr(i)
+                self.scopes.pop()
+                return result
+
+            case App(f, a):
+                if isinstance(f, Name):
+                    binding = self.resolve(f.varname)
+                    if binding is not None and binding.function is not None and \
+                            self.imported_since(binding) is None:
+                        return _call(binding.function, self.expr(a))
+                return _call('call', _call('callee', self.expr(f)), self.expr(a))
+
+            case Assign(n, e1):
+                binding = self.resolve(n)
+                if binding is None:
+                    return self.assign_global(n, e1)
+                if binding.function is not None:
+                    local = _call('fail', _const(f"cannot assign to function name {n}"))
+                else:
+                    local = _last(_call('assignable', _load(binding.pyname), _const(n)),
+                                  self.assign(binding.pyname, self.expr(e1)))
+                saved = self.imported_since(binding)
+                if saved is None:
+                    return local
+                found = _call('imported', _load('_env'), _load(saved), _const(n))
+                return ast.IfExp(ast.Compare(found, [ast.IsNot()], [_const(None)]), self.assign_global(n, e1), local)
+
+            case Seq(e1, e2):
+                return _last(self.expr(e1), self.expr(e2))
+
+            case Block(stmts):
+                if not any(isinstance(stmt, Import) for stmt in stmts):
+                    return _last(*[self.expr(stmt) for stmt in stmts])
+                # imports extend _env for the rest of the Block only, and
+                # shadow the let/letfun names bound outside it
+                saved = self.fresh("env")
+                self.bind(saved)
+                parts = [_walrus(saved, _load('_env'))]
+                marks = len(self.imports)
+                for stmt in stmts:
+                    if isinstance(stmt, Import):
+                        parts.append(self.assign('_env', _call('importModule', _load('_env'), _const(stmt.path))))
+                        parts.append(_const(True))
+                        if len(self.imports) == marks:
+                            self.imports.append((saved, len(self.scopes)))
+                    else:
+                        parts.append(self.expr(stmt))
+                del self.imports[marks:]
+                result = self.fresh("result")
+                self.bind(result)
+                parts[-1] = _walrus(result, parts[-1])
+                parts += [self.assign('_env', _load(saved)), _load(result)]
+                return _last(*parts)
+
+            case Import(path):
+                return _call('importValue', _load('_env'), _const(path))
+
+            case Show(e):
+                return _call('showValue', self.expr(e))
+
+            case Read():
+                return _call('readValue')
+
+            # ----- Domain-specific extension (Tunes) ----- #
+            case Note(name, d, volume):
+                return self.fail_with(checkPitch, name) or \
+                    _call('noteValue', _const(name), self.expr(d), _const(volume))
+
+            case Tune(n, ins):
+                if not isinstance(n, tuple):
+                    return _call('fail', _const("Tunes must be a list of notes"))
+                items = []
+                for note in n:
+                    failure = self.fail_with(checkTuneItem, type(note))
+                    items.append(failure or self.expr(note))
+                    if failure:
+                        break
+                return _call('tune', _call('tuneInstrument', self.expr(ins)), ast.Tuple(items, ast.Load()))
+
+            case Transpose(t, s):
+                return self.fail_with(checkTransposable, type(t)) or \
+                    _call('transpose', _call('transposeSteps', self.expr(s)), self.expr(t))
+
+            case Track(t):
+                return _call('trackValue', ast.List([self.expr(e) for e in t], ast.Load()))
+
+            case _:
+                return _call('fail', _const(f"unknown expression: {expr}"))
+
+def lower(expr: Expr) -> ast.Module:
+    '''A module defining __program__(_env), which returns the value of expr in _env'''
+    program = _Lowering().function('__program__', ['_env'], expr)
+    return ast.fix_missing_locations(ast.Module([program], []))
+
+def compile_program(expr: Expr) -> CodeType:
+    '''The code object of lower(expr)'''
+    return compile(lower(expr), '<program>', 'exec')
+
+def execute(code: CodeType, env: Env[Loc[Value]] = emptyEnv) -> Value:
+    '''Runs a program compiled by compile_program in env'''
+    namespace = dict(RUNTIME)
+    exec(code, namespace)
+    return namespace['__program__'](env)
+
+code_cache = BytecodeCache(compiler=compile_program)
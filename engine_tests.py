@@ -0,0 +1,125 @@
+# programs and checks shared by the tests of the evaluation engines
+'''
+Every engine (closures, the VM, generated Python, resolved frames, the
+stack machine, and the optimizer and flat ASTs in front of the tree
+evaluator) must give the tree evaluator's values and error messages. A
+test module mixes these into its own TestCases and names its engine:
+
+    class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+        engine = 'vm'
+
+    class TestVM(engine_tests.SameAsTree, unittest.TestCase):
+        engine = 'vm'
+
+engine is an evaluate() engine name, or a function from an Expr to its
+value for a pipeline that isn't one (wrap it in staticmethod).
+'''
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+import os
+import tempfile
+from unittest import mock
+
+with redirect_stdout(None), redirect_stderr(None):
+    import interp
+    from interp import EvalError, Lit, Add, Sub, Neg, Not, Let, Name, Eq, If, Ifnz, Letfun, App, Assign, Seq, \
+        Block, Import, Show, Read, Note, Tune, ConcatTunes, Transpose, Repeat, Volume, Track, evaluate
+    from parse_run import parse_to_ast, cooking, drums, octave_four
+
+
+PROGRAMS = [
+    "1 + 2 * 3 - 8 / 2",
+    "-(4) + 2147483647 * 3",
+    "let x = 5 in x := x + 1; x end",
+    "letfun fact(n) = if n == 0 then 1 else n * fact(n - 1) in fact(25) end",
+    # Ifnz has no syntax
+    Letfun("f", "n", Ifnz(Name("n"), App(Name("f"), Sub(Name("n"), Lit(1))), Lit(7)), App(Name("f"), Lit(30))),
+    "true && false || !false",
+    "1 < 2 && 2 <= 2 && 3 > 2 && 3 >= 4",
+    "tune [ note C4 for 1 seconds, repeat(note D4 for 2 seconds, 3), volume(note E4 for 1 seconds, 90) ] (1) == "
+    "tune [ note C4 for 1 seconds ] (1)",
+    "tune [ notes \"C4:1 D4:2 R:1\" ] (3) ++ tune [ note G4 for 1 seconds ] (4)",
+    "let t = tune [ note C4 for 1 seconds ] (1) in transpose tune [ ] (t == t) by 2 end",
+    "x; y; (a; b)",
+]
+
+ERRORS = [
+    "1 + true",
+    "4 / 0",
+    "y",
+    "1(2)",
+    "letfun f(n) = n in f := 2 end",
+    "if 1 then 2 else 3",
+    Ifnz(Lit(1), Tune((Note("C4", Lit(1)),), Lit(1)), Lit(0)),
+    "tune [ note C4 for 0 seconds ] (1)",
+    "tune [ note C4 for 1 seconds ] (200)",
+    "volume(note C4 for 1 seconds, 300)",
+    "y := -n",   # the name is looked up before the value is worked out
+]
+
+SONGS = [cooking, drums, octave_four]
+
+# one of each node type, for the AST encodings
+EVERY_NODE = Block((
+    Import("lib/drums.tune"),
+    Let("x", Lit(-5), Seq(Assign("x", Sub(Name("x"), Lit(2**70))), Show(Neg(Name("x"))))),
+    Letfun("f", "n", If(Eq(Name("n"), Lit(0)), Lit(True), Not(Lit(False))), App(Name("f"), Read())),
+    Ifnz(Lit(1), Add(Lit(1), Lit(1)), Lit(0)),
+    Track((
+        Tune((Note("C#4", Lit(1)), Note("R", Lit(2), 0),
+              Repeat(Note("C#4", Lit(1), 127), Lit(3)), Volume(Note("D4", Lit(1)), Lit(90))), Lit(1)),
+        Transpose(Tune((), Lit(2)), Neg(Lit(1))),
+        ConcatTunes(Tune((Note("E4", Name("d")),), Lit(3)), Tune((), Lit(4))),
+    )),
+))
+
+
+def ast_of(program):
+    return parse_to_ast(program) if isinstance(program, str) else program
+
+
+def outcome(engine, expr):
+    '''What running expr on engine gives: its value, or ("EvalError", message)'''
+    try:
+        return engine(expr) if callable(engine) else evaluate(expr, engine)
+    except EvalError as e:
+        return ("EvalError", str(e))
+
+
+@contextmanager
+def no_viewer():
+    '''show writes its MIDI file to a temporary directory and doesn't open it
+    (os.startfile is Windows only) or print'''
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(None), \
+            mock.patch.object(interp, 'FILENAME', os.path.join(tmp, 'out.midi')), \
+            mock.patch.object(interp.os, 'startfile', create=True) as startfile:
+        yield startfile
+
+
+class Phase1Core:
+    '''Mixin for test_phase1_core.TestEval: the core-language suite again, on self.engine'''
+    engine = 'tree'
+
+    def expect(self, expr, expected):
+        self.assertEqual(outcome(self.engine, expr), expected, expr)
+
+    def expect_error(self, expr):
+        got = outcome(self.engine, expr)
+        self.assertEqual(got, outcome('tree', expr), expr)
+        self.assertEqual(got[0], "EvalError", expr)
+
+
+class SameAsTree:
+    '''Mixin for a TestCase: PROGRAMS, ERRORS and the songs on self.engine'''
+    engine = 'tree'
+
+    def test_same_as_tree(self):
+        for src in PROGRAMS + ERRORS:
+            expr = ast_of(src)
+            with self.subTest(src=src):
+                self.assertEqual(outcome(self.engine, expr), outcome('tree', expr))
+
+    def test_music(self):
+        for src in SONGS:
+            expr = parse_to_ast(src)
+            with self.subTest(src=src[:40]), no_viewer():
+                self.assertEqual(outcome(self.engine, expr), outcome('tree', expr))
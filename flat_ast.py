@@ -0,0 +1,332 @@
+# Flat ASTs: an Expr tree stored as parallel typed arrays
+'''
+A FlatAst holds a whole program in a few `array`s instead of one Python
+object per node:
+
+    op       array('B')   each node's opcode (ast_codec's numbering)
+    first    array('I')   where each node's fields start in args
+    args     array('i')   the fields: a child's node index, an index into
+                          strings, an int, or a list's length followed by
+                          its node indices
+    strings  list[str]    names, pitches and import paths, each stored once
+    consts   list[int]    ints that don't fit in args (see Op.LIT_BIG)
+
+Nodes are numbered in post-order, so children come before their parents and
+the root is the last node. Equal literals are stored once, and so is a
+subtree that is the same object in several places (as in a hash-consed or
+template tree).
+
+The arrays hold no Python objects, so the garbage collector never walks a
+flat program however big it is, and a node costs a few bytes per field
+rather than an object per node and per literal. to_flat() and from_flat()
+convert to and from interp's nodes, and eval_flat() runs a FlatAst directly
+by walking node indices, with the same results and EvalErrors as evalInEnv.
+
+    flat = to_flat(parse_to_ast(source))
+    eval_flat(flat)
+'''
+from array import array
+from enum import IntEnum
+
+from ast_codec import _SCHEMA, _DECODE, _FIELDS
+from interp import Expr, Env, Loc, Value, EvalError, Lit, Import, Tune, emptyEnv, extendEnv, newLoc, setLoc, \
+    bindLetfun, evalInEnv, evalStatement, addValues, subValues, mulValues, divValues, negValue, boolOperand, \
+    eqValues, neqValues, ltValues, loreValues, gtValues, goreValues, ifCondition, ifnzCondition, ifnzResult, \
+    lookupValue, callee, callEnv, assignableLoc, showValue, readValue, checkPitch, noteValue, tuneInstrument, \
+    checkTuneItem, concatValues, checkTransposable, transposeSteps, TransposeNote, repeatValue, volumeValue, \
+    trackValue
+
+class Op(IntEnum):
+    LIT_BIG = 0    # an int literal too big for args; its field indexes consts
+    LIT_INT = 1
+    LIT_TRUE = 2
+    LIT_FALSE = 3
+    ADD = 4
+    SUB = 5
+    MUL = 6
+    DIV = 7
+    NEG = 8
+    AND = 9
+    OR = 10
+    NOT = 11
+    LET = 12
+    NAME = 13
+    EQ = 14
+    NEQ = 15
+    LT = 16
+    LORE = 17
+    GT = 18
+    GORE = 19
+    IF = 20
+    IFNZ = 21
+    LETFUN = 22
+    APP = 23
+    ASSIGN = 24
+    SEQ = 25
+    BLOCK = 26
+    SHOW = 27
+    READ = 28
+    NOTE = 29
+    TUNE = 30
+    CONCAT_TUNES = 31
+    TRANSPOSE = 32
+    REPEAT = 33
+    VOLUME = 34
+    TRACK = 35
+    IMPORT = 36
+
+# node type of each opcode, for the checks evalInEnv makes on unevaluated nodes
+_TYPES: list[type] = [Lit] * (max(Op) + 1)
+for _op, (_cls, _) in _DECODE.items():
+    _TYPES[_op] = _cls
+
+_INT_MIN, _INT_MAX = -2**31, 2**31 - 1   # what an array('i') item holds
+
+class FlatAst:
+    __slots__ = ('op', 'first', 'args', 'strings', 'consts')
+
+    def __init__(self):
+        self.op = array('B')
+        self.first = array('I')
+        self.args = array('i')
+        self.strings: list[str] = []
+        self.consts: list[int] = []
+
+    def __len__(self) -> int:
+        '''Number of nodes'''
+        return len(self.op)
+
+    @property
+    def root(self) -> int:
+        return len(self.op) - 1
+
+    @property
+    def nbytes(self) -> int:
+        '''Bytes taken by the arrays' items (the string and const tables not included)'''
+        return sum(len(a) * a.itemsize for a in (self.op, self.first, self.args))
+
+    def __repr__(self) -> str:
+        return f"<FlatAst of {len(self)} nodes>"
+
+# ----- Converting ----- #
+
+def to_flat(expr: Expr) -> FlatAst:
+    '''expr as a FlatAst'''
+    flat = FlatAst()
+    op, first, args, consts = flat.op, flat.first, flat.args, flat.consts
+    strings: dict[str, int] = {}
+    index: dict[int, int] = {}   # id of a node -> its node index
+    literals: dict[tuple[type, int], int] = {}   # (type, value) of a Lit -> its node index
+    stack: list[tuple[object, bool]] = [(expr, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in index:
+            continue
+        if isinstance(node, Lit):
+            v = node.value
+            key = (type(v), v)
+            if key in literals:
+                index[id(node)] = literals[key]
+                continue
+            first.append(len(args))
+            if v is True or v is False:
+                op.append(Op.LIT_TRUE if v else Op.LIT_FALSE)
+            elif not isinstance(v, int):
+                raise TypeError(f"can't flatten literal {v!r}")
+            elif _INT_MIN <= v <= _INT_MAX:
+                op.append(Op.LIT_INT)
+                args.append(v)
+            else:
+                op.append(Op.LIT_BIG)
+                args.append(len(consts))
+                consts.append(v)
+            index[id(node)] = literals[key] = len(op) - 1
+            continue
+        entry = _SCHEMA.get(type(node))
+        if entry is None:
+            raise TypeError(f"can't flatten {type(node).__name__} {node!r}")
+        code, kinds = entry
+        values = [getattr(node, name) for name in _FIELDS[type(node)]]
+        if not expanded:
+            stack.append((node, True))
+            for kind, value in zip(reversed(kinds), reversed(values)):
+                if kind == 'e':
+                    stack.append((value, False))
+                elif kind == 'l':
+                    stack.extend((item, False) for item in reversed(value))
+            continue
+        first.append(len(args))
+        for kind, value in zip(kinds, values):
+            match kind:
+                case 'e':
+                    args.append(index[id(value)])
+                case 'l':
+                    args.append(len(value))
+                    args.extend(index[id(item)] for item in value)
+                case 's' | 'p':
+                    args.append(strings.setdefault(value, len(strings)))
+                case 'i':
+                    args.append(value)
+        op.append(code)
+        index[id(node)] = len(op) - 1
+    flat.strings = list(strings)
+    return flat
+
+def from_flat(flat: FlatAst) -> Expr:
+    '''The Expr a FlatAst holds; a node stored once is built once, so its
+    uses share it'''
+    op, first, args, strings = flat.op, flat.first, flat.args, flat.strings
+    nodes: list[Expr] = []
+    for i in range(len(op)):
+        code, a = op[i], first[i]
+        match code:
+            case Op.LIT_INT:
+                nodes.append(Lit(args[a]))
+            case Op.LIT_BIG:
+                nodes.append(Lit(flat.consts[args[a]]))
+            case Op.LIT_TRUE | Op.LIT_FALSE:
+                nodes.append(Lit(code == Op.LIT_TRUE))
+            case _:
+                cls, kinds = _DECODE[code]
+                fields = []
+                for kind in kinds:
+                    match kind:
+                        case 'e':
+                            fields.append(nodes[args[a]])
+                        case 'l':
+                            n = args[a]
+                            fields.append(tuple(nodes[j] for j in args[a + 1:a + 1 + n]))
+                            a += n
+                        case 's' | 'p':
+                            fields.append(strings[args[a]])
+                        case 'i':
+                            fields.append(args[a])
+                    a += 1
+                nodes.append(cls(*fields))
+    return nodes[-1]
+
+# ----- Evaluation ----- #
+
+def eval_flat(flat: FlatAst, env: Env[Loc[Value]] = emptyEnv) -> Value:
+    '''Evaluates flat in env, as evalInEnv evaluates the Expr it holds.
+    A function it defines is a Closure whose body is a node index of flat
+    (rather than an Expr), so it can only be called within this program.'''
+    op, first, args, strings, consts = flat.op, flat.first, flat.args, flat.strings, flat.consts
+
+    def ev(env: Env[Loc[Value]], i: int) -> Value:
+        a = first[i]
+        match op[i]:
+            case Op.LIT_INT:
+                return args[a]
+            case Op.LIT_TRUE:
+                return True
+            case Op.LIT_FALSE:
+                return False
+            case Op.LIT_BIG:
+                return consts[args[a]]
+            case Op.ADD:
+                return addValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.SUB:
+                return subValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.MUL:
+                return mulValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.DIV:
+                return divValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.NEG:
+                return negValue(ev(env, args[a]))
+            case Op.AND:
+                if not boolOperand(ev(env, args[a]), "And"):
+                    return False
+                return boolOperand(ev(env, args[a + 1]), "And")
+            case Op.OR:
+                if boolOperand(ev(env, args[a]), "Or"):
+                    return True
+                return boolOperand(ev(env, args[a + 1]), "Or")
+            case Op.NOT:
+                return not boolOperand(ev(env, args[a]), "Not")
+            case Op.NAME:
+                return lookupValue(env, strings[args[a]])
+            case Op.LET:
+                name = strings[args[a]]
+                if name == "":
+                    raise EvalError("Name cannot be empty")
+                return ev(extendEnv(name, newLoc(ev(env, args[a + 1])), env), args[a + 2])
+            case Op.EQ:
+                return eqValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.NEQ:
+                return neqValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.LT:
+                return ltValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.LORE:
+                return loreValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.GT:
+                return gtValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.GORE:
+                return goreValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.IF:
+                if ifCondition(ev(env, args[a])):
+                    return ev(env, args[a + 1])
+                return ev(env, args[a + 2])
+            case Op.IFNZ:
+                if ifnzCondition(ev(env, args[a])):
+                    return ifnzResult(ev(env, args[a + 1]), "then")
+                return ifnzResult(ev(env, args[a + 2]), "else")
+            case Op.LETFUN:
+                newEnv = bindLetfun(env, strings[args[a]], strings[args[a + 1]], args[a + 2])
+                return ev(newEnv, args[a + 3])
+            case Op.APP:
+                fun = callee(ev(env, args[a]))
+                newEnv = callEnv(fun, ev(env, args[a + 1]))
+                if isinstance(fun.body, int):
+                    return ev(newEnv, fun.body)
+                return evalInEnv(newEnv, fun.body)   # e.g. a function from an imported module
+            case Op.ASSIGN:
+                loc = assignableLoc(env, strings[args[a]])
+                v = ev(env, args[a + 1])
+                setLoc(loc, v)
+                return v
+            case Op.SEQ:
+                ev(env, args[a])
+                return ev(env, args[a + 1])
+            case Op.BLOCK:
+                v = None
+                for stmt in args[a + 1:a + 1 + args[a]]:
+                    if op[stmt] == Op.IMPORT:
+                        env, v = evalStatement(env, Import(strings[args[first[stmt]]]))
+                    else:
+                        v = ev(env, stmt)
+                return v
+            case Op.IMPORT:
+                return evalStatement(env, Import(strings[args[a]]))[1]
+            case Op.SHOW:
+                return showValue(ev(env, args[a]))
+            case Op.READ:
+                return readValue()
+            case Op.NOTE:
+                name = strings[args[a]]
+                checkPitch(name)
+                return noteValue(name, ev(env, args[a + 1]), args[a + 2])
+            case Op.TUNE:
+                n = args[a]
+                instrument = tuneInstrument(ev(env, args[a + 1 + n]))
+                result = []
+                for note in args[a + 1:a + 1 + n]:
+                    checkTuneItem(_TYPES[op[note]])
+                    result.append(ev(env, note))
+                return Tune(tuple(result), instrument - 1)
+            case Op.CONCAT_TUNES:
+                return concatValues(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.TRANSPOSE:
+                checkTransposable(_TYPES[op[args[a]]])
+                steps = transposeSteps(ev(env, args[a + 1]))
+                return TransposeNote(ev(env, args[a]), steps)
+            case Op.REPEAT:
+                return repeatValue(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.VOLUME:
+                return volumeValue(ev(env, args[a]), ev(env, args[a + 1]))
+            case Op.TRACK:
+                return trackValue([ev(env, t) for t in args[a + 1:a + 1 + args[a]]])
+            case code:
+                raise EvalError(f"unknown opcode: {code}")
+
+    return ev(env, flat.root)
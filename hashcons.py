@@ -0,0 +1,121 @@
+# Hash-consing: one shared node per distinct subtree
+'''
+An Interner maps every AST it is given onto canonical nodes: two subtrees
+with the same structure and the same leaves become the very same object,
+the first one of their shape it saw. Music programs repeat themselves a
+lot (the same volume(note R for 2 seconds, 127) dozens of times in a
+song), so an interned AST takes memory in proportion to its distinct
+subtrees, not its size.
+
+Within one Interner, interned nodes are the same program exactly when
+they are identical, so `a is b` replaces a deep `a == b`, and id(node) can
+key a cache. (== itself still compares fields, and Python has True == 1,
+so Lit(True) == Lit(1) even though they are interned apart.)
+
+Nodes are frozen and a Tune's or Block's items are a tuple, so a shared
+subtree can't be changed through one of the places it is used.
+
+    interner = Interner()
+    ast = parse_to_ast(source, interner=interner)
+
+parse_to_ast interns as it parses: the parsers pass each node they build
+through share() (see interning()), whose children are canonical already,
+so a repeat is dropped as soon as it is built and the unshared tree never
+exists as a whole. intern() also takes a finished tree, in one pass.
+Parses in several threads can share one Interner.
+'''
+from dataclasses import fields
+import threading
+
+from interp import Expr
+
+class Interner:
+    def __init__(self):
+        # (node type, fields) -> canonical node; a field that is a node is
+        # keyed by the id of its canonical node, which the table keeps alive
+        self._table: dict[tuple, Expr] = {}
+        self._canonical: set[int] = set()   # ids of the nodes in _table, which are their own canonical node
+        self.hits = 0     # subtrees that were already in the table
+        self._lock = threading.Lock()   # parses in several threads may share an Interner
+
+    def __len__(self) -> int:
+        '''Number of distinct subtrees seen'''
+        return len(self._table)
+
+    def clear(self):
+        with self._lock:
+            self._table.clear()
+            self._canonical.clear()
+
+    def share(self, value):
+        '''value with the nodes in it interned: a node, or a list or tuple of
+        them, as a parser callback returns; anything else as it is'''
+        if id(value) in self._canonical:   # the usual case: a node passed up unchanged
+            return value
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.intern(item) if _is_node(item) else item for item in value)
+        return self.intern(value) if _is_node(value) else value
+
+    def intern(self, root: Expr) -> Expr:
+        '''The canonical node for root, with all of its subtrees canonical too'''
+        if id(root) in self._canonical:
+            return root
+        with self._lock:
+            return self._intern(root)
+
+    def _intern(self, root: Expr) -> Expr:
+        done: dict[int, Expr] = {}   # id of a node of root's tree -> its canonical node
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in done:
+                continue
+            values = [getattr(node, f.name) for f in fields(node)]
+            if not expanded:
+                stack.append((node, True))
+                for value in values:
+                    for child in value if isinstance(value, tuple) else (value,):
+                        if _is_node(child) and id(child) not in done:
+                            if id(child) in self._canonical:   # not walked again
+                                done[id(child)] = child
+                            else:
+                                stack.append((child, False))
+                continue
+            key = [type(node)]
+            args = []
+            changed = False
+            for value in values:
+                if isinstance(value, tuple):
+                    items = tuple(done[id(item)] if _is_node(item) else item for item in value)
+                    key.append(tuple(id(item) if _is_node(item) else (type(item), item) for item in items))
+                    changed = changed or any(a is not b for a, b in zip(items, value))
+                    args.append(items)
+                elif _is_node(value):
+                    child = done[id(value)]
+                    key.append(id(child))
+                    changed = changed or child is not value
+                    args.append(child)
+                else:
+                    key.append((type(value), value))   # so Lit(True) isn't Lit(1)
+                    args.append(value)
+            key = tuple(key)
+            canonical = self._table.get(key)
+            if canonical is None:
+                canonical = type(node)(*args) if changed else node
+                self._table[key] = canonical
+                self._canonical.add(id(canonical))
+            else:
+                self.hits += 1
+            done[id(node)] = canonical
+        return done[id(root)]
+
+def interning(method):
+    '''method, with what it returns passed through self.interner.share(), for
+    wrapping a parser's node-building methods'''
+    def wrapper(self, *args):
+        return self.interner.share(method(self, *args))
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+def _is_node(value) -> bool:
+    return hasattr(value, '__dataclass_fields__')
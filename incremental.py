@@ -0,0 +1,153 @@
+# Incremental reparsing of edited programs
+'''
+reparse() takes a program's previous source and AST plus one text edit and
+only parses what the edit touched:
+
+  - if the edit falls inside a single element of a `tune [...]` or
+    `track [...]` list, only that element is parsed again;
+  - otherwise only the top-level statements (the `stmt; stmt; ...` Block)
+    whose text the edit changed are parsed again.
+
+Everything else in the new AST is the old node itself, not a copy, so
+`new is old` on a subtree means nothing changed in it. Whenever a piece
+doesn't parse on its own, reparse() falls back to parsing the whole new
+text, so the result (or the ParseError) is always what parse_to_ast() would
+give.
+'''
+from dataclasses import dataclass, fields, replace
+
+from interp import Expr, Block, Note, Tune, Repeat, Volume
+from parse_run import parse_to_ast, ParseError
+from statements import Span, statement_spans, list_openings, element_spans
+
+@dataclass
+class TextEdit:
+    start: int   # replace source[start:end] ...
+    end: int
+    text: str    # ... with text
+    def apply(self, source: str) -> str:
+        return source[:self.start] + self.text + source[self.end:]
+    def delta(self) -> int:
+        return len(self.text) - (self.end - self.start)
+
+def reparse(old_source: str, old_ast: Expr, edit: TextEdit, engine: str = 'lalr') -> tuple[str, Expr]:
+    '''Returns the edited source and its AST, reusing the unchanged parts of old_ast'''
+    new_source = edit.apply(old_source)
+    old_spans = statement_spans(old_source)
+    old_stmts = old_ast.stmts if isinstance(old_ast, Block) else (old_ast,)
+    if len(old_stmts) != len(old_spans):   # old_ast isn't the AST of old_source
+        return new_source, parse_to_ast(new_source, engine)
+    new_spans = statement_spans(new_source)
+    try:
+        return new_source, _reparse_statements(old_source, new_source, old_spans, new_spans,
+                                               old_ast, old_stmts, edit, engine)
+    except ParseError:
+        return new_source, parse_to_ast(new_source, engine)
+
+# ----- Statement level ----- #
+
+def _reparse_statements(old_source: str, new_source: str, old_spans: list[Span],
+                        new_spans: list[Span], old_ast: Expr, old_stmts: tuple[Expr, ...],
+                        edit: TextEdit, engine: str) -> Expr:
+    n_old, n_new = len(old_spans), len(new_spans)
+    def same(i: int, j: int) -> bool:
+        # a statement parses on its own, so the same text means the same AST
+        (s, e), (t, u) = old_spans[i], new_spans[j]
+        return old_source[s:e].strip() == new_source[t:u].strip()
+
+    # unchanged statements in front of the edit ...
+    before = 0
+    while before < min(n_old, n_new) and same(before, before):
+        before += 1
+    # ... and behind it
+    after = 0
+    while after < min(n_old, n_new) - before and same(n_old - 1 - after, n_new - 1 - after):
+        after += 1
+
+    stmts = list(old_stmts[:before])
+    changed = new_spans[before:n_new - after]
+    stmt = None
+    if len(changed) == 1 and n_old == n_new:
+        # the edit stays inside one statement, maybe inside one list element too
+        s, e = old_spans[before]
+        local = TextEdit(edit.start - s, edit.end - s, edit.text)
+        stmt = _reparse_element(old_source[s:e], old_stmts[before], local, engine)
+    if stmt is not None:
+        stmts.append(stmt)
+    else:
+        for s, e in changed:
+            stmt = parse_to_ast(new_source[s:e], engine)
+            if isinstance(stmt, Block):
+                # maybe a real `(a; b)`, but maybe the scan missed a ';' boundary
+                # (`elsenote` is one word to it, two tokens to the parser)
+                return parse_to_ast(new_source, engine)
+            stmts.append(stmt)
+    stmts.extend(old_stmts[n_old - after:])
+    if len(stmts) == 1:
+        return stmts[0]
+    if len(stmts) == n_old and all(a is b for a, b in zip(stmts, old_stmts)):
+        return old_ast
+    return Block(tuple(stmts))
+
+# ----- List element level ----- #
+
+# what a tune/track list element can be (the `tunes` rule in expr.lark)
+_ELEMENT_TYPES = (Note, Tune, Repeat, Volume)
+
+def _reparse_element(old_text: str, old_stmt: Expr, local: TextEdit, engine: str) -> Expr | None:
+    '''Reparses only the list element of old_stmt containing the edit, or
+    returns None if no single element contains it'''
+    openings = list_openings(old_text)
+    # the last list opened before the edit that still contains it is the innermost one
+    for k in range(len(openings) - 1, -1, -1):
+        elements = element_spans(old_text, openings[k])
+        if elements is None:
+            return None
+        if any(old_text[s:e].lstrip().startswith('notes') for s, e in elements):
+            return None   # a notes "..." element is several list items, so indices don't line up
+        for index, (s, e) in enumerate(elements):
+            if s <= local.start and local.end <= e:
+                text = local.apply(old_text)[s:e + local.delta()]
+                try:
+                    node = parse_to_ast(text, engine)
+                except ParseError:
+                    return None
+                if type(node) not in _ELEMENT_TYPES:
+                    return None
+                return _Splice(k, index, len(elements), node).walk(old_stmt)
+    return None
+
+class _Splice:
+    '''Replaces element `index` of the k-th list (in source order) under a node,
+    rebuilding only the nodes on the path down to it'''
+    def __init__(self, k: int, index: int, length: int, node: Expr):
+        self.k, self.index, self.length, self.node = k, index, length, node
+        self.seen = 0
+        self.ok = False
+
+    def walk(self, root: Expr) -> Expr | None:
+        new = self._walk(root)
+        return new if self.ok else None
+
+    def _walk(self, node):
+        if self.seen > self.k or not hasattr(node, '__dataclass_fields__'):
+            return node
+        changes = {}
+        for f in fields(node):
+            value = getattr(node, f.name)
+            if isinstance(value, tuple):
+                if self.seen == self.k:
+                    self.seen += 1
+                    if len(value) == self.length:   # otherwise the spans don't line up
+                        self.ok = True
+                        changes[f.name] = value[:self.index] + (self.node,) + value[self.index + 1:]
+                    continue
+                self.seen += 1
+                items = tuple(self._walk(item) for item in value)
+                if any(a is not b for a, b in zip(items, value)):
+                    changes[f.name] = items
+            else:
+                new = self._walk(value)
+                if new is not value:
+                    changes[f.name] = new
+        return replace(node, **changes) if changes else node
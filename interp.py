@@ -20,10 +20,11 @@ the note of every Note in a single Tune by an according value (half-steps).
 from dataclasses import dataclass
 from midiutil import MIDIFile
 import os
+import re
 
 type Expr = Add | Sub | Mul | Div | Neg | Lit \
     | And | Or | Not \
-    | Let | Letfun | If | Assign | Seq | Show | Name | App \
+    | Let | Letfun | If | Assign | Seq | Block | Import | Show | Name | App \
     | Eq | Neq | Lt | LorE | Gt | GorE \
     | Note | Tune | ConcatTunes | Transpose | Repeat | Volume
 
@@ -86,6 +87,8 @@ type Expr = Add | Sub | Mul | Div | Neg | Lit \
 #       - App ✅
 #       - Assign ✅
 #   - Create Seq ✅
+#   - Flat Block of statements ✅
+#   - Import of another file's let/letfun definitions ✅
 #   - new operations
 #       - Read ✅
 #       - Show ✅
@@ -94,67 +97,67 @@ type Expr = Add | Sub | Mul | Div | Neg | Lit \
 #       - Volume ✅
 #       - Track ✅
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Add():
     left: Expr
     right: Expr
     def __str__(self):
         return f"({self.left} + {self.right})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Sub():
     left: Expr
     right: Expr
     def __str__(self):
         return f"({self.left} - {self.right})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Mul():
     left: Expr
     right: Expr
     def __str__(self):
         return f"({self.left} * {self.right})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Div():
     left: Expr
     right: Expr
     def __str__(self):
         return f"({self.left} / {self.right})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Neg():
     expr: Expr
     def __str__(self):
         return f"(-{self.expr})"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Lit():
     value: int | bool
     def __str__(self):
         return str(self.value)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class And():
     left: Expr
     right: Expr
     def __str__(self):
         return f"({self.left} and {self.right})"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Or():
     left: Expr
     right: Expr
     def __str__(self):
         return f"({self.left} or {self.right})"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Not():
     subexpr: Expr
     def __str__(self):
         return f"(not {self.subexpr})"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Let():
     varname: str
     defnexpr: Expr
@@ -162,14 +165,14 @@ class Let():
     def __str__(self):
         return f"(let {self.varname} = {self.defnexpr} in {self.bodyexpr})"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Name():
     varname: str
     def __str__(self):
         return self.varname
 
 # Equal to
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Eq():
     left: Expr
     right: Expr
@@ -177,7 +180,7 @@ class Eq():
         return f"({self.left} == {self.right})"
     
 # Not equal to
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Neq():
     left: Expr
     right: Expr
@@ -185,7 +188,7 @@ class Neq():
         return f"({self.left} != {self.right})"
     
 # Less than
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Lt():
     left: Expr
     right: Expr
@@ -193,7 +196,7 @@ class Lt():
         return f"({self.left} < {self.right})"
     
 # Less than or Equal to
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LorE():
     left: Expr
     right: Expr
@@ -201,7 +204,7 @@ class LorE():
         return f"({self.left} <= {self.right})"
     
 # Greater than
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Gt():
     left: Expr
     right: Expr
@@ -209,7 +212,7 @@ class Gt():
         return f"({self.left} > {self.right})"
 
 # Greater than or Equal to
-@dataclass
+@dataclass(frozen=True, slots=True)
 class GorE():
     left: Expr
     right: Expr
@@ -217,7 +220,7 @@ class GorE():
         return f"({self.left} >= {self.right})"
     
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class If():
     cond: Expr
     then: Expr
@@ -225,7 +228,7 @@ class If():
     def __str__(self):
         return f"(if {self.cond} then {self.then} else {self.else_})"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Ifnz():
     cond: Expr
     then: Expr
@@ -233,7 +236,7 @@ class Ifnz():
     def __str__(self):
         return f"(if {self.cond} != 0 then {self.then} else {self.else_})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Letfun():
     name: str
     params: str
@@ -243,7 +246,7 @@ class Letfun():
         # params_with_commas = ", ".join(self.params)
         return f"letfun {self.name} ({self.params}) = {self.bodyexpr} in {self.inexpr} end"
     
-@dataclass
+@dataclass(frozen=True, slots=True)
 class App():
     fun: Expr
     args: Expr
@@ -251,25 +254,40 @@ class App():
         # args_with_comma = ", ".join(map(str, self.args))
         return f"({self.fun} ({self.args}))"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Assign():
     name: str
     expr: Expr
     def __str__(self) -> str:
         return f"{self.name} := {self.expr}"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Seq():
     expr1: Expr
     expr2: Expr
     def __str__(self) -> str:
         return f"({self.expr1}; {self.expr2})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class Block():
+    stmts: tuple[Expr, ...] # stmt; stmt; ... as one flat tuple, at least two of them
+    def __post_init__(self):
+        if isinstance(self.stmts, list):   # built from a list: keep the equal tuple
+            object.__setattr__(self, 'stmts', tuple(self.stmts))
+    def __str__(self) -> str:
+        return f"({'; '.join(str(stmt) for stmt in self.stmts)})"
+
+@dataclass(frozen=True, slots=True)
+class Import():
+    path: str # file whose top-level definitions the rest of the Block can use
+    def __str__(self) -> str:
+        return f'import "{self.path}"'
+
+@dataclass(frozen=True, slots=True)
 class Show():
     expr: Expr
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Read():
     def __str__(self) -> str:
         return "read"
@@ -300,7 +318,7 @@ DEFAULT_INSTRUMENT = 1 # 1 - 128
 # 120 - 128 (Sound Effects)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Note():
     pitch: str # "C", "D", "E", "F", "G", "A", "B" or "R" for rest
     duration: Expr # in seconds (evaluated to an integer)
@@ -308,44 +326,50 @@ class Note():
     def __str__(self):
         return f"Note(Pitch: {self.pitch}, Duration: {self.duration}, Volume: {self.volume})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Tune():
-    notes: list[Note]
+    notes: tuple[Note, ...]
     instrument: Expr
+    def __post_init__(self):
+        if isinstance(self.notes, list):   # built from a list: keep the equal tuple
+            object.__setattr__(self, 'notes', tuple(self.notes))
     def __str__(self):
         return f"Tune({', '.join(str(note) for note in self.notes)})(instrument: {self.instrument})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ConcatTunes():
     left: Tune
     right: Tune
     def __str__(self):
         return f"ConcatTunes({self.left}, {self.right})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Transpose():
     tune: Tune
     steps: Expr # in half-steps (evaluated to an integer)
     def __str__(self):
         return f"Transpose({self.tune}, {self.steps})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Repeat():
     tune: Tune | Note
     repetition: Expr
     def __str__(self):
         return f"Repeat({self.tune}, {self.repetition})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Volume():
     expr: Expr
     level: Expr
     def __str__(self):
         return f"Volume({self.expr}, {self.level})"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Track():
-    tracks: list[Note | Tune]
+    tracks: tuple[Note | Tune, ...]
+    def __post_init__(self):
+        if isinstance(self.tracks, list):   # built from a list: keep the equal tuple
+            object.__setattr__(self, 'tracks', tuple(self.tracks))
     def __str__(self):
         return f"Track({', '.join(str(track) for track in self.tracks)})"
 
@@ -378,6 +402,26 @@ MIDI_TO_NOTE = {
     -1: "R",  # Rest
 }
 
+# One pattern for every pitch in NOTE_TO_MIDI: a letter, an optional sharp
+# (no E# or B#) and an octave from -1 to 9, where octave 9 stops at G9.
+# The NOTE_PITCH terminal in expr.lark and expr_lalr.lark is this same regex,
+# and pitch_to_midi() is how checkPitch, TransposeNote and the MIDI writer
+# turn a pitch into a number (NOTE_TO_MIDI is kept for reference and tests).
+PITCH_PATTERN = re.compile(r"(?:[CDFGA]#?|[EB])(?:-1|[0-8])|(?:[CDF]#?|[EG])9|R")
+PITCH_CLASS = {"C": 0, "C#": 1, "D": 2, "D#": 3, "E": 4, "F": 5, "F#": 6, "G": 7, "G#": 8, "A": 9, "A#": 10, "B": 11}
+
+def pitch_to_midi(pitch: str) -> int | None:
+    '''Return the MIDI number of pitch (-1 for a rest), or None if it isn't a valid pitch'''
+    if PITCH_PATTERN.fullmatch(pitch) is None:
+        return None
+    if pitch == "R":
+        return -1
+    if pitch[1] == "#":
+        name, octave = pitch[:2], pitch[2:]
+    else:
+        name, octave = pitch[:1], pitch[1:]
+    return PITCH_CLASS[name] + 12 * (int(octave) + 1)
+
 # ----- Environment ----- #
 
 type Binding[V] = tuple[str, V]  # this tuple type is always a pair
@@ -394,14 +438,11 @@ def extendEnv[V](name: str, value: V, env: Env[V]) -> Env[V]:
 
 def lookupEnv[V](name: str, env: Env[V]) -> V | None:
     '''Return the value bound to name in env, or None if name is not bound'''
-    match env:
-        case ((n, v), *rest):
-            if n == name:
-                return v
-            else:
-                return lookupEnv(name, rest)
-        case _:
-            return None
+    # a loop, not a recursion on the rest of env: that copied the rest at every step
+    for n, v in env:
+        if n == name:
+            return v
+    return None
 
 # model memory locations as (mutable) singleton lists
 type Loc[V] = list[V] # always a singleton list
@@ -417,7 +458,7 @@ class EvalError(Exception):
 
 type Value = int | bool | Note | Tune | Track | Closure
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Closure:
     param: str
     body: Expr
@@ -438,8 +479,8 @@ def TransposeNote(tune: Tune, steps: int) -> Tune:
             continue
 
         # Get the midi value of the pitch
-        midi = NOTE_TO_MIDI.get(note.pitch) # Might be an issue
-        if midi == None:
+        midi = pitch_to_midi(note.pitch)
+        if midi is None:
             raise EvalError(f"Could not translate pitch: {note.pitch}")
         
         # Calcualte transposed midi value with steps
@@ -456,7 +497,7 @@ def TransposeNote(tune: Tune, steps: int) -> Tune:
         new_pitch = MIDI_TO_NOTE[transpose_midi]
         notes.append(Note(new_pitch, note.duration))
 
-    return Tune(notes, tune.instrument)
+    return Tune(tuple(notes), tune.instrument)
 
 
 def CreateMidiFile(tune: Tune | Track, instrument: int):    
@@ -486,7 +527,7 @@ def CreateMidiFile(tune: Tune | Track, instrument: int):
                     time += duration
                     continue
 
-                pitch = NOTE_TO_MIDI[note.pitch]
+                pitch = pitch_to_midi(note.pitch)
                 midi.addNote(idx, channel, pitch, time, duration, note.volume)
                 time += duration
 
@@ -516,7 +557,7 @@ def CreateMidiFile(tune: Tune | Track, instrument: int):
                 time += duration
                 continue
 
-            pitch = NOTE_TO_MIDI[note.pitch]
+            pitch = pitch_to_midi(note.pitch)
             midi.addNote(track, channel, pitch, time, duration, note.volume)
             time += duration
         
@@ -532,7 +573,7 @@ def CreateMidiFile(tune: Tune | Track, instrument: int):
         midi.addTempo(track, time, DEFAULT_TEMPO)
         midi.addProgramChange(track, channel, time, instrument)
 
-        pitch = NOTE_TO_MIDI[tune.pitch]
+        pitch = pitch_to_midi(tune.pitch)
 
         midi.addNote(track, channel, pitch, time, tune.duration, tune.volume)
         time += tune.duration
@@ -553,396 +594,458 @@ def flatten_tune(tune: Tune) -> list[Note]:
                 raise EvalError("Tunes contains invalid type")
     return new_Tune
 
+# ----- Operations on values ----- #
+# The checks and results of each operator, once its operands are values.
+# evalInEnv uses them, and so does any other evaluator, so they all agree on
+# what a program means and on its error messages.
+
+def intOperands(left: Value, right: Value, verb: str, operator: str) -> None:
+    if isinstance(left, bool) or isinstance(right, bool):
+        raise EvalError(f"cannot {verb} boolean values")
+    elif not isinstance(left, int) or not isinstance(right, int):
+        raise EvalError(f"{operator} operator requires integer operands")
+
+def addValues(left: Value, right: Value) -> int:
+    intOperands(left, right, "add", "addition")
+    return left + right
+
+def subValues(left: Value, right: Value) -> int:
+    intOperands(left, right, "subtract", "subtraction")
+    return left - right
+
+def mulValues(left: Value, right: Value) -> int:
+    intOperands(left, right, "multiply", "multiplication")
+    return left * right
+
+def divValues(left: Value, right: Value) -> int:
+    intOperands(left, right, "divide", "division")
+    if right == 0:
+        raise EvalError("division by zero")
+    return left // right
+
+def negValue(value: Value) -> int:
+    if isinstance(value, bool):
+        raise EvalError("cannot negate boolean values")
+    elif not isinstance(value, int):
+        raise EvalError("negation operator requires integer operands")
+    return -value
+
+def boolOperand(value: Value, operator: str) -> bool:
+    '''value, if it is a boolean operand of And, Or or Not'''
+    if not isinstance(value, bool):
+        raise EvalError(f"{operator} operator requires boolean operands")
+    return value
+
+def eqValues(left: Value, right: Value) -> bool:
+    # mixed types, like int and bool, are just not equal
+    if type(left) != type(right):
+        return False
+    if not isinstance(left, (int, bool, Tune, Note)):
+        raise EvalError("Must compare using int, bool, Tune, or Note types")
+    return left == right
+
+def neqValues(left: Value, right: Value) -> bool:
+    if type(left) != type(right):
+        return False
+    if not isinstance(left, (int, bool, Tune, Note)):
+        raise EvalError("Must compare using int, bool, Tune, or Note types")
+    return left != right
+
+def ltValues(left: Value, right: Value) -> bool:
+    if type(left) == int and type(right) == int:
+        return left < right
+    raise EvalError("operand must be integer")
+
+def loreValues(left: Value, right: Value) -> bool:
+    if isinstance(left, int) and isinstance(right, int):
+        return left <= right
+    raise EvalError("operand must be integer")
+
+def gtValues(left: Value, right: Value) -> bool:
+    if isinstance(left, int) and isinstance(right, int):
+        return left > right
+    raise EvalError("operand must be integer")
+
+def goreValues(left: Value, right: Value) -> bool:
+    if isinstance(left, int) and isinstance(right, int):
+        return left >= right
+    raise EvalError("operand must be integer")
+
+def ifCondition(cond: Value) -> bool:
+    if not isinstance(cond, bool):
+        raise EvalError("If condition must be boolean")
+    return cond
+
+def ifnzCondition(cond: Value) -> int:
+    if not isinstance(cond, int):
+        raise EvalError("Ifnz condition must be an int")
+    return cond
+
+def ifnzResult(value: Value, branch: str) -> Value:
+    '''value, if it can be the result of an Ifnz's branch ("then" or "else")'''
+    if not isinstance(value, (int, bool)):
+        raise EvalError(f"Ifnz {branch} must be int or bool")
+    return value
+
+def lookupValue(env: Env[Loc[Value]], name: str) -> Value:
+    loc = lookupEnv(name, env)
+    if loc is None:
+        raise EvalError(f"unbound Name: {name}")
+    return getLoc(loc)
+
+def callee(fun: Value) -> Closure:
+    if not isinstance(fun, Closure):
+        raise EvalError("Attempted to call a non-function")
+    return fun
+
+def callEnv(fun: Closure, arg: Value) -> Env[Loc[Value]]:
+    '''The environment fun's body runs in when it is called with arg'''
+    return extendEnv(fun.param, newLoc(arg), fun.env)
+
+def assignableLoc(env: Env[Loc[Value]], name: str) -> Loc[Value]:
+    loc = lookupEnv(name, env)
+    if loc is None:
+        raise EvalError(f"unbound name {name}")
+    if isinstance(getLoc(loc), Closure):
+        raise EvalError(f"cannot assign to function name {name}")
+    return loc
+
+def showValue(value: Value) -> Value:
+    # Show value in a suitable way
+    match value:
+        case int() | bool():
+            print(value)
+        case Note() | Tune() | Track():
+            print("showing midi file")
+            CreateMidiFile(value, 0)
+            os.startfile(FILENAME)
+    return value
+
+def readValue() -> int:
+    user_input = input("Enter an integer >> ")
+    # try if the input is int, else throw exception
+    try:
+        return int(user_input)
+    except ValueError:
+        raise EvalError(f"Expected an integer, got: {user_input}")
+
+def checkPitch(name: str) -> None:
+    if not isinstance(name, str):
+        raise EvalError("Note name must be a string")
+    if pitch_to_midi(name) is None:
+        raise EvalError(f"Invalid note name: {name}. Must be one of {list(NOTE_TO_MIDI.keys())}")
+
+def noteValue(name: str, duration: Value, volume: int) -> Note:
+    if not isinstance(duration, int) or duration <= 0:
+        raise EvalError("Note duration must be a positive integer")
+    return Note(name, duration, volume)
+
+def tuneInstrument(instrument: Value) -> int:
+    if not isinstance(instrument, int):
+        raise EvalError("Tune must be an integer expression for instruments")
+    if instrument < 1 or instrument > 128:
+        raise EvalError("instrument must be between 1 - 128")
+    return instrument
+
+def checkTuneItem(kind: type) -> None:
+    '''kind is the node type of an element of a Tune's list'''
+    if not issubclass(kind, (Tune, Note, Repeat, Volume)):
+        raise EvalError("Tunes must contain only Tune or Note objects")
+
+def concatValues(left: Value, right: Value) -> Tune:
+    if not isinstance(left, Tune) or not isinstance(right, Tune):
+        raise EvalError("ConcatTunes must be two Tunes")
+    return Tune(left.notes + right.notes, left.instrument + right.instrument)
+
+def checkTransposable(kind: type) -> None:
+    '''kind is the node type of what a Transpose transposes'''
+    if not issubclass(kind, Tune):
+        raise EvalError("Transpose can only tune up or down Tunes")
+
+def transposeSteps(steps: Value) -> int:
+    if not isinstance(steps, int):
+        raise EvalError("Transpose steps must be an integer")
+    return steps
+
+def repeatValue(t_v: Value, r_v: Value) -> Tune:
+    if not isinstance(r_v, int):
+        raise EvalError("Repeat expects an int for repetition")
+    # return the Tune or Note that is to be repeated on r times
+    match t_v:
+        case Tune(n, ins):
+            return Tune(n * r_v, ins)
+        case Note(name, d):
+            return Tune((Note(name, d),) * r_v, instrument=DEFAULT_INSTRUMENT)
+        case _:
+            raise EvalError("Repeat contains invalid expression")
+
+def volumeValue(t_v: Value, l_v: Value) -> Note:
+    if not isinstance(t_v, Note):
+        raise EvalError("Volume expects a Note")
+    if not isinstance(l_v, int):
+        raise EvalError("Volume expects an integer for its volume level")
+    if not (0 <= l_v <= 127):
+        raise EvalError("volume level must be between 0 and 127")
+    return Note(t_v.pitch, t_v.duration, volume=l_v) # return a note for modified volume
+
+def trackValue(t_v: list[Value]) -> Track:
+    if len(t_v) < 1 or len(t_v) > 16:
+        raise EvalError("Track can only contain 0 - 16 individual tracks")
+    if not all(isinstance(ev, Tune) for ev in t_v):
+        raise EvalError("Track expects only Tune objects")
+    return Track(tuple(t_v))
+
 # ----- Evaluation ----- #
 
 def eval(expr: Expr) -> Value:
     return evalInEnv(emptyEnv, expr)
 
+def bindLet(env: Env[Loc[Value]], name: str, defn: Expr) -> Env[Loc[Value]]:
+    return extendEnv(name, newLoc(evalInEnv(env, defn)), env)
+
+def bindLetfun(env: Env[Loc[Value]], name: str, param: str, body: Expr) -> Env[Loc[Value]]:
+    loc = newLoc(None)
+    newEnv = extendEnv(name, loc, env)
+    setLoc(loc, Closure(param, body, newEnv)) # the closure sees itself, for recursion
+    return newEnv
+
+def evalStatement(env: Env[Loc[Value]], stmt: Expr) -> tuple[Env[Loc[Value]], Value]:
+    '''Evaluates one statement of a Block, returning the environment for the
+    statements after it (only an import changes it) and the statement's value'''
+    if isinstance(stmt, Import):
+        from modules import import_module # modules parses, and parse_run imports this file
+        return import_module(stmt.path, env), True
+    return env, evalInEnv(env, stmt)
+
+def evalDefinitions(env: Env[Loc[Value]], expr: Expr) -> Env[Loc[Value]]:
+    '''Binds the top-level definitions of a module: for each statement, the
+    chain of let/letfun definitions it starts with (their final body isn't
+    evaluated). Later definitions can use earlier ones.'''
+    for stmt in expr.stmts if isinstance(expr, Block) else [expr]:
+        while True:
+            match stmt:
+                case Let(name, defn, body):
+                    env = bindLet(env, name, defn)
+                    stmt = body
+                case Letfun(name, param, body, inexpr):
+                    env = bindLetfun(env, name, param, body)
+                    stmt = inexpr
+                case Import():
+                    env, _ = evalStatement(env, stmt)
+                    break
+                case _:
+                    break
+    return env
+
 def evalInEnv(env: Env[Loc[Value]], expr: Expr) -> Value:
-    match expr:
-        case Lit(v):
-            return v
+    # a loop so that tail positions (the branches of If and Ifnz, the second
+    # half of Seq, the last statement of a Block, Let and Letfun bodies and a
+    # called function's body) reuse this call rather than nesting another one
+    branch = None  # "then"/"else" once in a branch of an Ifnz, whose value is checked
+    while True:
+        match expr:
+            case Lit(v):
+                value = v
         
-        case Add(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, bool) or isinstance(right, bool):
-                raise EvalError("cannot add boolean values")
-            elif not isinstance(left, int) or not isinstance(right, int):
-                raise EvalError("addition operator requires integer operands")
-            return left + right
+            case Add(l, r):
+                value = addValues(evalInEnv(env, l), evalInEnv(env, r))
         
-        case Sub(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, bool) or isinstance(right, bool):
-                raise EvalError("cannot subtract boolean values")
-            elif not isinstance(left, int) or not isinstance(right, int):
-                raise EvalError("subtraction operator requires integer operands")
-            return left - right
+            case Sub(l, r):
+                value = subValues(evalInEnv(env, l), evalInEnv(env, r))
         
-        case Mul(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, bool) or isinstance(right, bool):
-                raise EvalError("cannot multiply boolean values")
-            elif not isinstance(left, int) or not isinstance(right, int):
-                raise EvalError("multiplication operator requires integer operands")
-            return left * right
+            case Mul(l, r):
+                value = mulValues(evalInEnv(env, l), evalInEnv(env, r))
         
-        case Div(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, bool) or isinstance(right, bool):
-                raise EvalError("cannot divide boolean values")
-            elif not isinstance(left, int) or not isinstance(right, int):
-                raise EvalError("division operator requires integer operands")
-            if right == 0:
-                raise EvalError("division by zero")
-            return left // right
+            case Div(l, r):
+                value = divValues(evalInEnv(env, l), evalInEnv(env, r))
         
-        case Neg(e):
-            value = evalInEnv(env, e)
-            if isinstance(value, bool):
-                raise EvalError("cannot negate boolean values")
-            elif not isinstance(value, int):
-                raise EvalError("negation operator requires integer operands")
-            return -value
+            case Neg(e):
+                value = negValue(evalInEnv(env, e))
         
-        case And(l, r):
-            left = evalInEnv(env, l)
-            if not isinstance(left, bool):
-                raise EvalError("And operator requires boolean operands")
-            if left == False:
-                return False
-            right = evalInEnv(env, r)
-            if not isinstance(right, bool):
-                raise EvalError("And operator requires boolean operands")
-            return right
+            case And(l, r):
+                value = boolOperand(evalInEnv(env, l), "And") and boolOperand(evalInEnv(env, r), "And")
         
-        case Or(l, r):
-            left = evalInEnv(env, l)
-            if not isinstance(left, bool):
-                raise EvalError("Or operator requires boolean operands")
-            if left == True:
-                return True
-            right = evalInEnv(env, r)
-            if not isinstance(right, bool):
-                raise EvalError("Or operator requires boolean operands")
-            return right
-
-        case Not(e):
-            value = evalInEnv(env, e)
-            if not isinstance(value, bool):
-                raise EvalError("Not operator requires boolean operands")
-            return not value
+            case Or(l, r):
+                value = boolOperand(evalInEnv(env, l), "Or") or boolOperand(evalInEnv(env, r), "Or")
+
+            case Not(e):
+                value = not boolOperand(evalInEnv(env, e), "Not")
         
-        case Name(name):
-            value = lookupEnv(name, env)
-            if value is None:
-                raise EvalError(f"unbound Name: {name}")
-            return getLoc(value)
+            case Name(name):
+                value = lookupValue(env, name)
         
-        case Let(name, defn, body):
-            if name == "":
-                raise EvalError("Name cannot be empty")
-            if not isinstance(name, str):
-                raise EvalError("Name must be a string")
-
-            # Evaluate the definition and wrap it in a new location
-            defn_val = evalInEnv(env, defn)
-            loc = newLoc(defn_val)
-
-            # Extend the environment with the name pointing to the location
-            newEnv = extendEnv(name, loc, env)
-
-            # evaluate the body in the extended environment
-            return evalInEnv(newEnv, body)
-
-            # # Get expression of name
-            # new_defn = evalInEnv(env, defn)
-            # # Extend env with name
-            # newEnv = extendEnv(name, new_defn, env)
-            # return evalInEnv(newEnv, body)
+            case Let(name, defn, body):
+                if name == "":
+                    raise EvalError("Name cannot be empty")
+                if not isinstance(name, str):
+                    raise EvalError("Name must be a string")
+
+                # Evaluate the definition and bind name to it in a new location,
+                # then evaluate the body in the extended environment
+                env, expr = bindLet(env, name, defn), body
+                continue
         
-        case Eq(l, r): # Pretty sure i can just remove all if statements but the first one
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            # check if left and right are the same type
-            # while also excepting mixed types, like int and bool
-            if type(left) != type(right):
-                return False  # Just return False if types don't match
-            if isinstance(left, int) and isinstance(right, int):
-                return left == right
-            elif isinstance(left, bool) and isinstance(right, bool):
-                return left == right
-            elif isinstance(left, Tune) and isinstance(right, Tune):
-                return left == right
-            elif isinstance(left, Note) and isinstance(right, Note):
-                return left == right
-            else:
-                raise EvalError("Must compare using int, bool, Tune, or Note types")
+            case Eq(l, r):
+                value = eqValues(evalInEnv(env, l), evalInEnv(env, r))
             
-        case Neq(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            # check if left and right are the same type
-            # while also excepting mixed types, like int and bool
-            if type(left) != type(right):
-                return False
-            if isinstance(left, bool) and isinstance(right, bool):
-                return left != right
-            elif isinstance(left, int) and isinstance(right, int):
-                return left != right
-            elif isinstance(left, Tune) and isinstance(right, Tune):
-                return left != right
-            elif isinstance(left, Note) and isinstance(right, Note):
-                return left != right
-            else:
-                raise EvalError("Must compare using int, bool, Tune, or Note types")
+            case Neq(l, r):
+                value = neqValues(evalInEnv(env, l), evalInEnv(env, r))
         
-        case Lt(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if type(left) == int and type(right) == int:
-                return left < right
-            else:
-                raise EvalError("operand must be integer")
-            
-        case LorE(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, int) and isinstance(right, int):
-                return left <= right
-            else:
-                raise EvalError("operand must be integer")
+            case Lt(l, r):
+                value = ltValues(evalInEnv(env, l), evalInEnv(env, r))
             
-        case Gt(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, int) and isinstance(right, int):
-                return left > right
-            else:
-                raise EvalError("operand must be integer")
+            case LorE(l, r):
+                value = loreValues(evalInEnv(env, l), evalInEnv(env, r))
             
-        case GorE(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if isinstance(left, int) and isinstance(right, int):
-                return left >= right
-            else:
-                raise EvalError("operand must be integer")
+            case Gt(l, r):
+                value = gtValues(evalInEnv(env, l), evalInEnv(env, r))
             
-        case If(c, t, e):
-            cond = evalInEnv(env, c)
-            if not isinstance(cond, bool):
-                raise EvalError("If condition must be boolean")
-
-            if cond: # if condition is true
-                then_branch = evalInEnv(env, t)
-                # if not isinstance(then_branch, (int, bool)):
-                #     raise EvalError("If then must be int or bool")
-                return then_branch
-            else:   # condition is false
-                else_branch = evalInEnv(env, e)
-                # if not isinstance(else_branch, (int, bool)):
-                #     raise EvalError("If else must be int or bool")
-                return else_branch
-
-        case Ifnz(c, t, e):
-            cond = evalInEnv(env, c)
-            if not isinstance(cond, int):
-                raise EvalError("Ifnz condition must be an int")
+            case GorE(l, r):
+                value = goreValues(evalInEnv(env, l), evalInEnv(env, r))
             
-            if cond: # if condition is true
-                then_branch = evalInEnv(env, t)
-                if not isinstance(then_branch, (int, bool)):
-                    raise EvalError("Ifnz then must be int or bool")
-                return then_branch
-            else:   # condition is false
-                else_branch = evalInEnv(env, e)
-                if not isinstance(else_branch, (int, bool)):
-                    raise EvalError("Ifnz else must be int or bool")
-                return else_branch
-
-        case Letfun(n, p, b, i):
-            # Check for duplicate params
-            # seen = [] # we will use this to check with "in" if the value is there twice
-            # for param in p:
-            #     if param in seen:
-            #         raise EvalError("Duplicate parameter names in function definition: {p}")
-            #     seen.append(i)
-            c = Closure(p, b, env)
-            l = newLoc(c)
-            newEnv = extendEnv(n, l, env)
-            c.env = newEnv
-            return evalInEnv(newEnv, i)
-
-        case App(f, a):
-            fun = evalInEnv(env, f)
-            if not isinstance(fun, Closure):
-                raise EvalError("Attempted to call a non-function")
-            # if len(fun.params) != len(a):
-            #     raise EvalError(f"Function expects {len(fun.params)} arguments but got {len(a)}")
-            arg = evalInEnv(env, a)
-            # for arg in a:
-            #     value = evalInEnv(env, arg)
-            #     args.append(value)
-            c: Closure = fun
-            l = newLoc(arg)
-            newEnv = extendEnv(c.param, l, c.env)
-            # for i in range(len(fun.params)):
-            #     name = fun.params[i]
-            #     value = args[i]
-            return evalInEnv(newEnv, c.body)
-
-        case Assign(n, e1):
-            l = lookupEnv(n, env)
-            if l is None:
-                raise EvalError(f"unbound name {n}")
-            v_l = getLoc(l)
-            if isinstance(v_l, Closure):
-                raise EvalError(f"cannot assign to function name {n}")
-            v = evalInEnv(env, e1)
-            setLoc(l, v)
-            return v
+            case If(c, t, e):
+                expr = t if ifCondition(evalInEnv(env, c)) else e
+                continue
+
+            case Ifnz(c, t, e):
+                if ifnzCondition(evalInEnv(env, c)):
+                    expr, branch = t, "then"
+                else:
+                    expr, branch = e, "else"
+                continue
+
+            case Letfun(n, p, b, i):
+                env, expr = bindLetfun(env, n, p, b), i
+                continue
+
+            case App(f, a):
+                fun = callee(evalInEnv(env, f))
+                env, expr = callEnv(fun, evalInEnv(env, a)), fun.body
+                continue
+
+            case Assign(n, e1):
+                l = assignableLoc(env, n)
+                v = evalInEnv(env, e1)
+                setLoc(l, v)
+                value = v
         
-        case Seq(e1, e2):
-            evalInEnv(env, e1)
-            return evalInEnv(env, e2)
-
-        case Show(e):
-            # evaluate e to a value v
-            v = evalInEnv(env, e)
-            # Show v in a suitable way
-            match v:
-                case int() | bool():
-                    print(v)
-                case Note() | Tune() | Track():
-                    print("showing midi file")
-                    CreateMidiFile(v, 0)
-                    os.startfile(FILENAME)
-            return v
+            case Seq(e1, e2):
+                evalInEnv(env, e1)
+                expr = e2
+                continue
+
+            case Block(stmts):
+                # a loop rather than a Seq chain, so long programs don't nest evalInEnv calls
+                for stmt in stmts[:-1]:
+                    env, _ = evalStatement(env, stmt)
+                if isinstance(stmts[-1], Import):
+                    value = evalStatement(env, stmts[-1])[1]
+                else:
+                    expr = stmts[-1]
+                    continue
+
+            case Import():
+                value = evalStatement(env, expr)[1]
+
+            case Show(e):
+                value = showValue(evalInEnv(env, e))
         
-        case Read():
-            user_input = input("Enter an integer >> ")
-            # try if the input is int, else throw exception
-            try:
-                return int(user_input)
-            except ValueError:
-                raise EvalError(f"Expected an integer, got: {user_input}")
-                
-
-        # ----- Domain-specific extension (Tunes) ----- #
-        case Note(name, d):
-            if not isinstance(name, str):
-                raise EvalError("Note name must be a string")
-            if name not in NOTE_TO_MIDI:
-                raise EvalError(f"Invalid note name: {name}. Must be one of {list(NOTE_TO_MIDI.keys())}")
-            duration = evalInEnv(env, d)
-
-            # Check for duration
-            if not isinstance(duration, int) or duration <= 0:
-                raise EvalError("Note duration must be a positive integer")
-            return Note(name, duration)
+            case Read():
+                value = readValue()
+
+            # ----- Domain-specific extension (Tunes) ----- #
+            case Note(name, d, volume):
+                checkPitch(name)
+                value = noteValue(name, evalInEnv(env, d), volume)
         
-        case Tune(n, ins):
-            if not isinstance(n, list):
-                raise EvalError("Tunes must be a list of notes")
-            instrument = evalInEnv(env, ins)
-            if not isinstance(instrument, int):
-                raise EvalError("Tune must be an integer expression for instruments")
-            if instrument < 1 or instrument > 128:
-                raise EvalError("instrument must be between 1 - 128")
-            # Check if all elements in the list (n) are valid objects
-            result = []
-            for note in n:
-                if not isinstance(note, (Tune, Note, Repeat, Volume)):
-                    raise EvalError("Tunes must contain only Tune or Note objects")
-                note_value = evalInEnv(env, note)
-                result.append(note_value)
-            return Tune(result, instrument-1)
-
-        case ConcatTunes(l, r):
-            left = evalInEnv(env, l)
-            right = evalInEnv(env, r)
-            if not isinstance(left, Tune) or not isinstance(right, Tune):
-                raise EvalError("ConcatTunes must be two Tunes")
-            return Tune(left.notes + right.notes, left.instrument + right.instrument)
-
-        case Transpose(t, s):
-            if not isinstance(t, Tune):
-                raise EvalError("Transpose can only tune up or down Tunes")
-            steps = evalInEnv(env, s)
-            if not isinstance(steps, int):
-                raise EvalError("Transpose steps must be an integer")
-            return TransposeNote(evalInEnv(env, t), steps)
-
-        case Repeat(t, r):
-            # evaluate Tunes (t) and Expr (r) before repeating
-            t_v = evalInEnv(env, t)
-            r_v = evalInEnv(env, r)
-            # check if either values are of correct types
-            # if not isinstance(t_v, (Tune, Note, Volume, Repeat)): # yes i am allowing Repeat over Repeat, i am aware
-            #     raise EvalError("Repeat expects a Tune, Note, Volume, or Repeat object")
-            if not isinstance(r_v, int):
-                raise EvalError("Repeat expects an int for repetition")
-            if isinstance(t_v, Repeat):
-                t_v = evalInEnv(env, t_v)
-            # return the Tune or Note that is to be repeated on r times
-            match t_v:
-                case Tune(n, ins):
-                    return Tune(n * r_v, ins)
-                case Note(name, d):
-                    return Tune([Note(name, d)] * r_v, instrument=DEFAULT_INSTRUMENT)
-                case _:
-                    raise EvalError("Repeat contains invalid expression")
-
-        case Volume(t, l):
-            # evaluate Note (t) and Expr (l) before changing volume
-            t_v = evalInEnv(env, t)
-            l_v = evalInEnv(env, l)
-            if not isinstance(t_v, Note):
-                raise EvalError("Volume expects a Note")
-            if not isinstance(l_v, int):
-                raise EvalError("Volume expects an integer for its volume level")
-            if not (0 <= l_v <= 127):
-                raise EvalError("volume level must be between 0 and 127")
-            return Note(t_v.pitch, t_v.duration, volume=l_v) # return a note for modified volume
-
-        case Track(t):
-            t_v = [evalInEnv(env, e) for e in t]
-            if len(t_v) < 1 or len(t_v) > 16:
-                raise EvalError("Track can only contain 0 - 16 individual tracks")
-            if not all(isinstance(ev, Tune) for ev in t_v):
-                raise EvalError("Track expects only Tune objects")
-            return Track(t_v)
+            case Tune(n, ins):
+                if not isinstance(n, tuple):
+                    raise EvalError("Tunes must be a list of notes")
+                instrument = tuneInstrument(evalInEnv(env, ins))
+                # Check if all elements in the list (n) are valid objects
+                result = []
+                for note in n:
+                    checkTuneItem(type(note))
+                    result.append(evalInEnv(env, note))
+                value = Tune(tuple(result), instrument-1)
+
+            case ConcatTunes(l, r):
+                value = concatValues(evalInEnv(env, l), evalInEnv(env, r))
+
+            case Transpose(t, s):
+                checkTransposable(type(t))
+                steps = transposeSteps(evalInEnv(env, s))
+                value = TransposeNote(evalInEnv(env, t), steps)
+
+            case Repeat(t, r):
+                # evaluate Tunes (t) and Expr (r) before repeating
+                value = repeatValue(evalInEnv(env, t), evalInEnv(env, r))
+
+            case Volume(t, l):
+                # evaluate Note (t) and Expr (l) before changing volume
+                value = volumeValue(evalInEnv(env, t), evalInEnv(env, l))
+
+            case Track(t):
+                value = trackValue([evalInEnv(env, e) for e in t])
 
+            case _:
+                raise EvalError(f"unknown expression: {expr}")
+
+        if branch is not None:
+            # every Ifnz's check is the same, so the innermost one's error is the one raised
+            ifnzResult(value, branch)
+        return value
+
+
+def evaluate(expr: Expr, engine: str = 'tree') -> Value:
+    '''Evaluates expr with the named evaluator: 'tree' (evalInEnv),
+    'closure' (closures.compile_expr), 'vm' (vm.execute), 'python'
+    (codegen.execute), 'frames' (resolver.evalResolved) or 'stack'
+    (stack_eval.evalIterative)'''
+    match engine:
+        case 'tree':
+            return eval(expr)
+        case 'closure':
+            from closures import compile_expr # closures imports this file
+            return compile_expr(expr)(emptyEnv)
+        case 'vm':
+            from vm import bytecode_cache, execute
+            return execute(bytecode_cache.compile(expr))
+        case 'python':
+            from codegen import code_cache, execute
+            return execute(code_cache.compile(expr))
+        case 'frames':
+            from resolver import resolve, evalResolved
+            return evalResolved(resolve(expr))
+        case 'stack':
+            from stack_eval import evalIterative
+            return evalIterative(expr)
         case _:
-            raise EvalError(f"unknown expression: {expr}")
+            raise ValueError(f"unknown evaluation engine: {engine}")
 
-
-def run(expr: Expr) -> None:
+def run(expr: Expr, engine: str = 'tree') -> None:
     print(f"Running: {expr}")
     try:
-        result = eval(expr)
-        match result: 
-            case int() | bool():
-                print(f"Result: {result}\n")
-            
-            case Tune() | Track():
-                if type(expr) == ConcatTunes or type(expr) == Transpose:
-                    print(f"Result: {result}")
+        report(expr, evaluate(expr, engine))
+    except EvalError as err:
+        print("ERROR: ", err, "\n")
 
-                CreateMidiFile(result, 1)
-                print() # Creates new line
-                # os.startfile(FILENAME) # This is for Windows only
+def report(expr: Expr, result: Value) -> None:
+    '''Prints (or writes the MIDI file for) the result of running expr'''
+    match result: 
+        case int() | bool():
+            print(f"Result: {result}\n")
+        
+        case Tune() | Track():
+            if type(expr) == ConcatTunes or type(expr) == Transpose:
+                print(f"Result: {result}")
 
-            case Note():
-                print(f"Result: {result}\n")
+            CreateMidiFile(result, 1)
+            print() # Creates new line
+            # os.startfile(FILENAME) # This is for Windows only
 
-    except EvalError as err:
-        print("ERROR: ", err, "\n")
+        case Note():
+            print(f"Result: {result}\n")
 
 
 # math : Expr = Add(Lit(1), Mul(Lit(2), Lit(3)))
@@ -963,11 +1066,11 @@ def run(expr: Expr) -> None:
 # run (b)
 # # Result: Note(Pitch: C, Duration: 3)
 
-# c : Expr = Tune([a, b], Lit(1))
+# c : Expr = Tune((a, b), Lit(1))
 # run (c)
 # # MIDI saves as answer.midi
 
-# d : Expr = Tune([Note("A", Lit(1)), Note("B", Lit(2))], Lit(1))
+# d : Expr = Tune((Note("A", Lit(1)), Note("B", Lit(2))), Lit(1))
 # run (d)
 # # MIDI saves as answer.midi
 
@@ -982,13 +1085,13 @@ def run(expr: Expr) -> None:
 # # MIDI saves as answer.midi
 
 # # Simple song test
-# twinkle_star : Expr = Tune([
+# twinkle_star : Expr = Tune((
 #     Note("C", Lit(1)), Note("C", Lit(1)), Note("G", Lit(1)), Note("G", Lit(1)),
 #     Note("A", Lit(1)), Note("A", Lit(1)), Note("G", Lit(2)),
 
 #     Note("F", Lit(1)), Note("F", Lit(1)), Note("E", Lit(1)), Note("E", Lit(1)),
 #     Note("D", Lit(1)), Note("D", Lit(1)), Note("C", Lit(2)),
-# ], Lit(10))
+# ), Lit(10))
 # run(twinkle_star)
 # # MIDI saves as answer.midi
 
@@ -0,0 +1,78 @@
+# import "file.tune": sharing definitions between programs
+'''
+`import "lib/drums.tune"; rest` makes the definitions of lib/drums.tune
+available to the statements after the import in the same Block. A
+module's definitions are the let/letfun chains its top-level statements
+start with (see interp.evalDefinitions), so a library looks like
+
+    let organ = 17 in
+    letfun beat(n) = tune [ repeat(note C1 for 1 seconds, n) ](organ) in
+    0 end end
+
+A module's own imports are looked for next to it first, then in
+MODULE_PATH, in order; a program's only in MODULE_PATH. That starts out
+as MODULE_ROOT, the directory of this file, so where a program is run
+from doesn't matter. Each module is evaluated in its own fresh
+environment, so it only sees its own definitions and imports, not the
+importer's.
+
+A module's text is parsed only once. The AST is cached by a hash of the
+text, in memory and on disk (MODULE_CACHE_DIR under MODULE_ROOT, see parse_cache), so every
+program that imports a library reuses it and a changed file is simply a
+new key. Evaluating the definitions is cheap and happens on every import,
+so programs never share mutable state through a module.
+'''
+from pathlib import Path
+
+from interp import Expr, Env, Loc, Value, EvalError, emptyEnv, evalDefinitions
+from parse_cache import ParseCache
+from parse_run import ParseError
+
+MODULE_ROOT = Path(__file__).resolve().parent
+MODULE_PATH: list[Path] = [MODULE_ROOT]   # where import "x" looks for x
+MODULE_CACHE_DIR = MODULE_ROOT / '.module_cache'
+
+_cache: ParseCache | None = None
+_importing: list[Path] = []   # modules being imported right now, to catch cycles
+
+def module_cache() -> ParseCache:
+    '''The ParseCache holding parsed modules, created on first use'''
+    global _cache
+    if _cache is None:
+        _cache = ParseCache(max_entries=256, disk_dir=MODULE_CACHE_DIR)
+    return _cache
+
+def find_module(path: str, importer: Path | None = None) -> Path:
+    '''The file import "path" names, in the directory of importer (the
+    importing module's file) if it is there'''
+    for directory in ([importer.parent] if importer else []) + MODULE_PATH:
+        candidate = directory / path
+        if candidate.is_file():
+            return candidate.resolve()
+    raise EvalError(f"cannot find module {path!r}")
+
+def load_module(path: str, importer: Path | None = None) -> Expr:
+    '''Returns the AST of the module at path, parsing it only if its text is new'''
+    return _parse_module(find_module(path, importer), path)
+
+def _parse_module(file: Path, path: str) -> Expr:
+    try:
+        source = file.read_text(encoding='utf-8')
+    except (OSError, UnicodeDecodeError) as e:
+        raise EvalError(f"cannot read module {path!r}: {e}")
+    try:
+        return module_cache().parse(source)
+    except ParseError as e:
+        raise EvalError(f"parse error in module {path!r}: {e}")
+
+def import_module(path: str, env: Env[Loc[Value]]) -> Env[Loc[Value]]:
+    '''env extended with the definitions of the module at path'''
+    file = find_module(path, _importing[-1] if _importing else None)
+    if file in _importing:
+        raise EvalError(f"circular import of module {path!r}")
+    _importing.append(file)
+    try:
+        definitions = evalDefinitions(emptyEnv, _parse_module(file, path))
+    finally:
+        _importing.pop()
+    return definitions + env
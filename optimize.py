@@ -0,0 +1,234 @@
+# Constant folding: evaluating the parts of a program that don't depend on its run
+'''
+Generated programs are full of subtrees whose value is already known, such
+as `note C4 for 2 * 24 seconds`, `if true then ... else ...` or
+`let x = 5 in x + 1 end`, and every engine works them out again on every
+run and in every call of the function they are in. optimize() gives a
+copy of the tree with them worked out:
+
+  - arithmetic, comparisons and And/Or/Not with literal operands become
+    the literal they evaluate to
+  - an If or Ifnz with a literal condition becomes the branch it takes
+    (an Ifnz keeps its check of the branch's value unless that is a
+    literal that passes it: the other branch just becomes 0)
+  - a Seq or a Block statement whose value is dropped and is a literal goes
+  - a Let of a literal whose name is used at most once in its body is
+    replaced by its body, with the literal in place of the name
+
+Only operations the interp value functions succeed on are folded: one
+that would raise an EvalError (`1 / 0`, `if 3 then ...`) is left in
+place, so the program still raises it when run, at the same point. A Let
+whose name the body assigns, or whose body imports a module (which may
+bind the same name), isn't inlined, and neither is anything in a position
+whose node type is checked (a Tune's items, what a Transpose transposes).
+Nodes are rebuilt only where something changed; the rest are shared with
+the original tree.
+
+    expr, removed = optimize(parse_to_ast(source))
+
+removed is how many nodes the optimized tree has fewer than expr. Only
+optimize programs, not modules: a module's top-level lets are its exports.
+'''
+from dataclasses import fields, replace
+
+from interp import Expr, EvalError, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, Name, Eq, Neq, Lt, \
+    LorE, Gt, GorE, If, Ifnz, Letfun, Assign, Seq, Block, Import, Tune, Transpose, addValues, subValues, \
+    mulValues, divValues, negValue, boolOperand, eqValues, neqValues, ltValues, loreValues, gtValues, \
+    goreValues, ifCondition, ifnzCondition, ifnzResult
+
+_BINARY = {Add: addValues, Sub: subValues, Mul: mulValues, Div: divValues, Eq: eqValues, Neq: neqValues,
+           Lt: ltValues, LorE: loreValues, Gt: gtValues, GorE: goreValues}
+
+def _is_node(value) -> bool:
+    return hasattr(value, '__dataclass_fields__')
+
+def optimize(expr: Expr) -> tuple[Expr, int]:
+    '''expr with its constant parts folded, and the number of nodes removed'''
+    folded = _fold(expr)
+    return folded, size(expr) - size(folded)
+
+def size(expr: Expr) -> int:
+    '''Number of nodes in expr (a shared subtree counts once per use)'''
+    count = 0
+    todo = [expr]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, tuple):
+            todo.extend(node)
+        elif _is_node(node):
+            count += 1
+            todo.extend(getattr(node, f.name) for f in fields(node))
+    return count
+
+# ----- Folding ----- #
+
+def _fold(expr: Expr) -> Expr:
+    fn = _BINARY.get(type(expr))
+    if fn is not None:
+        left, right = (_fold(getattr(expr, f)) for f in expr.__match_args__)
+        if isinstance(left, Lit) and isinstance(right, Lit):
+            try:
+                return Lit(fn(left.value, right.value))
+            except EvalError:
+                pass
+        return _rebuild(expr, left, right)
+
+    match expr:
+        case Neg(e) | Not(e):
+            e = _fold(e)
+            if isinstance(e, Lit):
+                try:
+                    return Lit(negValue(e.value) if isinstance(expr, Neg) else not boolOperand(e.value, "Not"))
+                except EvalError:
+                    pass
+            return _rebuild(expr, e)
+
+        case And(l, r) | Or(l, r):
+            op = type(expr).__name__
+            l, r = _fold(l), _fold(r)
+            try:
+                if isinstance(l, Lit):
+                    if boolOperand(l.value, op) == (op == "Or"):
+                        return l   # False for And, True for Or: r isn't evaluated
+                    if isinstance(r, Lit):
+                        return Lit(boolOperand(r.value, op))
+            except EvalError:
+                pass
+            return _rebuild(expr, l, r)
+
+        case If(c, t, e):
+            c = _fold(c)
+            if isinstance(c, Lit):
+                try:
+                    return _fold(t if ifCondition(c.value) else e)
+                except EvalError:
+                    pass
+            return _rebuild(expr, c, _fold(t), _fold(e))
+
+        case Ifnz(c, t, e):
+            c = _fold(c)
+            if isinstance(c, Lit):
+                try:
+                    taken = bool(ifnzCondition(c.value))
+                except EvalError:
+                    taken = None
+                if taken is not None:
+                    branch = _fold(t if taken else e)
+                    if isinstance(branch, Lit):
+                        try:
+                            ifnzResult(branch.value, "then" if taken else "else")
+                            return branch
+                        except EvalError:
+                            pass
+                    return Ifnz(c, branch, Lit(0)) if taken else Ifnz(c, Lit(0), branch)
+            return _rebuild(expr, c, _fold(t), _fold(e))
+
+        case Let(name, defn, body) if isinstance(name, str) and name != "":
+            defn = _fold(defn)
+            if isinstance(defn, Lit) and _uses(body, name) <= 1:
+                return _fold(_substitute(body, name, defn))
+            return _rebuild(expr, name, defn, _fold(body))
+
+        case Seq(e1, e2):
+            e1, e2 = _fold(e1), _fold(e2)
+            if isinstance(e1, Lit):
+                return e2
+            return _rebuild(expr, e1, e2)
+
+        case Block(stmts) if stmts:
+            folded = [_fold(s) for s in stmts]
+            kept = [s for s in folded[:-1] if not isinstance(s, Lit)] + folded[-1:]
+            if len(kept) == 1 and not isinstance(kept[0], Import):
+                return kept[0]
+            if all(a is b for a, b in zip(kept, stmts)) and len(kept) == len(stmts):
+                return expr
+            return Block(tuple(kept))
+
+        # ----- Domain-specific extension (Tunes) ----- #
+        # the items' node types are checked, so only what is inside them is folded
+        case Tune(n, ins):
+            notes = tuple(_inside(note) for note in n) if isinstance(n, tuple) else n
+            if isinstance(n, tuple) and all(a is b for a, b in zip(notes, n)):
+                notes = n
+            return _rebuild(expr, notes, _fold(ins))
+
+        case Transpose(t, s):
+            return _rebuild(expr, _inside(t), _fold(s))
+
+        case _:
+            return _inside(expr)
+
+def _inside(expr: Expr) -> Expr:
+    '''expr, of the same node type, with its subtrees folded'''
+    if not _is_node(expr):
+        return expr
+    changes = {}
+    for f in fields(expr):
+        value = getattr(expr, f.name)
+        if isinstance(value, tuple):
+            items = tuple(_fold(item) for item in value)
+            if any(a is not b for a, b in zip(items, value)):
+                changes[f.name] = items
+        elif _is_node(value):
+            changes[f.name] = _fold(value)
+    return _rebuild_fields(expr, changes)
+
+def _rebuild(expr: Expr, *values) -> Expr:
+    '''expr with the given fields, in order, or expr itself if they are the ones it has'''
+    if all(v is getattr(expr, f) for f, v in zip(expr.__match_args__, values)):
+        return expr
+    return type(expr)(*values)
+
+def _rebuild_fields(expr: Expr, changes: dict) -> Expr:
+    changes = {k: v for k, v in changes.items() if v is not getattr(expr, k)}
+    return replace(expr, **changes) if changes else expr
+
+# ----- Let inlining ----- #
+
+def _uses(expr: Expr, name: str) -> int:
+    '''How many times name, unshadowed, is used in expr; an Assign to it or an
+    Import anywhere counts as two, so that neither is ever inlined'''
+    match expr:
+        case Name(n):
+            return 1 if n == name else 0
+        case Assign(n, e1):
+            return (2 if n == name else 0) + _uses(e1, name)
+        case Import():
+            return 2
+        case Let(n, defn, body):
+            return _uses(defn, name) + (0 if n == name else _uses(body, name))
+        case Letfun(n, p, b, i):
+            if n == name:
+                return 0
+            return (0 if p == name else _uses(b, name)) + _uses(i, name)
+        case tuple():
+            return sum(_uses(item, name) for item in expr)
+        case _ if _is_node(expr):
+            return sum(_uses(getattr(expr, f.name), name) for f in fields(expr))
+        case _:
+            return 0
+
+def _substitute(expr: Expr, name: str, lit: Lit) -> Expr:
+    '''expr with lit in place of the unshadowed uses of name'''
+    match expr:
+        case Name(n):
+            return lit if n == name else expr
+        case Let(n, defn, body) if n == name:
+            return _rebuild(expr, n, _substitute(defn, name, lit), body)
+        case Letfun(n, p, b, i):
+            if n == name:
+                return expr
+            return _rebuild(expr, n, p, b if p == name else _substitute(b, name, lit), _substitute(i, name, lit))
+        case _ if _is_node(expr):
+            changes = {}
+            for f in fields(expr):
+                value = getattr(expr, f.name)
+                if isinstance(value, tuple):
+                    items = tuple(_substitute(item, name, lit) for item in value)
+                    if any(a is not b for a, b in zip(items, value)):
+                        changes[f.name] = items
+                else:
+                    changes[f.name] = _substitute(value, name, lit)
+            return _rebuild_fields(expr, changes)
+        case _:
+            return expr
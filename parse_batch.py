@@ -0,0 +1,134 @@
+# Parsing many programs at once across a process pool
+'''
+parse_many() parses a batch of sources (e.g. a night's worth of .tune files)
+on several processes. Each worker builds its parser once, when it starts,
+and then only parses. Sources are sent in chunks of consecutive items
+rather than one at a time, so a batch of small sources isn't dominated by
+the cost of shipping each one to a worker and its AST back.
+
+Results come back in the order of the sources. A source that doesn't parse
+gets its ParseError / AmbiguousParse in its result instead of failing the
+whole batch.
+
+parse_parallel() does the same within one big program: it splits it at its
+top-level ';'s (statements.statement_spans, a scan rather than a parse),
+parses runs of consecutive statements with parse_many() and joins the
+statements back into the one Block that parse_to_ast() would have built.
+'''
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import os
+
+from interp import Expr, Block
+from parse_run import parse_to_ast, get_parser, ParseError, AmbiguousParse
+from statements import statement_spans
+
+@dataclass
+class ParseOutcome:
+    ast: Expr | None = None                             # set if the source parsed
+    error: ParseError | AmbiguousParse | None = None    # set if it didn't
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def parse_many(sources: Iterable[str], workers: int | None = None, engine: str = 'lalr',
+               chunksize: int = 64, chunk_chars: int = 64_000) -> list[ParseOutcome]:
+    '''Parses every source with parse_to_ast(source, engine), on `workers`
+    processes (default: one per CPU; 1 parses in this process). A chunk sent
+    to a worker holds at most chunksize sources and stops growing once it
+    holds chunk_chars characters.'''
+    sources = list(sources)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    _preload(engine)   # checks engine; forked workers also start with it built
+    if workers == 1 or len(sources) <= 1:
+        return _parse_chunk(sources, engine)
+    chunks = list(_chunks(sources, chunksize, chunk_chars))
+    workers = min(workers, len(chunks))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_preload, initargs=(engine,)) as pool:
+        results = []
+        for outcomes in pool.map(_parse_chunk, chunks, [engine] * len(chunks)):
+            results.extend(outcomes)
+    return results
+
+def _chunks(sources: list[str], chunksize: int, chunk_chars: int) -> Iterator[list[str]]:
+    chunk, chars = [], 0
+    for source in sources:
+        chunk.append(source)
+        chars += len(source)
+        if len(chunk) >= chunksize or chars >= chunk_chars:
+            yield chunk
+            chunk, chars = [], 0
+    if chunk:
+        yield chunk
+
+def parse_parallel(source: str, workers: int | None = None, engine: str = 'lalr',
+                   segment_chars: int | None = None) -> Expr:
+    '''parse_to_ast(source, engine), with runs of top-level statements parsed on
+    `workers` processes. Each run is about segment_chars long (by default,
+    enough for four runs per worker).'''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    spans = statement_spans(source)
+    if workers == 1 or len(spans) < 2:
+        return parse_to_ast(source, engine)
+    if segment_chars is None:
+        segment_chars = max(len(source) // (workers * 4), 1)
+    # runs of whole statements, each run's statements joined by their own ';'s
+    segments, counts = [], []
+    first = 0
+    for i, (_, end) in enumerate(spans):
+        if i == len(spans) - 1 or end - spans[first][0] >= segment_chars:
+            segments.append(source[spans[first][0]:end])
+            counts.append(i + 1 - first)
+            first = i + 1
+    stmts = []
+    outcomes = parse_many(segments, workers=min(workers, len(segments)), engine=engine, chunksize=1)
+    for outcome, count in zip(outcomes, counts):
+        ast = outcome.ast
+        if count == 1 and ast is not None and not isinstance(ast, Block):
+            stmts.append(ast)
+        elif isinstance(ast, Block) and len(ast.stmts) == count:
+            stmts.extend(ast.stmts)
+        else:
+            # a syntax error (reported properly by a full parse, with the right
+            # line numbers), or the scan split the statements in the wrong places
+            # (a segment it took for one statement that parses to a Block)
+            return parse_to_ast(source, engine)
+    return Block(tuple(stmts))
+
+# ----- Worker side ----- #
+
+def _preload(engine: str):
+    '''Pool initializer: build (or load the cached) parser before the first chunk'''
+    match engine:
+        case 'lalr':
+            get_parser('lalr_ast')
+        case 'earley':
+            get_parser('earley')
+        case 'pratt':
+            import pratt
+        case _:
+            raise ValueError(f"unknown parser engine: {engine}")
+
+def _parse_chunk(sources: list[str], engine: str) -> list[ParseOutcome]:
+    outcomes = []
+    for source in sources:
+        try:
+            outcomes.append(ParseOutcome(ast=parse_to_ast(source, engine)))
+        except (ParseError, AmbiguousParse) as e:
+            outcomes.append(ParseOutcome(error=_portable(e)))
+    return outcomes
+
+def _portable(e: ParseError | AmbiguousParse) -> ParseError | AmbiguousParse:
+    # a ParseError wrapping a lark exception drags the parser state along when
+    # it's pickled back to the parent; only its message is worth sending
+    if type(e) is ParseError:
+        return ParseError(str(e))
+    return e
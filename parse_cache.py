@@ -0,0 +1,141 @@
+# Content-hash cache in front of parse_to_ast()
+'''
+Programs that come back with the exact same text (templated songs, retries,
+the same library snippet) don't need to be parsed again. ParseCache keys the
+built Expr by a hash of the source text and keeps the most recently used ones
+in memory, bounded by entry count and/or by size. With a disk_dir it also
+keeps a copy of every AST it builds on disk, so a restarted process starts
+warm.
+
+Keys also cover what parsing and storing depend on besides the text: the
+engine, the grammar files and the AST encoding (ast_codec.VERSION).
+Changing any of them just means new keys, so an AST parsed under an older
+grammar is never served for a newer one.
+
+The Expr handed back is shared between every caller that asks for the same
+source, so treat it as read-only.
+'''
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import hashlib
+import os
+
+import ast_codec
+import parse_run
+from ast_codec import dump_ast, load_ast, AstFormatError
+from interp import Expr
+from parse_run import parse_to_ast
+
+GRAMMAR_FILES = ('expr.lark', 'expr_lalr.lark')
+
+def parser_version() -> str:
+    '''A hash of the grammars, reserved words and AST encoding, which a cached AST is only valid for'''
+    h = hashlib.sha256(f"{ast_codec.VERSION}\0".encode())
+    for name in GRAMMAR_FILES:
+        h.update((parse_run.GRAMMAR_DIR / name).read_bytes())
+    h.update(' '.join(sorted(parse_run.RESERVED_WORDS)).encode())   # not in the grammar files
+    return h.hexdigest()[:16]
+
+@dataclass
+class CacheStats:
+    hits: int = 0        # found in memory
+    disk_hits: int = 0   # found on disk (and moved back into memory)
+    misses: int = 0      # had to be parsed
+    evictions: int = 0   # dropped from memory to stay within the limits
+
+class ParseCache:
+    def __init__(self, max_entries: int | None = 1024, max_bytes: int | None = None,
+                 disk_dir: str | Path | None = None, engine: str = 'lalr'):
+        '''max_entries / max_bytes bound the in-memory tier (None for no limit);
+        an entry's size is the length of its encoded AST (see ast_codec)'''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.engine = engine
+        self.version = parser_version()
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[Expr, int]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def key(self, source: str) -> str:
+        return hashlib.sha256(f"{self.version}\0{self.engine}\0{source}".encode()).hexdigest()
+
+    def parse(self, source: str) -> Expr:
+        '''Returns the AST of source, parsing it only if neither tier has it'''
+        key = self.key(source)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+        data = self._read_disk(key)
+        ast = self._decode(data) if data is not None else None
+        if ast is not None:
+            self.stats.disk_hits += 1
+        else:
+            self.stats.misses += 1
+            ast = parse_to_ast(source, self.engine)   # ParseErrors are not cached
+            data = dump_ast(ast)
+            self._write_disk(key, data)
+        self._insert(key, ast, len(data))
+        return ast
+
+    def clear(self) -> None:
+        '''Empties the in-memory tier (the disk tier is left alone)'''
+        self._entries.clear()
+        self._bytes = 0
+
+    # ----- In-memory LRU ----- #
+
+    def _insert(self, key: str, ast: Expr, size: int) -> None:
+        self._entries[key] = (ast, size)
+        self._bytes += size
+        while self._entries and self._over_limit():
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self.stats.evictions += 1
+
+    def _over_limit(self) -> bool:
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    # ----- On-disk tier ----- #
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.ast"
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if self.disk_dir is None:
+            return None
+        try:
+            return self._path(key).read_bytes()
+        except OSError:
+            return None
+
+    def _decode(self, data: bytes) -> Expr | None:
+        try:
+            return load_ast(data)
+        except AstFormatError:   # truncated, corrupt or older format, parse again and overwrite it
+            return None
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
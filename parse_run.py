@@ -1,20 +1,158 @@
-from interp import Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, Name, Eq, Lt, If, Letfun, App, Assign, Seq, Show, Read, \
-Ifnz, Neq, LorE, Gt, GorE, Expr, Note, Tune, ConcatTunes, Transpose, Repeat, Volume, Track, run
+from interp import Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, Name, Eq, Lt, If, Letfun, App, Assign, Block, Import, Show, Read, \
+Ifnz, Neq, LorE, Gt, GorE, Expr, Note, Tune, ConcatTunes, Transpose, Repeat, Volume, Track, run, \
+PITCH_PATTERN, EvalError, Env, Loc, Value, emptyEnv, evalStatement, report
 
-from lark import Lark, Token, ParseTree, Transformer
-from lark.exceptions import VisitError
+from lark import Lark, Token, ParseTree, Transformer, logger, __version__ as lark_version
+from lark.exceptions import VisitError, GrammarError
+from lark.lexer import PatternRE, TerminalDef
 from pathlib import Path
+from collections.abc import Iterable
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
 
-parser = Lark(Path('expr.lark').read_text(), start='expr0', parser='earley', ambiguity='explicit')
+from hashcons import Interner, interning
+from statements import split_stream
+
+class GrammarConflict(GrammarError):
+    pass
 
 class ParseError(Exception):
     pass
 
+# ----- Reserved words ----- #
+# Every keyword of expr_lalr.lark. No parser (LALR, Earley, Pratt) hands one out
+# as an ID, so `let in = 1 in in end` is a parse error instead of depending on
+# which tokens the contextual lexer happens to expect at that point.
+RESERVED_WORDS = frozenset({
+    'true', 'false', 'show', 'read', 'track', 'let', 'letfun', 'in', 'end',
+    'if', 'then', 'else', 'note', 'for', 'seconds', 'tune', 'transpose', 'by',
+    'repeat', 'volume', 'notes', 'import',
+})
+
+def _reserved_check(tok: Token) -> Token:
+    if tok.value in RESERVED_WORDS:
+        raise ParseError(f"'{tok.value}' is a reserved word and cannot be used as a name (line {tok.line}, column {tok.column})")
+    return tok
+
+LEXER_CALLBACKS = {'ID': _reserved_check}
+
+class _ConflictLog(logging.Handler):
+    '''Collects the shift/reduce warnings lark logs while building LALR tables'''
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.conflicts: list[str] = []
+    def emit(self, record: logging.LogRecord):
+        msg = record.getMessage()
+        if msg.startswith('Shift/Reduce conflict'):
+            self.conflicts.append(msg)
+        elif msg.startswith(' * ') and self.conflicts:
+            self.conflicts[-1] += '\n' + msg
+
+# Every LALR parser is built with these options, in this order: lark's cache
+# file records a hash of them, so a cache entry is only used by the same call.
+LALR_OPTIONS = dict(start='expr0', parser='lalr', lexer='contextual', lexer_callbacks=LEXER_CALLBACKS)
+
+def build_lalr(grammar: str, **options) -> Lark:
+    '''Builds an LALR parser, raising GrammarConflict if the grammar has any
+    shift/reduce conflicts (lark would otherwise silently resolve them as shift).
+    Reduce/reduce conflicts already raise GrammarError inside lark.
+    options (a transformer, cache=...) are passed on to lark.'''
+    log = _ConflictLog()
+    handlers, level = logger.handlers, logger.level
+    # setLevel, not assigning level: it also clears the logger's cache of
+    # which levels are enabled, which lark's own debug messages will have filled
+    logger.handlers = [log]
+    logger.setLevel(logging.DEBUG)
+    try:
+        p = Lark(grammar, **LALR_OPTIONS, **options)
+    finally:
+        logger.handlers = handlers
+        logger.setLevel(level)
+    if log.conflicts:
+        raise GrammarConflict('\n'.join(log.conflicts))
+    keywords = {t.pattern.value for t in p.terminals
+                if t.pattern.type == 'str' and t.pattern.value.isidentifier()}
+    if keywords - RESERVED_WORDS:
+        raise GrammarError(f"keywords missing from RESERVED_WORDS: {sorted(keywords - RESERVED_WORDS)}")
+    return p
+
+# ----- Parser construction ----- #
+# Building the LALR tables dominates startup, so the built parser is saved to
+# PARSER_CACHE_DIR under a name keyed by the grammar hash and the lark version;
+# editing the grammar or upgrading lark just means a new cache file.
+# The saving and loading is lark's own cache= option, which leaves the lexer
+# callbacks and transformer out of the file and attaches the ones given on load.
+# Earley parsers can't be saved by lark, so that one is only built on first use.
+
+GRAMMAR_DIR = Path(__file__).parent
+PARSER_CACHE_DIR = GRAMMAR_DIR / '.parser_cache'
+
+def load_lalr(grammar_file: str, transformer: Transformer | None = None) -> Lark:
+    '''Loads the LALR parser for grammar_file from the cache, building and
+    conflict-checking it first if there is no cache entry for this grammar.
+    A transformer given here runs inline as the parser reduces each rule.
+    A grammar that fails the checks raises every time and is never cached.'''
+    grammar = (GRAMMAR_DIR / grammar_file).read_text()
+    key = hashlib.sha256((grammar + lark_version).encode()).hexdigest()[:16]
+    cached = PARSER_CACHE_DIR / f"{Path(grammar_file).stem}-{key}.lark"
+    if cached.exists():
+        # lark rebuilds (and rewrites) an entry it can't read, such as one
+        # another process is still writing
+        return Lark(grammar, **LALR_OPTIONS, transformer=transformer, cache=str(cached))
+    p = build_lalr(grammar, transformer=transformer)
+    try:
+        PARSER_CACHE_DIR.mkdir(exist_ok=True)
+    except OSError:   # no cache then
+        return p
+    # lark writes a cache= entry before build_lalr could check it, so only a
+    # grammar that passed gets one, built again (once) by lark to save it
+    return Lark(grammar, **LALR_OPTIONS, transformer=transformer, cache=str(cached))
+
+def _unreserved_id(term: TerminalDef):
+    # Earley tries every way to lex, so it can't raise on a reserved ID the
+    # way _reserved_check does; the ID regex never matches one instead
+    if term.name == 'ID':
+        words = '|'.join(sorted(RESERVED_WORDS))
+        term.pattern = PatternRE(f"(?!(?:{words})\\b){term.pattern.value}")
+
+def load_earley(grammar_file: str) -> Lark:
+    return Lark((GRAMMAR_DIR / grammar_file).read_text(), start='expr0', parser='earley', ambiguity='explicit',
+                edit_terminals=_unreserved_id)
+
+PARSER_BUILDERS = {
+    'earley': lambda: load_earley('expr.lark'),
+    'lalr': lambda: load_lalr('expr_lalr.lark'),
+    # parses straight to Expr, see parse_to_ast()
+    'lalr_ast': lambda: load_lalr('expr_lalr.lark', transformer=ToExpr()),
+    'lalr_interned': lambda: load_lalr('expr_lalr.lark', transformer=InterningToExpr()),
+}
+_parsers: dict[str, Lark] = {}
+
+def get_parser(engine: str) -> Lark:
+    '''Returns the parser for engine, building it on first use'''
+    if engine not in _parsers:
+        if engine not in PARSER_BUILDERS:
+            raise ValueError(f"unknown parser engine: {engine}")
+        _parsers[engine] = PARSER_BUILDERS[engine]()
+    return _parsers[engine]
+
+def __getattr__(name: str) -> Lark:
+    # parse_run.parser / parse_run.lalr_parser are still importable
+    if name == 'parser':
+        return get_parser('earley')
+    if name == 'lalr_parser':
+        return get_parser('lalr')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # uncomment code for detailed tree
-def just_parse(s:str) -> (Expr|None):   
+def just_parse(s:str, engine:str='earley') -> (Expr|None):   
     '''Parses and pretty-prints an expression'''
     try:
-        t = parse(s)
+        t = parse(s, engine)
         print("raw:", t)
         print("pretty:")
         print(t.pretty())
@@ -28,9 +166,13 @@ def just_parse(s:str) -> (Expr|None):
         print(e)
 
 # Used in kahoots with driver()
-def parse(s:str) -> ParseTree:
+# engine picks the grammar: 'earley' (expr.lark) or 'lalr' (expr_lalr.lark)
+def parse(s:str, engine:str='earley') -> ParseTree:
+    p = get_parser(engine)
     try:
-        return parser.parse(s)
+        return p.parse(s)
+    except ParseError:
+        raise
     except Exception as e:
         raise ParseError(e)
 
@@ -89,10 +231,16 @@ class ToExpr(Transformer[Token, Expr]):
     #     # if args and args[0] is None:
     #     #     return []
     #     return args[0]
-    def note_list(self, args: tuple[Expr]) -> list[Expr]:
+    def note_list(self, args: tuple[Expr]) -> tuple[Expr, ...]:
         if args and args[0] is None:
-            return []
-        return list(args)
+            return ()
+        items = []
+        for arg in args:
+            if isinstance(arg, list):   # notes literal, see dense_notes
+                items.extend(arg)
+            else:
+                items.append(arg)
+        return tuple(items)
     def letfun(self, args: tuple[Token, Name, Expr, Expr]) -> Expr:
         return Letfun(args[0].value, args[1].varname, args[2], args[3])
     def app(self, args: tuple[Expr, Expr]) -> Expr:
@@ -104,8 +252,8 @@ class ToExpr(Transformer[Token, Expr]):
             return App(args[0], args[1])
     def assign(self, args: tuple[Token, Expr]) -> Expr:
         return Assign(args[0].value, args[1])
-    def seq(self, args: tuple[Expr, Expr]) -> Expr:
-        return Seq(args[0], args[1])
+    def block(self, args: tuple[Expr, ...]) -> Expr:
+        return Block(tuple(args))
     def show(self, args: tuple[Expr]) -> Expr:
         return Show(args[0])
     def read(self, args) -> Expr:
@@ -114,7 +262,7 @@ class ToExpr(Transformer[Token, Expr]):
     def note(self, args: tuple[Token, Expr]) -> Expr:
         pitch_token, duration_expr = args
         return Note(str(pitch_token), duration_expr)
-    def tune(self, args: list[Expr, Expr]) -> Expr:
+    def tune(self, args: tuple[Expr, Expr]) -> Expr:
         return Tune(args[0], args[1])
     def concat_tunes(self, args: tuple[Expr, Expr]) -> Expr:
         return ConcatTunes(args[0], args[1])
@@ -126,17 +274,99 @@ class ToExpr(Transformer[Token, Expr]):
         return Volume(args[0], args[1])
     def track(self, args: list[Expr]) -> Expr:
         return Track(args[0])
+    def dense_notes(self, args: tuple[Token]) -> list[Note]:
+        return scan_notes(args[0].value[1:-1])
+    def import_module(self, args: tuple[Token]) -> Expr:
+        return Import(args[0].value[1:-1])
     def _ambig(self,_) -> Expr:    # ambiguity marker
         raise AmbiguousParse()
 
-def genAST(t: ParseTree) -> Expr:
+class InterningToExpr(ToExpr):
+    '''ToExpr that interns every node as it builds it (see hashcons)'''
+    def __init__(self, interner: Interner | None = None):
+        super().__init__()
+        self.interner = interner
+
+for _name, _callback in vars(ToExpr).items():
+    if not _name.startswith('_'):
+        setattr(InterningToExpr, _name, interning(_callback))
+
+# ----- Dense notes literal ----- #
+# notes "C4:1 D4:1 R:2 E4:1@90" is one token; this scans its body in one
+# left-to-right pass straight into Notes, so a long melody costs one Note
+# (and a shared duration Lit) per note instead of ~20 tokens and several
+# grammar rules each.
+
+_DENSE_NOTE = re.compile(rf"\s*({PITCH_PATTERN.pattern}):(\d+)(?:@(\d+))?(?=\s|$)")
+
+def scan_notes(body: str) -> list[Note]:
+    '''Scans the body of a notes literal into Notes'''
+    notes = []
+    durations: dict[str, Lit] = {}
+    pos = 0
+    while (m := _DENSE_NOTE.match(body, pos)) is not None:
+        pitch, seconds, level = m.groups()
+        duration = durations.get(seconds)
+        if duration is None:
+            duration = durations[seconds] = Lit(int(seconds))
+        if level is None:
+            notes.append(Note(pitch, duration))
+        else:
+            volume = int(level)
+            if volume > 127:
+                raise ParseError(f"volume level must be between 0 and 127 in notes literal: {m.group().strip()!r}")
+            notes.append(Note(pitch, duration, volume))
+        pos = m.end()
+    if body[pos:].strip():
+        raise ParseError(f"invalid note in notes literal: {body[pos:].split()[0]!r}")
+    return notes
+
+def genAST(t: ParseTree, interner: Interner | None = None) -> Expr:
     try:
-        return ToExpr().transform(t)
+        return (ToExpr() if interner is None else InterningToExpr(interner)).transform(t)
     except VisitError as e:
         if isinstance(e.orig_exc, AmbiguousParse):
             raise AmbiguousParse()
+        elif isinstance(e.orig_exc, ParseError):
+            raise e.orig_exc
         else:
             raise e
+
+# The LALR parser calls the ToExpr callbacks itself as it reduces, so the
+# Expr comes out directly and no ParseTree is kept around. 'earley' still
+# goes through parse() and genAST(), since lark can only do this for LALR.
+# 'pratt' is the hand-written parser in pratt.py, which builds Exprs itself.
+def parse_to_ast(s:str, engine:str='lalr', interner: Interner | None = None) -> Expr:
+    '''Parses s straight to an Expr without building a ParseTree first. With an
+    interner, repeated subtrees come back as one shared node (see hashcons).'''
+    if engine == 'earley':
+        return genAST(parse(s, engine), interner)
+    if engine == 'pratt':
+        from pratt import parse_pratt   # pratt imports this module
+        return parse_pratt(s, interner)
+    if engine != 'lalr':
+        raise ValueError(f"unknown parser engine: {engine}")
+    if interner is None:
+        return _parse_lalr_ast(get_parser('lalr_ast'), s)
+    # lark's inline transformer is part of the parser, so the one interner
+    # slot on it is taken by one parse at a time
+    p = get_parser('lalr_interned')
+    with _interned_lalr_lock:
+        p.options.transformer.interner = interner
+        try:
+            return _parse_lalr_ast(p, s)
+        finally:
+            p.options.transformer.interner = None
+
+_interned_lalr_lock = threading.Lock()
+
+def _parse_lalr_ast(p: Lark, s: str) -> Expr:
+    try:
+        return p.parse(s)
+    except ParseError:
+        raise
+    except Exception as e:
+        raise ParseError(e)
         
 def driver():
     while True:
@@ -166,6 +396,30 @@ def myDriver(s:str):
     print("raw AST:", repr(ast))
     run(ast)
 
+def stream_driver(chunks: Iterable[str], engine: str = 'lalr', env: Env[Loc[Value]] = emptyEnv):
+    '''Runs a program whose text arrives in pieces (e.g. sys.stdin, line by
+    line), each top-level statement as soon as it is complete. Statements
+    share env (an import carries over to the ones after it), and only the
+    statement being read is held in memory.'''
+    last = None
+    for stmt in split_stream(chunks):
+        try:
+            ast = parse_to_ast(stmt, engine)
+            env, result = evalStatement(env, ast)
+            last = (ast, result)
+        except AmbiguousParse:
+            print("ambiguous parse")
+            return
+        except ParseError as e:
+            print("parse error:")
+            print(e)
+            return
+        except EvalError as err:
+            print("ERROR: ", err, "\n")
+            return
+    if last is not None:
+        report(*last)
+
 # For quick testing, uncomment below code
 # driver()
 
@@ -220,43 +474,43 @@ current = 37
 # ---------- Below are my custom songs -------------- #
 # 1. Basic beat
 drums = f'''
-show track [ repeat ( tune [ note C1 for 1 seconds, note R for 1 seconds, note C1 for 1 seconds, note R for 1 seconds, note C1 for 1 seconds, note R for 1 seconds, note C1 for 1 seconds, note R for 1 seconds, note C#1 for 1 seconds, note D1 for 1 seconds, note D#1 for 1 seconds, note E1 for 1 seconds, note F1 for 1 seconds, note F#1 for 1 seconds, note G1 for 1 seconds, note G#1 for 1 seconds, note A1 for 1 seconds, note A#1 for 1 seconds, note B1 for 1 seconds]({current}), 5) ]
+show track [ repeat ( tune [ notes "C1:1 R:1 C1:1 R:1 C1:1 R:1 C1:1 R:1 C#1:1 D1:1 D#1:1 E1:1 F1:1 F#1:1 G1:1 G#1:1 A1:1 A#1:1 B1:1" ]({current}), 5) ]
 '''
 
 
 # --------- Below are all octaves from -1 to 9 --------- #
 octave_negativeOne = f'''
-show track [ repeat (tune [ note C-1 for 1 seconds, note D-1 for 1 seconds, note E-1 for 1 seconds, note F-1 for 1 seconds, note G-1 for 1 seconds, note A-1 for 1 seconds, note B-1 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C-1:1 D-1:1 E-1:1 F-1:1 G-1:1 A-1:1 B-1:1" ]({current}), 20) ]
 '''
 octave_zero = f'''
-show track [ repeat (tune [ note C0 for 1 seconds, note D0 for 1 seconds, note E0 for 1 seconds, note F0 for 1 seconds, note G0 for 1 seconds, note A0 for 1 seconds, note B0 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C0:1 D0:1 E0:1 F0:1 G0:1 A0:1 B0:1" ]({current}), 20) ]
 '''
 octave_one = f'''
-show track [ repeat (tune [ note C1 for 1 seconds, note D1 for 1 seconds, note E1 for 1 seconds, note F1 for 1 seconds, note G1 for 1 seconds, note A1 for 1 seconds, note B1 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C1:1 D1:1 E1:1 F1:1 G1:1 A1:1 B1:1" ]({current}), 20) ]
 '''
 octave_two = f'''
-show track [ repeat (tune [ note C2 for 1 seconds, note D2 for 1 seconds, note E2 for 1 seconds, note F2 for 1 seconds, note G2 for 1 seconds, note A2 for 1 seconds, note B2 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C2:1 D2:1 E2:1 F2:1 G2:1 A2:1 B2:1" ]({current}), 20) ]
 '''
 octave_three = f'''
-show track [ repeat (tune [ note C3 for 1 seconds, note D3 for 1 seconds, note E3 for 1 seconds, note F3 for 1 seconds, note G3 for 1 seconds, note A3 for 1 seconds, note B3 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C3:1 D3:1 E3:1 F3:1 G3:1 A3:1 B3:1" ]({current}), 20) ]
 '''
 octave_four = f'''
-show track [ repeat (tune [ note C4 for 1 seconds, note D4 for 1 seconds, note E4 for 1 seconds, note F4 for 1 seconds, note G4 for 1 seconds, note A4 for 1 seconds, note B4 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C4:1 D4:1 E4:1 F4:1 G4:1 A4:1 B4:1" ]({current}), 20) ]
 '''
 octave_five = f'''
-show track [ repeat (tune [ note C5 for 1 seconds, note D5 for 1 seconds, note E5 for 1 seconds, note F5 for 1 seconds, note G5 for 1 seconds, note A5 for 1 seconds, note B5 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C5:1 D5:1 E5:1 F5:1 G5:1 A5:1 B5:1" ]({current}), 20) ]
 '''
 octave_six = f'''
-show track [ repeat (tune [ note C6 for 1 seconds, note D6 for 1 seconds, note E6 for 1 seconds, note F6 for 1 seconds, note G6 for 1 seconds, note A6 for 1 seconds, note B6 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C6:1 D6:1 E6:1 F6:1 G6:1 A6:1 B6:1" ]({current}), 20) ]
 '''
 octave_seven = f'''
-show track [ repeat (tune [ note C7 for 1 seconds, note D7 for 1 seconds, note E7 for 1 seconds, note F7 for 1 seconds, note G7 for 1 seconds, note A7 for 1 seconds, note B7 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C7:1 D7:1 E7:1 F7:1 G7:1 A7:1 B7:1" ]({current}), 20) ]
 '''
 octave_eight = f'''
-show track [ repeat (tune [ note C8 for 1 seconds, note D8 for 1 seconds, note E8 for 1 seconds, note F8 for 1 seconds, note G8 for 1 seconds, note A8 for 1 seconds, note B8 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C8:1 D8:1 E8:1 F8:1 G8:1 A8:1 B8:1" ]({current}), 20) ]
 '''
 octave_nine = f'''
-show track [ repeat (tune [ note C9 for 1 seconds, note D9 for 1 seconds, note E9 for 1 seconds, note F9 for 1 seconds, note G9 for 1 seconds, note A9 for 1 seconds, note B9 for 1 seconds]({current}), 20) ]
+show track [ repeat (tune [ notes "C9:1 D9:1 E9:1 F9:1 G9:1 A9:1 B9:1" ]({current}), 20) ]
 '''
 
 # target temp is 480
@@ -323,4 +577,8 @@ show track
 # 
 
 # -------------- Test strings below ----------------- #
-myDriver(cooking)
\ No newline at end of file
+if __name__ == '__main__':
+    if sys.argv[1:] == ['-']:   # python parse_run.py - < song.tune
+        stream_driver(sys.stdin)
+    else:
+        myDriver(cooking)
\ No newline at end of file
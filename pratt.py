@@ -0,0 +1,350 @@
+# Hand-written front end for the expression language
+'''
+A recursive-descent / precedence-climbing parser that builds the interp Expr
+nodes directly, with no lark machinery in between. It follows the rules of
+expr_lalr.lark level by level:
+
+    expr0        expr1 ; expr1 ; ...                  (one flat Block)
+    expr1        ID := expr1 | show expr1 | import "path" | if expr0 then expr0 else expr1
+    expr2..3     ||  &&                               (left-assoc)
+    expr4        ! expr4
+    expr5        == != < <= > >=                      (non-assoc)
+    expr6, term  + -  * /                             (left-assoc)
+    factor       - factor | transpose tune by factor
+    application  atom ( expr0 ) ...
+    atom         literals, names, let, letfun, read, note, tune, ++, repeat,
+                 volume, track, ( expr0 )
+    note_list    [ list items and notes "..." literals ]
+
+so it gives the same ASTs as parse_to_ast(). Keywords are the reserved
+words of parse_run.RESERVED_WORDS, and a pitch is only lexed right after
+`note`, so C4 is still an ordinary name everywhere else. Errors are
+ParseErrorAt exceptions carrying the UTF-8 byte offset of the bad token.
+'''
+import re
+
+from interp import Expr, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, Name, Eq, Neq, Lt, \
+    LorE, Gt, GorE, If, Letfun, App, Assign, Block, Import, Show, Read, Note, Tune, ConcatTunes, \
+    Transpose, Repeat, Volume, Track, PITCH_PATTERN
+from hashcons import Interner, interning
+from parse_run import ParseError, RESERVED_WORDS, scan_notes
+
+class ParseErrorAt(ParseError):
+    def __init__(self, message: str, offset: int):
+        super().__init__(f"{message} at byte {offset}")
+        self.message = message
+        self.offset = offset
+    def __reduce__(self):
+        return (type(self), (self.message, self.offset))
+
+_WS = re.compile(r'\s*')
+_TOKEN = re.compile(r'''
+    (?P<INT>\d+)
+  | (?P<STRING>"[^"]*")
+  | (?P<ID>[a-zA-Z_][a-zA-Z0-9_]*)
+  | (?P<OP>:=|==|!=|<=|>=|&&|\|\||\+\+|[-+*/<>!=()\[\],;])
+''', re.VERBOSE)
+_PITCH = re.compile(PITCH_PATTERN.pattern)
+
+EOF = 'EOF'
+
+class Token:
+    __slots__ = ('kind', 'text', 'pos')
+    def __init__(self, kind: str, text: str, pos: int):
+        self.kind = kind   # 'INT', 'ID', 'STRING', 'EOF', or the keyword/operator text itself
+        self.text = text
+        self.pos = pos     # character index into the source
+    def __repr__(self):
+        return repr(self.text) if self.kind != EOF else 'end of input'
+
+_COMPARISONS = {'==': Eq, '!=': Neq, '<': Lt, '<=': LorE, '>': Gt, '>=': GorE}
+_SUMS = {'+': Add, '-': Sub}
+_PRODUCTS = {'*': Mul, '/': Div}
+_LIST_ITEMS = frozenset({'note', 'tune', 'repeat', 'volume'})  # the `tunes` rule
+
+class Parser:
+    def __init__(self, source: str):
+        self.source = source
+        self.pos = 0                     # where the next token starts (after whitespace)
+        self.tok = self._lex()           # current token
+        self.ahead: Token | None = None  # one more token, only for `ID :=`
+
+    # ----- Lexing ----- #
+
+    def _lex(self) -> Token:
+        pos = _WS.match(self.source, self.pos).end()
+        if pos == len(self.source):
+            self.pos = pos
+            return Token(EOF, '', pos)
+        m = _TOKEN.match(self.source, pos)
+        if m is None:
+            raise self.error(f"unexpected character {self.source[pos]!r}", pos)
+        self.pos = m.end()
+        kind, text = m.lastgroup, m.group()
+        if kind == 'ID' and text in RESERVED_WORDS:
+            kind = text
+        elif kind == 'OP':
+            kind = text
+        return Token(kind, text, pos)
+
+    def advance(self) -> Token:
+        tok = self.tok
+        if self.ahead is not None:
+            self.tok, self.ahead = self.ahead, None
+        else:
+            self.tok = self._lex()
+        return tok
+
+    def peek2(self) -> Token:
+        if self.ahead is None:
+            self.ahead = self._lex()
+        return self.ahead
+
+    def at(self, kind: str) -> bool:
+        return self.tok.kind == kind
+
+    def expect(self, kind: str) -> Token:
+        if self.tok.kind != kind:
+            raise self.error(f"expected {kind!r} but found {self.tok!r}", self.tok.pos)
+        return self.advance()
+
+    def expect_pitch(self) -> str:
+        # called right after `note`, before the pitch has been lexed as an ID
+        pos = self.tok.pos
+        m = _PITCH.match(self.source, pos)
+        if m is None or self.ahead is not None:
+            raise self.error(f"expected a pitch but found {self.tok!r}", pos)
+        self.pos = m.end()
+        self.tok = self._lex()
+        return m.group()
+
+    def error(self, message: str, pos: int) -> ParseErrorAt:
+        return ParseErrorAt(message, len(self.source[:pos].encode('utf-8')))
+
+    # ----- Grammar ----- #
+
+    def program(self) -> Expr:
+        e = self.expr0()
+        if not self.at(EOF):
+            raise self.error(f"unexpected {self.tok!r}", self.tok.pos)
+        return e
+
+    def expr0(self) -> Expr:
+        stmts = [self.expr1()]
+        while self.at(';'):
+            self.advance()
+            stmts.append(self.expr1())
+        return Block(tuple(stmts)) if len(stmts) > 1 else stmts[0]
+
+    def expr1(self) -> Expr:
+        if self.at('ID') and self.peek2().kind == ':=':
+            name = self.advance().text
+            self.advance()
+            return Assign(name, self.expr1())
+        if self.at('show'):
+            self.advance()
+            return Show(self.expr1())
+        if self.at('import'):
+            self.advance()
+            return Import(self.expect('STRING').text[1:-1])
+        if self.at('if'):
+            self.advance()
+            cond = self.expr0()
+            self.expect('then')
+            then = self.expr0()
+            self.expect('else')
+            return If(cond, then, self.expr1())
+        return self.expr2()
+
+    def expr2(self) -> Expr:
+        e = self.expr3()
+        while self.at('||'):
+            self.advance()
+            e = Or(e, self.expr3())
+        return e
+
+    def expr3(self) -> Expr:
+        e = self.expr4()
+        while self.at('&&'):
+            self.advance()
+            e = And(e, self.expr4())
+        return e
+
+    def expr4(self) -> Expr:
+        if self.at('!'):
+            self.advance()
+            return Not(self.expr4())
+        return self.expr5()
+
+    def expr5(self) -> Expr:
+        e = self.expr6()
+        op = _COMPARISONS.get(self.tok.kind)
+        if op is not None:
+            self.advance()
+            e = op(e, self.expr6())
+        return e
+
+    def expr6(self) -> Expr:
+        e = self.term()
+        while (op := _SUMS.get(self.tok.kind)) is not None:
+            self.advance()
+            e = op(e, self.term())
+        return e
+
+    def term(self) -> Expr:
+        e = self.factor()
+        while (op := _PRODUCTS.get(self.tok.kind)) is not None:
+            self.advance()
+            e = op(e, self.factor())
+        return e
+
+    def factor(self) -> Expr:
+        if self.at('-'):
+            self.advance()
+            return Neg(self.factor())
+        if self.at('transpose'):
+            self.advance()
+            t = self.tune()
+            self.expect('by')
+            return Transpose(t, self.factor())
+        return self.application()
+
+    def application(self) -> Expr:
+        e = self.atom()
+        while self.at('('):
+            self.advance()
+            e = App(e, self.expr0())
+            self.expect(')')
+        return e
+
+    def atom(self) -> Expr:
+        tok = self.tok
+        match tok.kind:
+            case 'true':
+                self.advance()
+                return Lit(True)
+            case 'false':
+                self.advance()
+                return Lit(False)
+            case 'ID':
+                self.advance()
+                return Name(tok.text)
+            case 'INT':
+                self.advance()
+                return Lit(int(tok.text))
+            case '(':
+                self.advance()
+                e = self.expr0()
+                self.expect(')')
+                return e
+            case 'let':
+                self.advance()
+                name = self.expect('ID').text
+                self.expect('=')
+                defn = self.expr0()
+                self.expect('in')
+                body = self.expr0()
+                self.expect('end')
+                return Let(name, defn, body)
+            case 'letfun':
+                self.advance()
+                name = self.expect('ID').text
+                self.expect('(')
+                param_pos = self.tok.pos
+                param = self.expr0()
+                if not isinstance(param, Name):
+                    raise self.error("function parameter must be a name", param_pos)
+                self.expect(')')
+                self.expect('=')
+                body = self.expr0()
+                self.expect('in')
+                inexpr = self.expr0()
+                self.expect('end')
+                return Letfun(name, param.varname, body, inexpr)
+            case 'read':
+                self.advance()
+                return Read()
+            case 'tune':
+                t = self.tune()
+                if self.at('++'):
+                    self.advance()
+                    return ConcatTunes(t, self.tune())
+                return t
+            case 'note' | 'repeat' | 'volume':
+                return self.list_item()
+            case 'track':
+                self.advance()
+                return Track(self.note_list())
+        raise self.error(f"unexpected {tok!r}", tok.pos)
+
+    # ----- Domain-specific extension (Tunes) ----- #
+
+    def list_item(self) -> Expr:
+        kind = self.tok.kind
+        if kind == 'note':
+            self.advance_before_pitch()
+            pitch = self.expect_pitch()
+            self.expect('for')
+            duration = self.expr0()
+            self.expect('seconds')
+            return Note(pitch, duration)
+        if kind == 'tune':
+            return self.tune()
+        if kind in ('repeat', 'volume'):
+            self.advance()
+            self.expect('(')
+            item = self.list_item()
+            self.expect(',')
+            arg = self.expr0()
+            self.expect(')')
+            return Repeat(item, arg) if kind == 'repeat' else Volume(item, arg)
+        raise self.error(f"expected a note, tune, repeat or volume but found {self.tok!r}", self.tok.pos)
+
+    def advance_before_pitch(self):
+        # skip `note` without lexing what follows it, that's expect_pitch's job
+        self.tok = Token('pitch', '', _WS.match(self.source, self.pos).end())
+
+    def tune(self) -> Tune:
+        self.expect('tune')
+        notes = self.note_list()
+        self.expect('(')
+        instrument = self.expr0()
+        self.expect(')')
+        return Tune(notes, instrument)
+
+    def note_list(self) -> tuple[Expr, ...]:
+        self.expect('[')
+        items = []
+        if not self.at(']'):
+            self.list_element(items)
+            while self.at(','):
+                self.advance()
+                self.list_element(items)
+        self.expect(']')
+        return tuple(items)
+
+    def list_element(self, items: list[Expr]):
+        if self.at('notes'):
+            self.advance()
+            tok = self.expect('STRING')
+            try:
+                items.extend(scan_notes(tok.text[1:-1]))
+            except ParseError as e:
+                raise self.error(str(e), tok.pos) from None
+        else:
+            items.append(self.list_item())
+
+class InterningParser(Parser):
+    '''Parser that interns every node as it builds it (see hashcons)'''
+    def __init__(self, source: str, interner: Interner):
+        super().__init__(source)
+        self.interner = interner
+
+# the grammar methods, each of which returns the nodes it built
+for _name in ('program', 'expr0', 'expr1', 'expr2', 'expr3', 'expr4', 'expr5', 'expr6', 'term',
+              'factor', 'application', 'atom', 'list_item', 'tune', 'note_list'):
+    setattr(InterningParser, _name, interning(getattr(Parser, _name)))
+
+def parse_pratt(source: str, interner: Interner | None = None) -> Expr:
+    '''Parses source with the hand-written parser, interning its nodes with interner if given'''
+    return (Parser(source) if interner is None else InterningParser(source, interner)).program()
@@ -0,0 +1,249 @@
+# An evaluator with an explicit stack instead of Python recursion
+'''
+evalInEnv calls itself for every sub-expression and every letfun call, so a
+program nested a few thousand levels deep (a long generated `1 + 1 + ...`
+chain, or a recursion thousands of calls deep) runs out of Python stack.
+evalIterative() evaluates the same programs with one loop over two lists:
+
+  - todo, the work left, innermost last: either an expression to evaluate
+    in an environment, or a continuation saying what to do with values
+    already computed (add the top two, check a condition and pick a
+    branch, bind a let's value and evaluate its body, call a function ...)
+  - values, the results of the expressions evaluated so far
+
+so a program's depth is limited by memory, not by the recursion limit.
+Environments, Locs and Closures are interp's own (a function defined here
+can be called by evalInEnv and the other way round), and the operators are
+interp's functions on values, so results and EvalErrors are evalInEnv's.
+
+    evalIterative(parse_to_ast(source))
+
+or run(expr, engine='stack').
+'''
+from interp import Expr, Env, Loc, Value, EvalError, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, \
+    Name, Eq, Neq, Lt, LorE, Gt, GorE, If, Ifnz, Letfun, App, Assign, Seq, Block, Import, Show, Read, \
+    Note, Tune, ConcatTunes, Transpose, Repeat, Volume, Track, emptyEnv, extendEnv, newLoc, setLoc, \
+    bindLetfun, evalStatement, callEnv, addValues, subValues, mulValues, divValues, negValue, boolOperand, \
+    eqValues, neqValues, ltValues, loreValues, gtValues, goreValues, ifCondition, ifnzCondition, \
+    ifnzResult, lookupValue, callee, assignableLoc, showValue, readValue, checkPitch, noteValue, \
+    tuneInstrument, checkTuneItem, concatValues, checkTransposable, transposeSteps, TransposeNote, \
+    repeatValue, volumeValue, trackValue
+
+# ----- Work items ----- #
+# Each item of todo is a tuple whose first element says what it is:
+
+EVAL = 0       # (EVAL, expr, env): evaluate expr in env, pushing its value
+UNARY = 1      # (UNARY, fn): replace the top value v with fn(v)
+BINARY = 2     # (BINARY, fn): replace the top two values l, r with fn(l, r)
+AND = 3        # (AND, right, env): the left operand is on top
+OR = 4         # (OR, right, env)
+IF = 5         # (IF, then, else, env): the condition is on top
+IFNZ = 6       # (IFNZ, then, else, env)
+BIND = 7       # (BIND, name, body, env): the let's value is on top
+CALL = 8       # (CALL, arg, env): the function is on top
+ENTER = 9      # (ENTER,): the function and its argument are on top
+STORE = 10     # (STORE, loc): store the top value in loc (leaving it there)
+DROP = 11      # (DROP,): discard the top value
+STATEMENTS = 12   # (STATEMENTS, stmts, i, env): run stmts[i:], dropping the previous value if i > 0
+ITEMS = 13     # (ITEMS, exprs, i, env, done, check, finish): collect exprs' values, then
+               # push finish(done); check(type) is called on each expr before it runs
+TUNE = 14      # (TUNE, notes, env): the instrument is on top
+TRANSPOSE = 15    # (TRANSPOSE, tune, env): the steps are on top
+
+_BINARY = {Add: addValues, Sub: subValues, Mul: mulValues, Div: divValues, Eq: eqValues, Neq: neqValues,
+           Lt: ltValues, LorE: loreValues, Gt: gtValues, GorE: goreValues, ConcatTunes: concatValues,
+           Repeat: repeatValue, Volume: volumeValue}
+
+def _not(value: Value) -> bool:
+    return not boolOperand(value, "Not")
+
+def _ifnzThen(value: Value) -> Value:
+    return ifnzResult(value, "then")
+
+def _ifnzElse(value: Value) -> Value:
+    return ifnzResult(value, "else")
+
+def _noCheck(kind: type) -> None:
+    pass
+
+# ----- Evaluation ----- #
+
+def evalIterative(expr: Expr, env: Env[Loc[Value]] = emptyEnv) -> Value:
+    '''Evaluates expr in env, as evalInEnv does, without recursing'''
+    todo: list[tuple] = [(EVAL, expr, env)]
+    values: list[Value] = []
+    push = todo.append
+    while todo:
+        item = todo.pop()
+        tag = item[0]
+
+        if tag == EVAL:
+            _, expr, env = item
+            fn = _BINARY.get(type(expr))
+            if fn is not None:
+                left, right = (getattr(expr, f) for f in expr.__match_args__)
+                push((BINARY, fn))
+                push((EVAL, right, env))
+                push((EVAL, left, env))
+                continue
+            match expr:
+                case Lit(v):
+                    values.append(v)
+                case Name(name):
+                    values.append(lookupValue(env, name))
+                case Neg(e):
+                    push((UNARY, negValue))
+                    push((EVAL, e, env))
+                case Not(e):
+                    push((UNARY, _not))
+                    push((EVAL, e, env))
+                case And(l, r):
+                    push((AND, r, env))
+                    push((EVAL, l, env))
+                case Or(l, r):
+                    push((OR, r, env))
+                    push((EVAL, l, env))
+                case Let(name, defn, body):
+                    if name == "":
+                        raise EvalError("Name cannot be empty")
+                    if not isinstance(name, str):
+                        raise EvalError("Name must be a string")
+                    push((BIND, name, body, env))
+                    push((EVAL, defn, env))
+                case If(c, t, e):
+                    push((IF, t, e, env))
+                    push((EVAL, c, env))
+                case Ifnz(c, t, e):
+                    push((IFNZ, t, e, env))
+                    push((EVAL, c, env))
+                case Letfun(n, p, b, i):
+                    push((EVAL, i, bindLetfun(env, n, p, b)))
+                case App(f, a):
+                    push((CALL, a, env))
+                    push((EVAL, f, env))
+                case Assign(n, e1):
+                    push((STORE, assignableLoc(env, n)))
+                    push((EVAL, e1, env))
+                case Seq(e1, e2):
+                    push((EVAL, e2, env))
+                    push((DROP,))
+                    push((EVAL, e1, env))
+                case Block(stmts):
+                    push((STATEMENTS, stmts, 0, env))
+                case Import():
+                    values.append(evalStatement(env, expr)[1])
+                case Show(e):
+                    push((UNARY, showValue))
+                    push((EVAL, e, env))
+                case Read():
+                    values.append(readValue())
+                # ----- Domain-specific extension (Tunes) ----- #
+                case Note(name, d, volume):
+                    checkPitch(name)
+                    push((UNARY, lambda duration, name=name, volume=volume: noteValue(name, duration, volume)))
+                    push((EVAL, d, env))
+                case Tune(n, ins):
+                    if not isinstance(n, tuple):
+                        raise EvalError("Tunes must be a list of notes")
+                    push((TUNE, n, env))
+                    push((EVAL, ins, env))
+                case Transpose(t, s):
+                    checkTransposable(type(t))
+                    push((TRANSPOSE, t, env))
+                    push((EVAL, s, env))
+                case Track(t):
+                    push((ITEMS, t, 0, env, [], _noCheck, trackValue))
+                case _:
+                    raise EvalError(f"unknown expression: {expr}")
+
+        elif tag == BINARY:
+            right = values.pop()
+            values[-1] = item[1](values[-1], right)
+
+        elif tag == UNARY:
+            values[-1] = item[1](values[-1])
+
+        elif tag == IF:
+            _, t, e, env = item
+            push((EVAL, t if ifCondition(values.pop()) else e, env))
+
+        elif tag == IFNZ:
+            _, t, e, env = item
+            if ifnzCondition(values.pop()):
+                push((UNARY, _ifnzThen))
+                push((EVAL, t, env))
+            else:
+                push((UNARY, _ifnzElse))
+                push((EVAL, e, env))
+
+        elif tag == CALL:
+            _, a, env = item
+            callee(values[-1])
+            push((ENTER,))
+            push((EVAL, a, env))
+
+        elif tag == ENTER:
+            arg = values.pop()
+            fun = values.pop()
+            push((EVAL, fun.body, callEnv(fun, arg)))
+
+        elif tag == BIND:
+            _, name, body, env = item
+            push((EVAL, body, extendEnv(name, newLoc(values.pop()), env)))
+
+        elif tag == AND or tag == OR:
+            _, r, env = item
+            op = "And" if tag == AND else "Or"
+            if boolOperand(values[-1], op) == (tag == OR):
+                continue   # False for And, True for Or: that's the value
+            values.pop()
+            push((UNARY, lambda v, op=op: boolOperand(v, op)))
+            push((EVAL, r, env))
+
+        elif tag == STORE:
+            setLoc(item[1], values[-1])
+
+        elif tag == DROP:
+            values.pop()
+
+        elif tag == STATEMENTS:
+            _, stmts, i, env = item
+            if i:
+                values.pop()
+            stmt = stmts[i]
+            if isinstance(stmt, Import):
+                env, v = evalStatement(env, stmt)
+                values.append(v)
+            elif i + 1 == len(stmts):
+                push((EVAL, stmt, env))
+                continue
+            else:
+                push((STATEMENTS, stmts, i + 1, env))
+                push((EVAL, stmt, env))
+                continue
+            if i + 1 < len(stmts):
+                push((STATEMENTS, stmts, i + 1, env))
+
+        elif tag == ITEMS:
+            _, exprs, i, env, done, check, finish = item
+            if i:
+                done.append(values.pop())
+            if i == len(exprs):
+                values.append(finish(done))
+            else:
+                check(type(exprs[i]))
+                push((ITEMS, exprs, i + 1, env, done, check, finish))
+                push((EVAL, exprs[i], env))
+
+        elif tag == TUNE:
+            _, n, env = item
+            instrument = tuneInstrument(values.pop())
+            push((ITEMS, n, 0, env, [], checkTuneItem, lambda notes, i=instrument: Tune(tuple(notes), i - 1)))
+
+        elif tag == TRANSPOSE:
+            _, t, env = item
+            steps = transposeSteps(values.pop())
+            push((UNARY, lambda tune, steps=steps: TransposeNote(tune, steps)))
+            push((EVAL, t, env))
+
+    return values.pop()
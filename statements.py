@@ -0,0 +1,111 @@
+# Finding statement and list boundaries in program text without parsing it
+'''
+A program is `stmt; stmt; ...` where each stmt is an expr1 (see expr0 in
+expr.lark). A ';' is only a statement boundary when it isn't nested inside
+( ), [ ], let/letfun ... end or if ... else, and a ',' only separates the
+elements of a [ ... ] list at that list's own nesting level. Tracking that
+nesting is a single linear scan over the words and brackets, which is much
+cheaper than a parse and is enough to reparse or split a program piecewise.
+
+The scan trusts its input: on a malformed program the spans may be wrong,
+so callers fall back to parsing the whole text when a piece doesn't parse.
+'''
+from collections.abc import Iterable, Iterator
+import re
+
+# string literals are skipped whole so brackets or ';' inside them don't count
+_TOKEN = re.compile(r'"[^"]*"?|[A-Za-z_][A-Za-z0-9_]*|[()\[\];,]')
+_OPEN = frozenset({'(', '[', 'let', 'letfun', 'if'})
+_CLOSE = frozenset({')', ']', 'end', 'else'})
+_PUNCTUATION = frozenset('()[];,')
+
+type Span = tuple[int, int]  # [start, end) offsets into the source
+
+def statement_spans(source: str) -> list[Span]:
+    '''Spans of the top-level statements of source, without their ';' '''
+    spans = []
+    depth = 0
+    start = 0
+    for m in _TOKEN.finditer(source):
+        tok = m.group()
+        if tok in _OPEN:
+            depth += 1
+        elif tok in _CLOSE:
+            depth -= 1
+        elif tok == ';' and depth == 0:
+            spans.append((start, m.start()))
+            start = m.end()
+    spans.append((start, len(source)))
+    return spans
+
+def list_openings(source: str) -> list[int]:
+    '''Offsets of every '[' in source, in source order'''
+    return [m.start() for m in _TOKEN.finditer(source) if m.group() == '[']
+
+def element_spans(source: str, open_bracket: int) -> list[Span] | None:
+    '''Spans of the comma-separated elements of the [ ... ] list opened at
+    source[open_bracket], or None if the list is never closed'''
+    spans = []
+    depth = 0
+    start = open_bracket + 1
+    for m in _TOKEN.finditer(source, open_bracket):
+        tok = m.group()
+        if tok in _OPEN:
+            depth += 1
+        elif tok in _CLOSE:
+            depth -= 1
+            if depth == 0:
+                if spans or source[start:m.start()].strip():
+                    spans.append((start, m.start()))
+                return spans
+        elif tok == ',' and depth == 1:
+            spans.append((start, m.start()))
+            start = m.end()
+    return None
+
+class StatementSplitter:
+    '''statement_spans() for text that arrives in pieces: feed() it chunks and
+    it hands back each top-level statement as soon as its ';' has arrived.
+    Only the unfinished statement is kept, so memory is bounded by the
+    largest statement rather than the whole input.'''
+    def __init__(self):
+        self.buffer = ''   # text of the statement being read
+        self.scanned = 0   # buffer[:scanned] has been tokenized already
+        self.depth = 0
+
+    def feed(self, chunk: str) -> list[str]:
+        '''Adds chunk and returns the statements it completed'''
+        text = self.buffer + chunk
+        done = []
+        start = 0              # where the current statement starts in text
+        pos = self.scanned
+        for m in _TOKEN.finditer(text, pos):
+            tok = m.group()
+            if m.end() == len(text) and tok not in _PUNCTUATION:
+                break          # a word or string that the next chunk may continue
+            pos = m.end()
+            if tok in _OPEN:
+                self.depth += 1
+            elif tok in _CLOSE:
+                self.depth -= 1
+            elif tok == ';' and self.depth == 0:
+                done.append(text[start:m.start()])
+                start = m.end()
+        else:
+            pos = len(text)
+        self.buffer = text[start:]
+        self.scanned = pos - start
+        return done
+
+    def close(self) -> str:
+        '''Returns the last statement, the text after the final ';' '''
+        rest = self.buffer
+        self.buffer, self.scanned, self.depth = '', 0, 0
+        return rest
+
+def split_stream(chunks: Iterable[str]) -> Iterator[str]:
+    '''Yields the top-level statements of the text in chunks as they complete'''
+    splitter = StatementSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield splitter.close()
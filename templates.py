@@ -0,0 +1,88 @@
+# Program templates: parse once, instantiate per variant
+'''
+A Template is program text with named holes, written $name wherever an
+expression can go (an instrument, a volume level, a repeat count, a
+transposition, ...):
+
+    t = Template("show tune [ volume(note C4 for 1 seconds, $level) ] ($instrument)")
+    ast = t.instantiate({'level': 90, 'instrument': 17})
+
+The text is parsed once, when the Template is made. instantiate() only
+rebuilds the nodes on the paths from the root down to the holes. Every
+subtree without a hole is the template's own node, shared by all
+instances rather than copied, so a variant costs time and memory in
+proportion to the number of holes, not the size of the song. As with
+ParseCache, treat instances as read-only.
+'''
+from dataclasses import fields, replace
+import re
+
+from interp import Expr, Lit, Name
+from parse_run import parse_to_ast
+
+type Param = int | bool | Expr
+
+# a hole is parsed as a Name the language can't produce from $-free text
+_HOLE_PREFIX = '__hole__'
+_HOLE = re.compile(r'"[^"]*"|\$([A-Za-z_][A-Za-z0-9_]*)')   # strings are skipped whole
+
+class Template:
+    def __init__(self, source: str, engine: str = 'lalr'):
+        if _HOLE_PREFIX in source:
+            raise ValueError(f"template text can't contain {_HOLE_PREFIX!r}")
+        self.source = source
+        self.ast = parse_to_ast(_HOLE.sub(_mangle, source), engine)
+        # ids of the nodes that have a hole somewhere under them, including the holes
+        self._open: set[int] = set()
+        names: set[str] = set()
+        self._find_holes(self.ast, names)
+        self.params = frozenset(names)
+
+    def _find_holes(self, node, names: set[str]) -> bool:
+        if isinstance(node, Name) and node.varname.startswith(_HOLE_PREFIX):
+            names.add(node.varname[len(_HOLE_PREFIX):])
+            self._open.add(id(node))
+            return True
+        if not hasattr(node, '__dataclass_fields__'):
+            return False
+        found = False
+        for f in fields(node):
+            value = getattr(node, f.name)
+            if isinstance(value, str) and value.startswith(_HOLE_PREFIX):
+                raise ValueError(f"${value[len(_HOLE_PREFIX):]} is a hole, so it can only stand for an expression")
+            for child in value if isinstance(value, tuple) else (value,):
+                found = self._find_holes(child, names) or found
+        if found:
+            self._open.add(id(node))
+        return found
+
+    def instantiate(self, values: dict[str, Param]) -> Expr:
+        '''The template's AST with each $name replaced by values[name] (an int
+        or bool becomes a Lit, an Expr is used as it is)'''
+        missing = self.params - values.keys()
+        if missing:
+            raise ValueError(f"no value for template parameter(s): {', '.join(sorted(missing))}")
+        unknown = values.keys() - self.params
+        if unknown:
+            raise ValueError(f"unknown template parameter(s): {', '.join(sorted(unknown))}")
+        exprs = {_HOLE_PREFIX + name: v if hasattr(v, '__dataclass_fields__') else Lit(v)
+                 for name, v in values.items()}
+        return self._fill(self.ast, exprs)
+
+    def _fill(self, node, exprs: dict[str, Expr]):
+        if id(node) not in self._open:
+            return node
+        if isinstance(node, Name):
+            return exprs[node.varname]
+        changes = {}
+        for f in fields(node):
+            value = getattr(node, f.name)
+            if isinstance(value, tuple):
+                if any(id(item) in self._open for item in value):
+                    changes[f.name] = tuple(self._fill(item, exprs) for item in value)
+            elif id(value) in self._open:
+                changes[f.name] = self._fill(value, exprs)
+        return replace(node, **changes)
+
+def _mangle(m: re.Match) -> str:
+    return _HOLE_PREFIX + m.group(1) if m.group(1) else m.group()
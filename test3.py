@@ -4,7 +4,7 @@ import unittest
 import interp
 from interp  import Expr, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, \
                   Let, Name, Eq, Lt, If, Letfun, App, \
-                  Read, Show, Assign, Seq
+                  Read, Show, Assign, Block
 
 
 from io import StringIO
@@ -29,427 +29,427 @@ class TestParsing(unittest.TestCase):
     def test_001(self):
         self.parse(
             "x; a; b",
-            Seq(Name("x"), Seq(Name("a"), Name("b"))),
+            Block([Name("x"), Name("a"), Name("b")]),
         )
 
     def test_001_1(self):
         self.parse(
             "(x; a); b",
-            Seq(Seq(Name("x"), Name("a")), Name("b")),
+            Block([Block([Name("x"), Name("a")]), Name("b")]),
         )
 
     def test_002(self):
         self.parse(
             "x; a := b",
-            Seq(Name("x"), Assign("a", Name("b"))),
+            Block([Name("x"), Assign("a", Name("b"))]),
         )
 
     def test_003(self):
         self.parse(
             "x; show a",
-            Seq(Name("x"), Show(Name("a"))),
+            Block([Name("x"), Show(Name("a"))]),
         )
 
     def test_004(self):
         self.parse(
             "x; if a then b else c",
-            Seq(Name("x"), If(Name("a"), Name("b"), Name("c"))),
+            Block([Name("x"), If(Name("a"), Name("b"), Name("c"))]),
         )
 
     def test_004(self):
         self.parse(
             "x; if a then b else c",
-            Seq(Name("x"), If(Name("a"), Name("b"), Name("c"))),
+            Block([Name("x"), If(Name("a"), Name("b"), Name("c"))]),
         )
 
     def test_005(self):
         self.parse(
             "x; a || b",
-            Seq(Name("x"), Or(Name("a"), Name("b"))),
+            Block([Name("x"), Or(Name("a"), Name("b"))]),
         )
 
     def test_005_1(self):
         self.parse(
             "(x; a) || b",
-            Or(Seq(Name("x"), Name("a")), Name("b"))
+            Or(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_006(self):
         self.parse(
             "x; a && b",
-            Seq(Name("x"), And(Name("a"), Name("b"))),
+            Block([Name("x"), And(Name("a"), Name("b"))]),
         )
 
     def test_006_1(self):
         self.parse(
             "(x; a) && b",
-            And(Seq(Name("x"), Name("a")), Name("b"))
+            And(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_007(self):
         self.parse(
             "x; ! a",
-            Seq(Name("x"), Not(Name("a"))),
+            Block([Name("x"), Not(Name("a"))]),
         )
 
     def test_008(self):
         self.parse(
             "x; a == b",
-            Seq(Name("x"), Eq(Name("a"), Name("b"))),
+            Block([Name("x"), Eq(Name("a"), Name("b"))]),
         )
 
     def test_008_1(self):
         self.parse(
             "(x; a) == b",
-            Eq(Seq(Name("x"), Name("a")), Name("b"))
+            Eq(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_009(self):
         self.parse(
             "x; a < b",
-            Seq(Name("x"), Lt(Name("a"), Name("b"))),
+            Block([Name("x"), Lt(Name("a"), Name("b"))]),
         )
 
     def test_009_1(self):
         self.parse(
             "(x; a) < b",
-            Lt(Seq(Name("x"), Name("a")), Name("b"))
+            Lt(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_010(self):
         self.parse(
             "x; a + b",
-            Seq(Name("x"), Add(Name("a"), Name("b"))),
+            Block([Name("x"), Add(Name("a"), Name("b"))]),
         )
 
     def test_010_1(self):
         self.parse(
             "(x; a) + b",
-            Add(Seq(Name("x"), Name("a")), Name("b"))
+            Add(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_011(self):
         self.parse(
             "x; a - b",
-            Seq(Name("x"), Sub(Name("a"), Name("b"))),
+            Block([Name("x"), Sub(Name("a"), Name("b"))]),
         )
 
     def test_011_1(self):
         self.parse(
             "(x; a) - b",
-            Sub(Seq(Name("x"), Name("a")), Name("b"))
+            Sub(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_012(self):
         self.parse(
             "x; a * b",
-            Seq(Name("x"), Mul(Name("a"), Name("b"))),
+            Block([Name("x"), Mul(Name("a"), Name("b"))]),
         )
 
     def test_012_1(self):
         self.parse(
             "(x; a) * b",
-            Mul(Seq(Name("x"), Name("a")), Name("b"))
+            Mul(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_013(self):
         self.parse(
             "x; a / b",
-            Seq(Name("x"), Div(Name("a"), Name("b"))),
+            Block([Name("x"), Div(Name("a"), Name("b"))]),
         )
 
     def test_013_1(self):
         self.parse(
             "(x; a) / b",
-            Div(Seq(Name("x"), Name("a")), Name("b"))
+            Div(Block([Name("x"), Name("a")]), Name("b"))
         )
 
     def test_014(self):
         self.parse(
             "x; -a",
-            Seq(Name("x"), Neg(Name("a"))),
+            Block([Name("x"), Neg(Name("a"))]),
         )
 
     def test_015(self):
         self.parse(
             "x; a",
-            Seq(Name("x"), Name("a")),
+            Block([Name("x"), Name("a")]),
         )
 
     def test_016(self):
         self.parse(
             "x; 0",
-            Seq(Name("x"), Lit(0)),
+            Block([Name("x"), Lit(0)]),
         )
 
     def test_017(self):
         self.parse(
             "x; a(b)",
-            Seq(Name("x"), App(Name("a"), Name("b"))),
+            Block([Name("x"), App(Name("a"), Name("b"))]),
         )
 
     def test_017_1(self):
         self.parse(
             "(x; a)(b)",
-            App(Seq(Name("x"), Name("a")), Name("b")),
+            App(Block([Name("x"), Name("a")]), Name("b")),
         )
 
     def test_018(self):
         self.parse(
             "x; let a = b in c end",
-            Seq(Name("x"), Let("a", Name("b"), Name("c"))),
+            Block([Name("x"), Let("a", Name("b"), Name("c"))]),
         )
 
     def test_019(self):
         self.parse(
             "x; letfun a(b) = c in d end",
-            Seq(Name("x"), Letfun("a", "b", Name("c"), Name("d"))),
+            Block([Name("x"), Letfun("a", "b", Name("c"), Name("d"))]),
         )
 
     def test_020(self):
         self.parse(
             "x; (a)",
-            Seq(Name("x"), Name("a")),
+            Block([Name("x"), Name("a")]),
         )
 
     def test_021(self):
         self.parse(
             "show a; x",
-            Seq(Show(Name("a")), Name("x")),
+            Block([Show(Name("a")), Name("x")]),
         )
 
     def test_021_1(self):
         self.parse(
             "show (a; x)",
-            Show(Seq(Name("a"), Name("x"))),
+            Show(Block([Name("a"), Name("x")])),
         )
 
     def test_022(self):
         self.parse(
             "a := b; c",
-            Seq(Assign("a", Name("b")), Name("c")),
+            Block([Assign("a", Name("b")), Name("c")]),
         )
 
     def test_022_1(self):
         self.parse(
             "a := (b; c)",
-            Assign("a", Seq(Name("b"), Name("c"))),
+            Assign("a", Block([Name("b"), Name("c")])),
         )        
 
     def test_023(self):
         self.parse(
             "if a then b else c; d",
-            Seq(If(Name("a"), Name("b"), Name("c")), Name("d")),
+            Block([If(Name("a"), Name("b"), Name("c")), Name("d")]),
         )
 
     def test_023_1(self):
         self.parse(
             "if a then b else (c; d)",
-            If(Name("a"), Name("b"), Seq(Name("c"), Name("d"))),
+            If(Name("a"), Name("b"), Block([Name("c"), Name("d")])),
         )
 
     def test_024(self):
         self.parse(
             "a || b; x",
-            Seq(Or(Name("a"), Name("b")), Name("x")),
+            Block([Or(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_024_1(self):
         self.parse(
             "a || (b; x)",
-            Or(Name("a"), Seq(Name("b"), Name("x"))),
+            Or(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_025(self):
         self.parse(
             "a && b; x",
-            Seq(And(Name("a"), Name("b")), Name("x")),
+            Block([And(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_025_1(self):
         self.parse(
             "a && (b; x)",
-            And(Name("a"), Seq(Name("b"), Name("x"))),
+            And(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_026(self):
         self.parse(
             "! a; x",
-            Seq(Not(Name("a")), Name("x")),
+            Block([Not(Name("a")), Name("x")]),
         )
 
     def test_026_1(self):
         self.parse(
             "! (a; x)",
-            Not(Seq(Name("a"), Name("x"))),
+            Not(Block([Name("a"), Name("x")])),
         )
 
     def test_027(self):
         self.parse(
             "a == b; x",
-            Seq(Eq(Name("a"), Name("b")), Name("x")),
+            Block([Eq(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_027_1(self):
         self.parse(
             "a == (b; x)",
-            Eq(Name("a"), Seq(Name("b"), Name("x"))),
+            Eq(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_028(self):
         self.parse(
             "a < b; x",
-            Seq(Lt(Name("a"), Name("b")), Name("x")),
+            Block([Lt(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_028_1(self):
         self.parse(
             "a < (b; x)",
-            Lt(Name("a"), Seq(Name("b"), Name("x"))),
+            Lt(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_029(self):
         self.parse(
             "a + b; x",
-            Seq(Add(Name("a"), Name("b")), Name("x")),
+            Block([Add(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_029_1(self):
         self.parse(
             "a + (b; x)",
-            Add(Name("a"), Seq(Name("b"), Name("x"))),
+            Add(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_030(self):
         self.parse(
             "a - b; x",
-            Seq(Sub(Name("a"), Name("b")), Name("x")),
+            Block([Sub(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_030_1(self):
         self.parse(
             "a - (b; x)",
-            Sub(Name("a"), Seq(Name("b"), Name("x"))),
+            Sub(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_031(self):
         self.parse(
             "a * b; x",
-            Seq(Mul(Name("a"), Name("b")), Name("x")),
+            Block([Mul(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_031_1(self):
         self.parse(
             "a * (b; x)",
-            Mul(Name("a"), Seq(Name("b"), Name("x"))),
+            Mul(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_032(self):
         self.parse(
             "a / b; x",
-            Seq(Div(Name("a"), Name("b")), Name("x")),
+            Block([Div(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_032_1(self):
         self.parse(
             "a / (b; x)",
-            Div(Name("a"), Seq(Name("b"), Name("x"))),
+            Div(Name("a"), Block([Name("b"), Name("x")])),
         )
 
     def test_033(self):
         self.parse(
             "- a; x",
-            Seq(Neg(Name("a")), Name("x")),
+            Block([Neg(Name("a")), Name("x")]),
         )
 
     def test_033_1(self):
         self.parse(
             "- (a; x)",
-            Neg(Seq(Name("a"), Name("x"))),
+            Neg(Block([Name("a"), Name("x")])),
         )
 
     def test_034(self):
         self.parse(
             "a; x",
-            Seq(Name("a"), Name("x")),
+            Block([Name("a"), Name("x")]),
         )
 
     def test_035(self):
         self.parse(
             "0; x",
-            Seq(Lit(0), Name("x")),
+            Block([Lit(0), Name("x")]),
         )
 
     def test_036(self):
         self.parse(
             "a(b); x",
-            Seq(App(Name("a"), Name("b")), Name("x")),
+            Block([App(Name("a"), Name("b")), Name("x")]),
         )
 
     def test_037(self):
         self.parse(
             "let a = b in c end; x",
-            Seq(Let("a", Name("b"), Name("c")), Name("x")),
+            Block([Let("a", Name("b"), Name("c")), Name("x")]),
         )
 
     def test_038(self):
         self.parse(
             "letfun a(b) = c in d end; x",
-            Seq(Letfun("a", "b", Name("c"), Name("d")), Name("x")),
+            Block([Letfun("a", "b", Name("c"), Name("d")), Name("x")]),
         )
 
     def test_039(self):
         self.parse(
             "(a); x",
-            Seq(Name("a"), Name("x")),
+            Block([Name("a"), Name("x")]),
         )
 
     def test_040(self):
         self.parse(
             "if a; b then c else d",
-            If(Seq(Name("a"), Name("b")), Name("c"), Name("d")),
+            If(Block([Name("a"), Name("b")]), Name("c"), Name("d")),
         )
 
     def test_041(self):
         self.parse(
             "if a then b; c else d",
-            If(Name("a"), Seq(Name("b"), Name("c")), Name("d")),
+            If(Name("a"), Block([Name("b"), Name("c")]), Name("d")),
         )
 
     def test_042(self):
         self.parse(
             "let a = b; c in d end",
-            Let("a", Seq(Name("b"), Name("c")), Name("d")),
+            Let("a", Block([Name("b"), Name("c")]), Name("d")),
         )
 
     def test_043(self):
         self.parse(
             "let a = b in c; d end",
-            Let("a", Name("b"), Seq(Name("c"), Name("d"))),
+            Let("a", Name("b"), Block([Name("c"), Name("d")])),
         )
 
     def test_044(self):
         self.parse(
             "letfun a(b) = c; d in e end",
-            Letfun("a", "b", Seq(Name("c"), Name("d")), Name("e")),
+            Letfun("a", "b", Block([Name("c"), Name("d")]), Name("e")),
         )
 
     def test_045(self):
         self.parse(
             "letfun a(b) = c in d; e end",
-            Letfun("a", "b", Name("c"), Seq(Name("d"), Name("e"))),
+            Letfun("a", "b", Name("c"), Block([Name("d"), Name("e")])),
         )
 
     def test_046(self):
         self.parse(
             "a(b; c)",
-            App(Name("a"), Seq(Name("b"), Name("c"))),
+            App(Name("a"), Block([Name("b"), Name("c")])),
         )
 
     def test_047(self):
         self.parse(
             "(a; b)",
-            Seq(Name("a"), Name("b")),
+            Block([Name("a"), Name("b")]),
         )
 
     def test_048(self):
@@ -893,13 +893,13 @@ class TestParsing(unittest.TestCase):
     def test_103(self):
         self.parse(
             "read; a",
-            Seq(Read(), Name("a")),
+            Block([Read(), Name("a")]),
         )
 
     def test_104(self):
         self.parse(
             "a; read",
-            Seq(Name("a"), Read()),
+            Block([Name("a"), Read()]),
         )
 
     def test_105(self):
@@ -1292,8 +1292,7 @@ class TestEval(unittest.TestCase):
         self.eval_equal(
             Let("x", Lit(1),
                 Letfun("f", "y", Assign("x", Name("y")),
-                       Seq(App(Name("f"), Lit(2)),
-                           Name("x")))),
+                       Block([App(Name("f"), Lit(2)), Name("x")]))),
             2,
         )
 
@@ -1304,11 +1303,7 @@ class TestEval(unittest.TestCase):
         self.eval_equal(
             Let("x", Lit(0),
                 Letfun("f", "y", Assign("x", Add(Name("x"), Name("y"))),
-                       Seq(App(Name("f"), Lit(1)),
-                           Seq(App(Name("f"), Lit(2)),
-                               Seq(App(Name("f"), Lit(3)),
-                                   Seq(App(Name("f"), Lit(4)),
-                                       Name("x"))))))),
+                       Block([App(Name("f"), Lit(1)), App(Name("f"), Lit(2)), App(Name("f"), Lit(3)), App(Name("f"), Lit(4)), Name("x")]))),
             10,
         )
 
@@ -1327,8 +1322,7 @@ class TestEval(unittest.TestCase):
         self.eval_except(
             Letfun("f", "y",
                    Let("x", Lit(0), Assign("x", Name("y"))),
-                   Seq(App(Name("f"), Lit(1)),
-                       Name("x")))
+                   Block([App(Name("f"), Lit(1)), Name("x")]))
         )
 
     def test_16(self):
@@ -1350,8 +1344,7 @@ class TestEval(unittest.TestCase):
         self.eval_except(
             Letfun("f", "x",
                    Let("y", Lit(0), Name("x")),
-                   Seq(App(Name("f"), Lit(1)),
-                       Name("y")))
+                   Block([App(Name("f"), Lit(1)), Name("y")]))
         )
 
     def test_18(self):
@@ -1491,8 +1484,8 @@ class TestEval(unittest.TestCase):
         # outputs: 1, 2
         self.eval_equal(
             Let("x", Lit(0),
-                Add(Seq(Assign("x", Read()), Show(Name("x"))),
-                    Seq(Assign("x", Read()), Show(Name("x"))))),
+                Add(Block([Assign("x", Read()), Show(Name("x"))]),
+                    Block([Assign("x", Read()), Show(Name("x"))]))),
             3,
             inputs=["1", "2"],
             expected_outputs=[prompt, "1", prompt, "2"],
@@ -1506,10 +1499,9 @@ class TestEval(unittest.TestCase):
         # outputs: 2
         self.eval_equal(
             Letfun("f", "x",
-                   Seq(Assign("x", Add(Name("x"), Name("x"))),
-                       Show(Name("x"))),
+                   Block([Assign("x", Add(Name("x"), Name("x"))), Show(Name("x"))]),
                    Let("x", Lit(1),
-                       Seq(App(Name("f"), Name("x")), Name("x")))),
+                       Block([App(Name("f"), Name("x")), Name("x")]))),
             1,
             expected_outputs=["2"],
         )
@@ -1527,7 +1519,7 @@ class TestEval(unittest.TestCase):
                                 Assign("x", Mul(Name("x"), Name("y"))),
                                 Name("f"))),
                 Let("x", Lit(3),
-                    Seq(Show(App(Name("f"), Lit(4))), Name("x")))),
+                    Block([Show(App(Name("f"), Lit(4))), Name("x")]))),
             3,
             expected_outputs=["8"],
         )
@@ -1553,14 +1545,12 @@ class TestEval(unittest.TestCase):
                            Letfun("go", "x",
                                   If(Eq(Name("x"), Lit(0)),
                                      Name("acc"),
-                                     Seq(Assign("acc", Mul(Name("acc"), Name("x"))),
-                                         App(Name("go"), Sub(Name("x"), Lit(1))))),
+                                     Block([Assign("acc", Mul(Name("acc"), Name("x"))), App(Name("go"), Sub(Name("x"), Lit(1)))])),
                                   Letfun("fac", "x",
                                          Let("r", App(Name("go"), Name("x")),
-                                             Seq(Assign("acc", Lit(1)), Name("r"))),
+                                             Block([Assign("acc", Lit(1)), Name("r")])),
                                          Name("fac")))),
-                Seq(Show(App(Name("fac"), Lit(3))),
-                    Show(App(Name("fac"), Lit(4))))),
+                Block([Show(App(Name("fac"), Lit(3))), Show(App(Name("fac"), Lit(4)))])),
             24,
             expected_outputs=["6", "24"],
         )
@@ -1588,8 +1578,7 @@ class TestEval(unittest.TestCase):
                        Letfun("loop", "n",
                               If(Eq(Name("n"), Lit(0)),
                                  Name("acc"),
-                                 Seq(Assign("acc", Mul(Name("acc"), Name("n"))),
-                                     App(Name("loop"), Sub(Name("n"), Lit(1))))),
+                                 Block([Assign("acc", Mul(Name("acc"), Name("n"))), App(Name("loop"), Sub(Name("n"), Lit(1)))])),
                               App(Name("loop"), Name("n")))),
                    App(Name("fac"), Lit(5))),
             120,
@@ -1614,8 +1603,7 @@ class TestEval(unittest.TestCase):
             Letfun("b", "n",
                    If(Lt(Name("n"), Lit(2)),
                       Show(Name("n")),
-                      Seq(App(Name("b"), Div(Name("n"), Lit(2))),
-                          Show(Sub(Name("n"), Mul(Div(Name("n"), Lit(2)), Lit(2)))))),
+                      Block([App(Name("b"), Div(Name("n"), Lit(2))), Show(Sub(Name("n"), Mul(Div(Name("n"), Lit(2)), Lit(2))))])),
                    App(Name("b"), Lit(42))),
             0,
             expected_outputs=["1", "0", "1", "0", "1", "0"],
@@ -1660,8 +1648,7 @@ class TestEval(unittest.TestCase):
         # => 3
         self.eval_equal(
             Let("u", Lit(1),
-                Seq(Assign("u", Letfun("f", "x", Name("x"), Name("f"))),
-                    App(Name("u"), Lit(3)))),
+                Block([Assign("u", Letfun("f", "x", Name("x"), Name("f"))), App(Name("u"), Lit(3))])),
             3,
         )
 
@@ -1715,10 +1702,9 @@ class TestEval(unittest.TestCase):
                                                       If(Eq(Name("n"), Lit(0)),
                                                          App(Name("head"),
                                                              Name("xs")),
-                                                         Seq(Assign("n", Sub(Name("n"), Lit(1))),
-                                                             App(Name("inner"),
+                                                         Block([Assign("n", Sub(Name("n"), Lit(1))), App(Name("inner"),
                                                                  App(Name("tail"),
-                                                                     Name("xs"))))),
+                                                                     Name("xs")))])),
                                                       Name("inner")),
                                                Let("xs", App(App(Name("pair"), Lit(5)),
                                                              App(App(Name("pair"), Lit(4)),
@@ -1727,12 +1713,7 @@ class TestEval(unittest.TestCase):
                                                                          App(App(Name("pair"), Lit(1)),
                                                                              App(App(Name("pair"), Lit(0)),
                                                                                  Name("nil"))))))),
-                                                   Seq(Seq(Show(App(App(Name("nth"), Lit(0)), Name("xs"))),
-                                                           Seq(Show(App(App(Name("nth"), Lit(1)), Name("xs"))),
-                                                               Show(App(App(Name("nth"), Lit(2)), Name("xs"))))),
-                                                       Seq(Show(App(App(Name("nth"), Lit(3)), Name("xs"))),
-                                                           Seq(Show(App(App(Name("nth"), Lit(4)), Name("xs"))),
-                                                               Show(App(App(Name("nth"), Lit(5)), Name("xs")))))))))))),
+                                                   Block([Block([Show(App(App(Name("nth"), Lit(0)), Name("xs"))), Show(App(App(Name("nth"), Lit(1)), Name("xs"))), Show(App(App(Name("nth"), Lit(2)), Name("xs")))]), Show(App(App(Name("nth"), Lit(3)), Name("xs"))), Show(App(App(Name("nth"), Lit(4)), Name("xs"))), Show(App(App(Name("nth"), Lit(5)), Name("xs")))]))))))),
             0,
             expected_outputs=["5", "4", "3", "2", "1", "0"],
         )
@@ -1855,9 +1836,7 @@ class TestEval(unittest.TestCase):
                     Letfun("counter", "y",
                            Assign("x", Add(Name("x"), Name("y"))),
                            Name("counter"))),
-                Seq(App(Name("counter"), Lit(1)),
-                    Seq(App(Name("counter"), Lit(1)),
-                        App(Name("counter"), Lit(1))))),
+                Block([App(Name("counter"), Lit(1)), App(Name("counter"), Lit(1)), App(Name("counter"), Lit(1))])),
             3
         )
 
@@ -0,0 +1,75 @@
+# testing the binary AST encoding
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from ast_codec import dump_ast, load_ast, AstFormatError, MAGIC, VERSION
+    from parse_run import parse_to_ast, cooking, drums, octave_four
+    from interp import Lit, Add, Name, Block
+    from engine_tests import EVERY_NODE
+
+
+class TestRoundTrip(unittest.TestCase):
+    def test_every_node_type(self):
+        data = dump_ast(EVERY_NODE)
+        self.assertEqual(data[:5], MAGIC + bytes([VERSION]))
+        self.assertEqual(load_ast(data), EVERY_NODE)
+
+    def test_literal_types(self):
+        for value in [0, 1, -1, 127, 128, -(2**63), True, False]:
+            with self.subTest(value=value):
+                back = load_ast(dump_ast(Lit(value)))
+                self.assertEqual(back, Lit(value))
+                self.assertIs(type(back.value), type(value))
+
+    def test_parsed_programs(self):
+        for src in [cooking, drums, octave_four, "x; y; (a; b)", "let a = 1 in a end"]:
+            ast = parse_to_ast(src)
+            self.assertEqual(load_ast(dump_ast(ast)), ast)
+
+    def test_strings_interned(self):
+        ast = Block((Name("a_long_variable_name"),) * 100)
+        self.assertLess(len(dump_ast(ast)), 250)
+
+    def test_deep_tree(self):
+        ast = Lit(0)
+        for i in range(20000):
+            ast = Add(ast, Lit(i))
+        self.assertEqual(dump_ast(load_ast(dump_ast(ast))), dump_ast(ast))
+
+    def test_not_an_expr(self):
+        with self.assertRaises(TypeError):
+            dump_ast(Lit("text"))
+        with self.assertRaises(TypeError):
+            dump_ast(Add(Lit(1), 2))
+
+
+class TestMalformed(unittest.TestCase):
+    def test_bad_header(self):
+        for data in [b"", b"EXP", b"not an ast", MAGIC, MAGIC + bytes([VERSION + 1])]:
+            with self.subTest(data=data), self.assertRaises(AstFormatError):
+                load_ast(data)
+
+    def test_every_truncation(self):
+        data = dump_ast(EVERY_NODE)
+        for n in range(len(data)):
+            with self.subTest(n=n), self.assertRaises(AstFormatError):
+                load_ast(data[:n])
+
+    def test_trailing_bytes(self):
+        with self.assertRaises(AstFormatError):
+            load_ast(dump_ast(Lit(1)) + b"\0")
+
+    def test_corrupt_bytes(self):
+        data = dump_ast(parse_to_ast(cooking))
+        for i in range(5, len(data), 7):
+            corrupt = data[:i] + bytes([data[i] ^ 0xff]) + data[i + 1:]
+            try:
+                load_ast(corrupt)
+            except AstFormatError:
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
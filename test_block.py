@@ -0,0 +1,46 @@
+# testing flat statement blocks
+
+import sys
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from parse_run import parse_to_ast
+    from interp import Block, Seq, Let, Name, Lit, Assign, Add, evalInEnv
+
+
+def counter(n: int) -> str:
+    return "let x = 0 in " + "; ".join(["x := x + 1"] * n) + "; x end"
+
+
+class TestBlock(unittest.TestCase):
+    def test_flat(self):
+        for engine in ('lalr', 'earley', 'pratt'):
+            with self.subTest(engine=engine):
+                self.assertEqual(parse_to_ast("a; b; c; d", engine),
+                                 Block((Name("a"), Name("b"), Name("c"), Name("d"))))
+                self.assertEqual(parse_to_ast("a", engine), Name("a"))
+
+    def test_long_program(self):
+        # far more statements than the recursion limit
+        n = 2 * sys.getrecursionlimit()
+        for engine in ('lalr', 'pratt'):
+            with self.subTest(engine=engine):
+                ast = parse_to_ast(counter(n), engine)
+                self.assertEqual(len(ast.bodyexpr.stmts), n + 1)
+                self.assertEqual(evalInEnv((), ast), n)
+                self.assertEqual(str(ast).count(";"), n)
+
+    def test_value_is_last_statement(self):
+        self.assertEqual(evalInEnv((), parse_to_ast("1; true; 3")), 3)
+
+    def test_seq_still_evaluates(self):
+        let = Let("x", Lit(1), Seq(Assign("x", Add(Name("x"), Lit(1))), Name("x")))
+        self.assertEqual(evalInEnv((), let), 2)
+
+    def test_str(self):
+        self.assertEqual(str(Block((Name("a"), Lit(1)))), "(a; 1)")
+
+
+if __name__ == "__main__":
+    unittest.main()
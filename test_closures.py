@@ -0,0 +1,50 @@
+# testing the closure-compiling evaluator
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import EvalError, Lit, Add, Name, Let, Letfun, App, Ifnz, Tune, evaluate, run
+    from closures import compile_expr
+    from parse_run import parse_to_ast
+    import engine_tests
+    import test_phase1_core
+
+
+class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+    '''The core-language suite again, run on compiled closures'''
+    engine = 'closure'
+
+
+class TestClosures(engine_tests.SameAsTree, unittest.TestCase):
+    engine = 'closure'
+
+    def test_compile_once_run_many(self):
+        code = compile_expr(parse_to_ast("letfun f(n) = if n <= 1 then n else f(n - 1) + f(n - 2) in f(x) end"))
+        for x, fib in [(1, 1), (10, 55), (15, 610)]:
+            self.assertEqual(code(((("x", [x]),))), fib)
+
+    def test_errors_raised_when_run(self):
+        code = compile_expr(Ifnz(Lit(0), Name("unbound"), Lit(3)))
+        self.assertEqual(code(()), 3)
+        code = compile_expr(Tune((Lit(1),), Lit(1)))
+        with self.assertRaisesRegex(EvalError, "only Tune or Note"):
+            code(())
+
+    def test_closure_body_is_compiled(self):
+        fun = evaluate(Letfun("f", "x", Add(Name("x"), Lit(1)), Name("f")), 'closure')
+        self.assertTrue(callable(fun.body))
+        self.assertEqual(evaluate(Let("g", Letfun("f", "x", Name("x"), Name("f")), App(Name("g"), Lit(4))),
+                                  'closure'), 4)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            evaluate(Lit(1), 'nope')
+
+    def test_run(self):
+        with redirect_stdout(None):
+            run(Add(Lit(1), Lit(2)), engine='closure')
+
+
+if __name__ == '__main__':
+    unittest.main()
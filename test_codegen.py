@@ -0,0 +1,93 @@
+# testing compilation to Python code objects
+
+import ast
+import io
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import Closure, Lit, Add, Name, Let, Letfun, Assign, Note, Tune, Block, Import, \
+        evaluate
+    from codegen import lower, compile_program, execute, code_cache
+    from vm import BytecodeCache
+    from parse_run import parse_to_ast
+    import engine_tests
+    from engine_tests import outcome
+    import test_phase1_core
+
+
+class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+    '''The core-language suite again, run as Python code'''
+    engine = 'python'
+
+
+class TestCodegen(engine_tests.SameAsTree, unittest.TestCase):
+    engine = 'python'
+
+    def test_lowered_shape(self):
+        module = lower(parse_to_ast("letfun f(n) = if n == 0 then 1 else n * f(n - 1) in f(5) end"))
+        source = ast.unparse(module)
+        self.assertIn("def __program__(_env):", source)
+        self.assertIn("def f_fn_", source)
+        self.assertIn(" if ifCondition(", source)
+        self.assertNotIn("call(", source)   # f is called directly
+
+    def test_shadowing(self):
+        expr = parse_to_ast("let x = 1 in (let x = 2 in x end) + x end")
+        self.assertEqual(outcome('python', expr), 3)
+
+    def test_assign_seen_by_functions(self):
+        expr = parse_to_ast("let x = 5 in letfun g(y) = x := x + y in g(1); g(2); x end end")
+        self.assertEqual(outcome('python', expr), 8)
+        expr = parse_to_ast("let x = 5 in letfun g(y) = x in x := 7; g(0) end end")
+        self.assertEqual(outcome('python', expr), 7)
+
+    def test_assign_to_function(self):
+        for expr in [parse_to_ast("letfun f(n) = n in f := 2 end"),
+                     Letfun("f", "n", Name("n"), Let("g", Name("f"), Assign("g", Lit(2))))]:
+            self.assertEqual(outcome('python', expr), outcome('tree', expr))
+            self.assertEqual(outcome('python', expr)[0], "EvalError")
+
+    def test_functions_are_closures(self):
+        fun = evaluate(Letfun("f", "x", Add(Name("x"), Lit(1)), Name("f")), 'python')
+        self.assertIsInstance(fun, Closure)
+        self.assertEqual(fun.body(2), 3)
+        expr = parse_to_ast("let g = letfun f(x) = x * 2 in f end in g(21) end")
+        self.assertEqual(outcome('python', expr), 42)
+
+    def test_initial_environment(self):
+        code = compile_program(Block((Assign("x", Add(Name("x"), Lit(1))), Name("x"))))
+        self.assertEqual(execute(code, (("x", [41]),)), 42)
+        self.assertEqual(outcome('python', Name("x")), ("EvalError", "unbound Name: x"))
+
+    def test_tree_checks_happen_in_order(self):
+        for instrument in [500, 5]:
+            expr = Tune((Note("H9", Lit(1)),), Lit(instrument))
+            self.assertEqual(outcome('python', expr), outcome('tree', expr))
+        self.assertEqual(outcome('python', Let("", Name("y"), Lit(1))), ("EvalError", "Name cannot be empty"))
+
+    def test_assign_to_unbound_name(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(outcome('python', parse_to_ast("y := (show 5)")), ("EvalError", "unbound name y"))
+        self.assertEqual(out.getvalue(), "")
+
+    def test_import(self):
+        for expr in [Import("no/such/module.tune"), Block((Lit(1), Import("no/such/module.tune")))]:
+            self.assertEqual(outcome('python', expr), outcome('tree', expr))
+
+    def test_names_that_are_python_keywords(self):
+        expr = Let("lambda", Lit(2), Let("call", Lit(3), Add(Name("lambda"), Name("call"))))
+        self.assertEqual(outcome('python', expr), 5)
+
+    def test_code_cache(self):
+        self.assertIsInstance(code_cache, BytecodeCache)
+        before = code_cache.hits
+        code = code_cache.compile(parse_to_ast("2 * 21"))
+        self.assertIs(code_cache.compile(parse_to_ast("2*21")), code)
+        self.assertEqual(code_cache.hits, before + 1)
+        self.assertEqual(execute(code), 42)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# testing the notes "..." literal
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from parse_run import parse_to_ast, scan_notes, ParseError, octave_four
+    from interp import Tune, Note, Lit, Show, Track, Repeat, evalInEnv
+
+
+LONGHAND = "tune [ note C4 for 1 seconds, note D4 for 1 seconds, note R for 2 seconds, volume(note E4 for 1 seconds, 90) ] (1)"
+DENSE = 'tune [ notes "C4:1 D4:1 R:2 E4:1@90" ] (1)'
+ENGINES = ('lalr', 'earley', 'pratt')
+
+
+class TestScanner(unittest.TestCase):
+    def test_notes(self):
+        self.assertEqual(scan_notes("C4:1 D#4:2 R:3 C-1:1@0 G9:1@127"),
+                         [Note("C4", Lit(1)), Note("D#4", Lit(2)), Note("R", Lit(3)),
+                          Note("C-1", Lit(1), 0), Note("G9", Lit(1), 127)])
+
+    def test_whitespace(self):
+        self.assertEqual(scan_notes("  C4:1\n\tD4:1  "), [Note("C4", Lit(1)), Note("D4", Lit(1))])
+        self.assertEqual(scan_notes(""), [])
+        self.assertEqual(scan_notes("   "), [])
+
+    def test_durations_shared(self):
+        notes = scan_notes("C4:1 D4:1 E4:2")
+        self.assertIs(notes[0].duration, notes[1].duration)
+
+    def test_errors(self):
+        for body in ["C4", "C4:", "C4:x", "H4:1", "A9:1", "C4:1@128", "C4:1@", "C4:1D4:1", "c4:1", "C4 :1"]:
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                scan_notes(body)
+
+
+class TestDenseNotes(unittest.TestCase):
+    def test_same_notes_as_longhand(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                dense = parse_to_ast(DENSE, engine)
+                self.assertEqual(len(dense.notes), 4)
+                self.assertEqual(dense.notes[:3], parse_to_ast(LONGHAND, engine).notes[:3])
+                self.assertEqual(dense.notes[3], Note("E4", Lit(1), 90))
+
+    def test_mixed_with_other_items(self):
+        src = 'track [ tune [ note C4 for 1 seconds, notes "D4:1 E4:1", repeat(note F4 for 1 seconds, 2), notes "" ] (1) ]'
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                ast = parse_to_ast(src, engine)
+                self.assertIsInstance(ast, Track)
+                notes = ast.tracks[0].notes
+                self.assertEqual(notes[1:3], (Note("D4", Lit(1)), Note("E4", Lit(1))))
+                self.assertIsInstance(notes[3], Repeat)
+                self.assertEqual(len(notes), 4)
+
+    def test_only_in_lists(self):
+        for src in ['notes "C4:1"', 'repeat(notes "C4:1", 2)', 'tune [ notes ] (1)']:
+            for engine in ENGINES:
+                with self.subTest(src=src, engine=engine), self.assertRaises(ParseError):
+                    parse_to_ast(src, engine)
+
+    def test_bad_literal(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine), self.assertRaises(ParseError):
+                parse_to_ast('tune [ notes "C4:1 X" ] (1)', engine)
+
+    def test_notes_is_reserved(self):
+        with self.assertRaises(ParseError):
+            parse_to_ast("notes := 1")
+
+    def test_eval_keeps_volume(self):
+        tune = evalInEnv((), parse_to_ast(DENSE))
+        self.assertIsInstance(tune, Tune)
+        self.assertEqual([n.volume for n in tune.notes], [100, 100, 100, 90])
+
+    def test_demo_songs(self):
+        ast = parse_to_ast(octave_four)
+        self.assertIsInstance(ast, Show)
+        self.assertEqual(len(ast.expr.tracks[0].tune.notes), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
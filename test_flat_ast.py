@@ -0,0 +1,102 @@
+# testing flat (struct-of-arrays) ASTs and their evaluator
+
+import gc
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from flat_ast import FlatAst, Op, to_flat, from_flat, eval_flat
+    from parse_run import parse_to_ast, cooking
+    from interp import EvalError, Lit, Add, Name, Note, Tune
+    from hashcons import Interner
+    import engine_tests
+    from engine_tests import PROGRAMS, ERRORS, EVERY_NODE, ast_of, outcome
+
+
+def run_flat(expr):
+    return eval_flat(to_flat(expr))
+
+
+class TestConversion(unittest.TestCase):
+    def test_every_node_type(self):
+        flat = to_flat(EVERY_NODE)
+        self.assertIsInstance(flat, FlatAst)
+        self.assertEqual(from_flat(flat), EVERY_NODE)
+
+    def test_parsed_programs(self):
+        for src in engine_tests.SONGS + PROGRAMS:
+            ast = ast_of(src)
+            self.assertEqual(from_flat(to_flat(ast)), ast)
+
+    def test_literals(self):
+        for value in [0, -1, 2**31 - 1, -2**31, 2**31, -2**70, True, False]:
+            with self.subTest(value=value):
+                back = from_flat(to_flat(Lit(value))).value
+                self.assertEqual(back, value)
+                self.assertIs(type(back), type(value))
+        self.assertEqual(to_flat(Lit(2**40)).op[0], Op.LIT_BIG)
+
+    def test_post_order(self):
+        flat = to_flat(Add(Lit(1), Name("x")))
+        self.assertEqual(list(flat.op), [Op.LIT_INT, Op.NAME, Op.ADD])
+        self.assertEqual(flat.root, 2)
+        self.assertEqual(flat.strings, ["x"])
+
+    def test_shared_subtrees_stored_once(self):
+        note = Note("C4", Lit(1))
+        ast = Tune((note,) * 1000, Lit(1))
+        flat = to_flat(ast)
+        self.assertEqual(len(flat), 3)   # Lit(1), the Note and the Tune
+        back = from_flat(flat)
+        self.assertEqual(back, ast)
+        self.assertIs(back.notes[0], back.notes[999])
+
+    def test_interned_tree(self):
+        ast = Interner().intern(parse_to_ast(cooking))
+        self.assertEqual(from_flat(to_flat(ast)), ast)
+
+    def test_deep_tree(self):
+        ast = Lit(0)
+        for i in range(20000):
+            ast = Add(ast, Lit(i))
+        self.assertEqual(len(to_flat(ast)), 40000)   # the two Lit(0)s are one node
+
+    def test_not_an_expr(self):
+        with self.assertRaises(TypeError):
+            to_flat(Lit("text"))
+        with self.assertRaises(TypeError):
+            to_flat(Add(Lit(1), 2))
+
+    def test_equal_literals_stored_once(self):
+        ast = Tune(tuple(Note("C4", Lit(i % 4 + 1)) for i in range(1000)), Lit(1))
+        flat = to_flat(ast)
+        self.assertEqual(list(flat.op).count(Op.LIT_INT), 4)
+        self.assertLess(flat.nbytes, 1000 * 24)
+        self.assertEqual(from_flat(flat), ast)
+
+    def test_no_objects_per_node(self):
+        flat = to_flat(parse_to_ast(cooking))
+        # the three arrays, the two tables and the class, however big the program
+        self.assertEqual(len(gc.get_referents(flat)), 6)
+
+
+class TestEvalFlat(engine_tests.SameAsTree, unittest.TestCase):
+    engine = staticmethod(run_flat)
+
+    def test_errors_are_raised(self):
+        for src in ERRORS:
+            with self.subTest(src=src), self.assertRaises(EvalError):
+                eval_flat(to_flat(ast_of(src)))
+
+    def test_unbound_name_in_block(self):
+        # x and y are unbound, so the Block stops at its first statement
+        self.assertEqual(outcome(run_flat, parse_to_ast("x; y; (a; b)")),
+                         ("EvalError", "unbound Name: x"))
+
+    def test_recursion_in_closure(self):
+        flat = to_flat(parse_to_ast("letfun f(n) = if n <= 1 then n else f(n - 1) + f(n - 2) in f(15) end"))
+        self.assertEqual(eval_flat(flat), 610)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# testing hash-consing of AST subtrees
+
+import tracemalloc
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from hashcons import Interner
+    from parse_run import parse_to_ast, cooking
+    from interp import Lit, Add, Note, Tune, Track, Volume, Block, Name, evalInEnv
+
+
+def count_nodes(ast) -> tuple[int, int]:
+    '''(nodes in the tree, distinct node objects in it)'''
+    total, seen, stack = 0, set(), [ast]
+    while stack:
+        node = stack.pop()
+        total += 1
+        seen.add(id(node))
+        for value in [getattr(node, f) for f in node.__dataclass_fields__]:
+            for child in value if isinstance(value, tuple) else (value,):
+                if hasattr(child, '__dataclass_fields__'):
+                    stack.append(child)
+    return total, len(seen)
+
+
+class TestInterner(unittest.TestCase):
+    def test_equal_to_the_plain_ast(self):
+        for engine in ('lalr', 'earley', 'pratt'):
+            with self.subTest(engine=engine):
+                interner = Interner()
+                ast = parse_to_ast(cooking, engine, interner=interner)
+                plain = parse_to_ast(cooking, engine)
+                self.assertEqual(ast, plain)
+                self.assertIs(interner.intern(plain), ast)
+
+    def test_repeats_are_shared(self):
+        ast = parse_to_ast(cooking, interner=Interner())
+        total, distinct = count_nodes(ast)
+        self.assertLess(distinct, total * 0.7)
+        organ = ast.expr.tracks[0].tune.notes
+        self.assertIs(organ[0], organ[2])      # volume(note D1 for 1 seconds, 127) twice
+        self.assertIsNot(organ[0], organ[1])
+
+    def test_identity_across_parses(self):
+        interner = Interner()
+        a = parse_to_ast(cooking, interner=interner)
+        size = len(interner)
+        b = parse_to_ast(cooking, 'pratt', interner=interner)
+        self.assertIs(a, b)
+        self.assertEqual(len(interner), size)
+
+    def test_equal_iff_identical(self):
+        interner = Interner()
+        nodes = [interner.intern(parse_to_ast(src)) for src in
+                 ["1 + 2", "(1 + 2)", "1 + 3", "false", "x; y", "x; y", "note C4 for 1 seconds"]]
+        for a in nodes:
+            for b in nodes:
+                self.assertEqual(a == b, a is b)
+
+    def test_nodes_are_hashable(self):
+        for src in ["x; y", "tune [ note C4 for 1 seconds ] (1)", "track [ note C4 for 1 seconds ]", cooking]:
+            with self.subTest(src=src[:20]):
+                ast = parse_to_ast(src)
+                self.assertEqual(hash(ast), hash(parse_to_ast(src, 'pratt')))
+                self.assertEqual({ast: 1}[parse_to_ast(src, 'earley')], 1)
+
+    def test_built_from_lists(self):
+        note = Note("C4", Lit(1))
+        for node, same in [(Tune([note], Lit(1)), Tune((note,), Lit(1))), (Track([note]), Track((note,))),
+                           (Block([Name("a"), Lit(1)]), Block((Name("a"), Lit(1))))]:
+            with self.subTest(node=node):
+                self.assertEqual(node, same)
+                self.assertEqual(hash(node), hash(same))
+        self.assertEqual(evalInEnv((), Tune([note], Lit(1))), evalInEnv((), Tune((note,), Lit(1))))
+
+    def test_interned_while_parsing(self):
+        interner = Interner()
+        shared = interner.intern(parse_to_ast("note C4 for 1 seconds"))
+        for engine in ('lalr', 'earley', 'pratt'):
+            with self.subTest(engine=engine):
+                ast = parse_to_ast("tune [ note C4 for 1 seconds ] (1)", engine, interner=interner)
+                self.assertIs(ast.notes[0], shared)
+
+    def test_parses_in_threads(self):
+        # each parse interns into its own interner only, even with the others running
+        alone = Interner()
+        parse_to_ast(cooking, interner=alone)
+        interners = [Interner() for _ in range(8)]
+        def parse(interner):
+            return [parse_to_ast(cooking, engine, interner=interner) for engine in ('lalr', 'pratt') * 5]
+        with ThreadPoolExecutor(max_workers=len(interners)) as pool:
+            results = list(pool.map(parse, interners))
+        for interner, asts in zip(interners, results):
+            self.assertEqual(len(interner), len(alone))
+            for ast in asts:
+                self.assertIs(ast, asts[0])
+                self.assertIs(interner.intern(ast), ast)
+
+    def test_shared_between_threads(self):
+        interner = Interner()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            asts = list(pool.map(lambda engine: parse_to_ast(cooking, engine, interner=interner),
+                                 ['lalr', 'pratt'] * 8))
+        for ast in asts:
+            self.assertIs(ast, asts[0])
+
+    def test_peak_memory(self):
+        src = "track [ tune [ " + ", ".join(["volume(note R for 2 + 1 seconds, 127)"] * 1000) + " ] (1) ]"
+        for engine in ('lalr', 'pratt'):
+            with self.subTest(engine=engine):
+                peaks = []
+                for interner in (None, Interner()):
+                    # builds the parser and fills the free lists, which tracemalloc counts as in use
+                    parse_to_ast(src, engine, interner=interner)
+                    tracemalloc.start()
+                    try:
+                        parse_to_ast(src, engine, interner=interner)
+                        peaks.append(tracemalloc.get_traced_memory()[1])
+                    finally:
+                        tracemalloc.stop()
+                self.assertLess(peaks[1], peaks[0] / 3)
+
+    def test_bool_and_int_literals_differ(self):
+        interner = Interner()
+        self.assertIsNot(interner.intern(Lit(True)), interner.intern(Lit(1)))
+        self.assertIs(type(interner.intern(Lit(1)).value), int)
+
+    def test_note_fields(self):
+        interner = Interner()
+        self.assertIsNot(interner.intern(Note("C4", Lit(1), 90)), interner.intern(Note("C4", Lit(1))))
+        self.assertIs(interner.intern(Note("C4", Lit(1))), interner.intern(Note("C4", Lit(1))))
+
+    def test_deep_tree(self):
+        ast = Lit(0)
+        for i in range(20000):
+            ast = Add(ast, Lit(i % 3))
+        interned = Interner().intern(ast)
+        self.assertEqual(len(Interner().intern(Block((interned, interned))).stmts), 2)
+
+    def test_evaluates_the_same(self):
+        src = "let x = 0 in x := x + 1; x := x + 1; x end"
+        self.assertEqual(evalInEnv((), parse_to_ast(src, interner=Interner())), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
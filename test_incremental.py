@@ -0,0 +1,118 @@
+# testing incremental reparsing
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from incremental import reparse, TextEdit
+    from parse_run import parse_to_ast, ParseError
+    from interp import Block, Note, Lit
+    from statements import statement_spans, element_spans, list_openings
+
+
+SONG = '''x := 1;
+show tune [ note C4 for 1 seconds, repeat(tune [note D4 for 2 seconds, note E4 for 1 seconds](3), 2) ] (1);
+let y = 2 in y; y end;
+show track [ tune [note A4 for 1 seconds](2), tune [note B4 for 3 seconds](4) ]'''
+
+
+def edit_at(source: str, old: str, new: str, nth: int = 0) -> TextEdit:
+    start = -1
+    for _ in range(nth + 1):
+        start = source.index(old, start + 1)
+    return TextEdit(start, start + len(old), new)
+
+def statements(ast):
+    return ast.stmts if isinstance(ast, Block) else [ast]
+
+
+class TestStatements(unittest.TestCase):
+    def test_top_level_split(self):
+        spans = statement_spans(SONG)
+        self.assertEqual(len(spans), 4)
+        self.assertEqual(SONG[slice(*spans[2])].strip(), "let y = 2 in y; y end")
+
+    def test_if_else_nesting(self):
+        src = "if a then b; c else d; e"
+        self.assertEqual([src[s:e].strip() for s, e in statement_spans(src)],
+                         ["if a then b; c else d", "e"])
+
+    def test_list_elements(self):
+        src = "tune [ note C4 for 1 seconds, repeat(tune [](1), 2) ] (1)"
+        elements = element_spans(src, list_openings(src)[0])
+        self.assertEqual([src[s:e].strip() for s, e in elements],
+                         ["note C4 for 1 seconds", "repeat(tune [](1), 2)"])
+        self.assertEqual(element_spans("tune [ ] (1)", 5), [])
+
+
+class TestReparse(unittest.TestCase):
+    def setUp(self):
+        self.ast = parse_to_ast(SONG)
+
+    def check(self, edit: TextEdit):
+        new_source, new_ast = reparse(SONG, self.ast, edit)
+        self.assertEqual(new_source, edit.apply(SONG))
+        self.assertEqual(new_ast, parse_to_ast(new_source))
+        return new_ast
+
+    def test_edit_one_note(self):
+        new = self.check(edit_at(SONG, "C4", "G4"))
+        old_stmts, new_stmts = statements(self.ast), statements(new)
+        self.assertIs(new_stmts[0], old_stmts[0])
+        self.assertIsNot(new_stmts[1], old_stmts[1])
+        self.assertIs(new_stmts[2], old_stmts[2])
+        self.assertIs(new_stmts[3], old_stmts[3])
+        # the other element of the same list is reused too
+        self.assertIs(new_stmts[1].expr.notes[1], old_stmts[1].expr.notes[1])
+        self.assertEqual(new_stmts[1].expr.notes[0], Note("G4", Lit(1)))
+
+    def test_edit_nested_list(self):
+        new = self.check(edit_at(SONG, "2 seconds", "5 seconds"))
+        inner_old = statements(self.ast)[1].expr.notes[1].tune
+        inner_new = statements(new)[1].expr.notes[1].tune
+        self.assertIs(inner_new.notes[1], inner_old.notes[1])
+        self.assertIs(inner_new.instrument, inner_old.instrument)
+
+    def test_unchanged_tail_reused(self):
+        new = self.check(edit_at(SONG, "x := 1", "x := 2"))
+        for a, b in zip(statements(new)[1:], statements(self.ast)[1:]):
+            self.assertIs(a, b)
+
+    def test_add_statement(self):
+        new = self.check(TextEdit(0, 0, "show 5; "))
+        for a, b in zip(statements(new)[1:], statements(self.ast)):
+            self.assertIs(a, b)
+
+    def test_remove_statement(self):
+        end = SONG.index(";") + 1
+        new = self.check(TextEdit(0, end, ""))
+        for a, b in zip(statements(new), statements(self.ast)[1:]):
+            self.assertIs(a, b)
+
+    def test_no_op_edit(self):
+        new = self.check(TextEdit(0, 0, ""))
+        self.assertIs(new, self.ast)
+
+    def test_edit_inside_let(self):
+        new = self.check(edit_at(SONG, "y; y", "y; y + 1"))
+        self.assertIs(statements(new)[3], statements(self.ast)[3])
+
+    def test_edit_that_breaks_nesting(self):
+        with self.assertRaises(ParseError):
+            reparse(SONG, self.ast, TextEdit(0, 0, "("))
+
+    def test_element_that_is_not_a_note(self):
+        with self.assertRaises(ParseError):
+            reparse(SONG, self.ast, edit_at(SONG, "note C4 for 1 seconds", "1 + 2"))
+
+    def test_new_list_element(self):
+        self.check(edit_at(SONG, "note C4 for 1 seconds", "note C4 for 1 seconds, note F4 for 1 seconds"))
+
+    def test_single_statement(self):
+        src = "tune [ note C4 for 1 seconds ] (1)"
+        new_source, new_ast = reparse(src, parse_to_ast(src), edit_at(src, "C4", "D4"))
+        self.assertEqual(new_ast, parse_to_ast(new_source))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# testing the deterministic LALR grammar (expr_lalr.lark) against the Earley one
+
+import unittest
+import os
+import re
+import tempfile
+from unittest import mock
+from pathlib import Path
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from parse_run import just_parse, build_lalr, GrammarConflict, parse, ParseError, \
+        RESERVED_WORDS, parse_to_ast, genAST
+    import interp
+    from interp import NOTE_TO_MIDI, PITCH_PATTERN, EvalError, Note, Tune, checkPitch, pitch_to_midi
+    import test2
+    import test3
+
+
+# Rerun every parse case of milestones 2 and 3 through both parsers: the
+# same AST as Earley, or a ParseError from both
+class SameAsEarley:
+    def engine_parse(self, concrete:str):
+        return genAST(parse(concrete, 'lalr'))
+
+    def parse(self, concrete:str, expected):
+        try:
+            earley = parse_to_ast(concrete, 'earley')
+        except ParseError:
+            with self.assertRaises(ParseError, msg=f'accepted, but not by earley: "{concrete}"'):
+                self.engine_parse(concrete)
+            return
+        got = self.engine_parse(concrete)
+        self.assertEqual(
+            got,
+            earley,
+            f'{type(self).__name__}/earley mismatch: "{concrete}" got: {got} earley: {earley}')
+
+class TestLalrMilestone2(SameAsEarley, test2.TestParsing):
+    pass
+
+class TestLalrMilestone3(SameAsEarley, test3.TestParsing):
+    pass
+
+class TestLalrDSL(SameAsEarley, unittest.TestCase):
+    def test_note(self):
+        self.parse("note C#4 for 2 seconds", None)
+
+    def test_tune(self):
+        self.parse("tune [ note C4 for 1 seconds, note R for 2 seconds ] (1)", None)
+
+    def test_empty_tune(self):
+        self.parse("tune [] (1)", None)
+
+    def test_concat(self):
+        self.parse("tune [ note C4 for 1 seconds ] (1) ++ tune [ note D4 for 1 seconds ] (2)", None)
+
+    def test_transpose(self):
+        self.parse("transpose tune [ note C4 for 1 seconds ] (1) by -2", None)
+
+    def test_track(self):
+        self.parse(
+            "show track [ repeat ( tune [ note G4 for 1 seconds, note B4 for 1 seconds] (read), 10), "
+            "tune [ volume(note A3 for 24 seconds, 100) ](18) ]",
+            None)
+
+# parse_to_ast runs ToExpr inline, it should still agree with the Earley path
+class InlineSameAsEarley(SameAsEarley):
+    def engine_parse(self, concrete:str):
+        return parse_to_ast(concrete)
+
+class TestInlineMilestone2(InlineSameAsEarley, test2.TestParsing):
+    pass
+
+class TestInlineMilestone3(InlineSameAsEarley, test3.TestParsing):
+    pass
+
+class TestInlineDSL(InlineSameAsEarley, TestLalrDSL):
+    pass
+
+class TestLalrGrammar(unittest.TestCase):
+    def test_conflicts_reported_at_build(self):
+        # expr.lark's open-ended transpose operand is ambiguous under LALR
+        with self.assertRaises(GrammarConflict):
+            build_lalr(Path('expr.lark').read_text())
+
+    def test_transpose_is_not_ambiguous(self):
+        with redirect_stdout(None):
+            self.assertIsNone(just_parse("transpose tune [] (1) by 1 + 2", 'earley'))
+            self.assertIsNotNone(just_parse("transpose tune [] (1) by 1 + 2", 'lalr'))
+
+class TestLexer(unittest.TestCase):
+    def test_pitch_to_midi_matches_table(self):
+        for pitch, midi in NOTE_TO_MIDI.items():
+            self.assertEqual(pitch_to_midi(pitch), midi, pitch)
+
+    def test_invalid_pitches(self):
+        for pitch in ["E#4", "B#1", "G#9", "A9", "B9", "C10", "C-2", "H4", "C", "r"]:
+            self.assertIsNone(pitch_to_midi(pitch), pitch)
+            with self.assertRaises(ParseError):
+                parse(f"note {pitch} for 1 seconds", 'lalr')
+
+    def test_interpreter_uses_pitch_to_midi(self):
+        for pitch in ["E#4", "G#9", "H4"]:
+            self.assertRaises(EvalError, checkPitch, pitch)
+        checkPitch("G9")
+        pitches = []
+        class Recorder(interp.MIDIFile):
+            def addNote(self, track, channel, pitch, *rest):
+                pitches.append(pitch)
+                super().addNote(track, channel, pitch, *rest)
+        with tempfile.TemporaryDirectory() as tmp, redirect_stdout(None), \
+                mock.patch.object(interp, 'MIDIFile', Recorder), \
+                mock.patch.object(interp, 'FILENAME', os.path.join(tmp, 'out.midi')):
+            interp.CreateMidiFile(Tune((Note("C#-1", 1), Note("R", 1), Note("G9", 2)), 1), 0)
+        self.assertEqual(pitches, [1, 127])
+
+    def test_grammar_uses_pitch_pattern(self):
+        for grammar in ['expr.lark', 'expr_lalr.lark']:
+            self.assertIn(f"NOTE_PITCH: /{PITCH_PATTERN.pattern}/", Path(grammar).read_text())
+
+    def test_pitch_names_are_still_ids(self):
+        with redirect_stdout(None):
+            self.assertIsNotNone(just_parse("let C4 = 1 in note C4 for C4 seconds end", 'lalr'))
+
+    def test_reserved_words_rejected_as_names(self):
+        for engine in ('lalr', 'earley', 'pratt'):
+            for word in RESERVED_WORDS:
+                for src in [f"let {word} = 1 in {word} end", f"letfun {word}(x) = x in 2 end"]:
+                    with self.subTest(engine=engine, src=src), self.assertRaises(ParseError):
+                        parse_to_ast(src, engine)
+
+    def test_reserved_words_cover_grammar(self):
+        words = set(re.findall(r'"([a-z]+)"', Path('expr_lalr.lark').read_text()))
+        self.assertEqual(words, set(RESERVED_WORDS))
+
+
+if __name__ == "__main__":
+    unittest.main()
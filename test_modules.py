@@ -0,0 +1,139 @@
+# testing import of module definitions
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    import modules
+    from modules import module_cache
+    from parse_run import parse_to_ast, stream_driver
+    from parse_cache import ParseCache
+    from interp import Import, Block, Name, EvalError, Tune, evalInEnv, evaluate
+
+
+DRUMS = '''let organ = 17 in
+letfun beat(n) = tune [ repeat(tune [ note C1 for 1 seconds, note R for 1 seconds ](organ), n) ](organ) in
+0 end end;
+let count = 7 in count end'''
+
+
+class ModuleTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        (self.dir / 'lib').mkdir()
+        self.write('lib/drums.tune', DRUMS)
+        patches = [mock.patch.object(modules, 'MODULE_PATH', [self.dir]),
+                   mock.patch.object(modules, 'MODULE_CACHE_DIR', self.dir / 'cache'),
+                   mock.patch.object(modules, '_cache', None)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name: str, text: str):
+        (self.dir / name).write_text(text)
+
+    def run_program(self, src: str):
+        return evalInEnv((), parse_to_ast(src))
+
+
+class TestImport(ModuleTest):
+    def test_parses_to_import(self):
+        for engine in ('lalr', 'earley', 'pratt'):
+            with self.subTest(engine=engine):
+                self.assertEqual(parse_to_ast('import "lib/drums.tune"; organ', engine),
+                                 Block((Import("lib/drums.tune"), Name("organ"))))
+
+    def test_binds_definitions(self):
+        self.assertEqual(self.run_program('import "lib/drums.tune"; count + 1'), 8)
+        beat = self.run_program('import "lib/drums.tune"; beat(2)')
+        self.assertIsInstance(beat, Tune)
+
+    def test_only_for_later_statements_of_the_block(self):
+        with self.assertRaises(EvalError):
+            self.run_program('count; import "lib/drums.tune"')
+        with self.assertRaises(EvalError):
+            self.run_program('(import "lib/drums.tune"; count); count')
+
+    def test_module_cannot_see_importer(self):
+        self.write('uses_x.tune', 'let y = x in y end')
+        with self.assertRaises(EvalError):
+            self.run_program('let x = 1 in import "uses_x.tune"; y end')
+
+    def test_assignment_does_not_leak(self):
+        self.assertEqual(self.run_program('import "lib/drums.tune"; count := 1; count'), 1)
+        self.assertEqual(self.run_program('import "lib/drums.tune"; count'), 7)
+
+    def test_nested_import(self):
+        self.write('song.tune', 'import "lib/drums.tune"; let twice = count * 2 in twice end')
+        self.assertEqual(self.run_program('import "song.tune"; twice'), 14)
+
+    def test_import_next_to_importer(self):
+        self.write('lib/kit.tune', 'import "drums.tune"; let snare = count + 1 in 0 end')
+        self.write('drums.tune', 'let count = 1 in 0 end')   # not this one
+        cwd = os.getcwd()
+        os.chdir(tempfile.gettempdir())
+        try:
+            self.assertEqual(self.run_program('import "lib/kit.tune"; snare'), 8)
+        finally:
+            os.chdir(cwd)
+
+    def test_import_shadows_outer_names_on_every_engine(self):
+        self.write('m.mus', 'let x = 100 in letfun g(n) = n * 2 in 0 end end')
+        for src, value in [('let x = 1 in (import "m.mus"; x) end', 100),
+                           ('letfun g(n) = n in (import "m.mus"; g(5)) end', 10),
+                           ('letfun g(n) = n in (import "m.mus"; letfun h(k) = g(k) in h(4) end) end', 8),
+                           ('let x = 1 in (import "m.mus"; x := 5; x) + x end', 6),
+                           ('let x = 1 in (x; import "m.mus"; (import "m.mus"; x)) end', 100),
+                           ('let y = 1 in (import "m.mus"; y := y + 1; y) end', 2),
+                           ('letfun f(k) = if k == 0 then 0 else (import "m.mus"; k + f(k - 1)) in f(3) end', 6),
+                           ('let a = 2 in letfun f(k) = k * a in (import "m.mus"; f(3) + a) end end', 8)]:
+            for engine in ('tree', 'closure', 'vm', 'python', 'frames', 'stack'):
+                with self.subTest(src=src, engine=engine):
+                    self.assertEqual(evaluate(parse_to_ast(src), engine), value)
+
+    def test_errors(self):
+        self.write('a.tune', 'import "b.tune"')
+        self.write('b.tune', 'import "a.tune"')
+        self.write('broken.tune', 'let x = in x end')
+        for src, message in [('import "a.tune"; 1', 'circular'), ('import "nope.tune"; 1', 'cannot find'),
+                             ('import "broken.tune"; 1', 'parse error')]:
+            with self.subTest(src=src), self.assertRaisesRegex(EvalError, message):
+                self.run_program(src)
+
+    def test_stream_driver_keeps_imports(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            stream_driver(['import "lib/drums.tune";\n', 'show count;\n', 'count'])
+        self.assertEqual(out.getvalue().split(), ["7", "Result:", "7"])
+
+
+class TestModuleCache(ModuleTest):
+    def test_parsed_once(self):
+        for _ in range(3):
+            self.run_program('import "lib/drums.tune"; count')
+        self.assertEqual((module_cache().stats.misses, module_cache().stats.hits), (1, 2))
+
+    def test_changed_module_is_reparsed(self):
+        self.run_program('import "lib/drums.tune"; count')
+        self.write('lib/drums.tune', 'let count = 9 in 0 end')
+        self.assertEqual(self.run_program('import "lib/drums.tune"; count'), 9)
+        self.assertEqual(module_cache().stats.misses, 2)
+
+    def test_disk_cache_survives_restart(self):
+        self.run_program('import "lib/drums.tune"; count')
+        with mock.patch.object(modules, '_cache', None):
+            self.assertEqual(self.run_program('import "lib/drums.tune"; count'), 7)
+            self.assertEqual((module_cache().stats.disk_hits, module_cache().stats.misses), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# testing constant folding
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import Lit, Add, Div, Name, Let, Letfun, If, Ifnz, Note, Tune, Transpose, Block, \
+        Import, evaluate
+    from optimize import optimize, size
+    from parse_run import parse_to_ast
+    import engine_tests
+    from engine_tests import outcome
+    import test_phase1_core
+
+
+def run_optimized(expr):
+    return evaluate(optimize(expr)[0])
+
+
+class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+    '''The core-language suite again, on optimized programs'''
+    engine = staticmethod(run_optimized)
+
+
+class TestOptimize(engine_tests.SameAsTree, unittest.TestCase):
+    engine = staticmethod(run_optimized)
+
+    def folds(self, src, expected, removed):
+        self.assertEqual(optimize(parse_to_ast(src)), (expected, removed), src)
+
+    def test_folding(self):
+        self.folds("2 * 24", Lit(48), 2)
+        self.folds("(1 < 2) && !false", Lit(True), 5)
+        self.folds("if true then 1 + 2 else 1 / 0", Lit(3), 7)
+        self.folds("let x = 5 in x + 1 end", Lit(6), 4)
+        self.folds("false && y", Lit(False), 2)
+
+    def test_partial(self):
+        expr, removed = optimize(parse_to_ast("letfun f(n) = n + 2 * 3 in f(1 + 1) end"))
+        self.assertEqual(expr, parse_to_ast("letfun f(n) = n + 6 in f(2) end"))
+        self.assertEqual(removed, 4)
+        self.assertEqual(size(expr), size(parse_to_ast("letfun f(n) = n + 6 in f(2) end")))
+
+    def test_errors_kept(self):
+        for src in ["1 / 0", "1 + true", "if 3 then 1 else 2", "-true", "!1", "1 && true", "true && 1",
+                    "let x = 0 in 1 / x end", "1 < true"]:
+            expr = parse_to_ast(src)
+            with self.subTest(src=src):
+                optimized, _ = optimize(expr)
+                self.assertEqual(outcome('tree', optimized), outcome('tree', expr))
+                self.assertEqual(outcome('tree', optimized)[0], "EvalError")
+        expr = Add(Div(Lit(1), Lit(0)), Add(Lit(1), Lit(2)))
+        self.assertEqual(optimize(expr), (Add(Div(Lit(1), Lit(0)), Lit(3)), 2))
+
+    def test_ifnz_keeps_its_check(self):
+        self.assertEqual(optimize(Ifnz(Lit(1), Lit(2), Name("y"))), (Lit(2), 3))
+        expr = Ifnz(Lit(0), Name("y"), Let("t", Lit(1), Tune((), Name("t"))))
+        optimized, removed = optimize(expr)
+        self.assertEqual(optimized, Ifnz(Lit(0), Lit(0), Tune((), Lit(1))))
+        self.assertEqual(removed, 2)
+        self.assertEqual(outcome('tree', optimized), ("EvalError", "Ifnz else must be int or bool"))
+        expr = Ifnz(Tune((), Lit(1)), Lit(1), Lit(2))
+        self.assertEqual(optimize(expr), (expr, 0))
+        self.assertEqual(outcome('tree', expr), ("EvalError", "Ifnz condition must be an int"))
+
+    def test_let_inlining(self):
+        # used twice, assigned, shadowed or imported over: not inlined
+        for src in ["let x = 2 in x * x end", "let x = 2 in x := 3; x end",
+                    "let x = 2 in letfun f(y) = x := y in f(1) end; x end"]:
+            expr = parse_to_ast(src)
+            self.assertEqual(optimize(expr), (expr, 0), src)
+        expr = Let("x", Lit(2), Block((Import("lib.tune"), Name("x"))))
+        self.assertEqual(optimize(expr), (expr, 0))
+        self.folds("let x = 1 in let x = 2 in x end end", Lit(2), 4)
+        self.folds("let x = 1 in letfun f(x) = x in f(0) + x end end",
+                   parse_to_ast("letfun f(x) = x in f(0) + 1 end"), 2)
+        self.folds("let x = 1 in letfun x(y) = y in x(0) end end",
+                   parse_to_ast("letfun x(y) = y in x(0) end"), 2)
+
+    def test_checked_node_types_kept(self):
+        # a Tune item or a transposed tune that isn't a Tune or Note is an error, even if it would fold to one
+        item = If(Lit(True), Note("C4", Lit(1)), Note("D4", Lit(1)))
+        expr = Tune((item,), Add(Lit(0), Lit(1)))
+        optimized, removed = optimize(expr)
+        self.assertEqual(optimized, Tune((item,), Lit(1)))
+        self.assertEqual(outcome('tree', optimized), outcome('tree', expr))
+        expr = Transpose(If(Lit(True), Tune((), Lit(1)), Lit(0)), Lit(2))
+        self.assertEqual(optimize(expr)[0], Transpose(If(Lit(True), Tune((), Lit(1)), Lit(0)), Lit(2)))
+        self.assertEqual(outcome(run_optimized, expr), outcome('tree', expr))
+
+    def test_block(self):
+        self.folds("1; 2 + 3; y", Name("y"), 5)
+        expr = Block((Import("lib.tune"), Lit(1), Name("y")))
+        self.assertEqual(optimize(expr), (Block((Import("lib.tune"), Name("y"))), 1))
+
+    def test_unchanged_subtrees_shared(self):
+        expr = parse_to_ast("letfun f(n) = n * n in f(3) + (1 + 2) end")
+        optimized, _ = optimize(expr)
+        self.assertIs(optimized.bodyexpr, expr.bodyexpr)
+        expr = parse_to_ast("f(x) + y")
+        self.assertIs(optimize(expr)[0], expr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# testing batch parsing across a process pool
+
+import pickle
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from parse_batch import parse_many, parse_parallel, _chunks
+    from parse_run import parse_to_ast, ParseError, AmbiguousParse, cooking
+    from pratt import ParseErrorAt
+
+
+SOURCES = [f"show tune [ note C4 for {i} seconds ] ({i})" for i in range(1, 40)] + \
+          ["1 +", "x := 1; show x", "let y = 2 in y end", "tune [ note H4 for 1 seconds ] (1)"]
+
+
+class TestParseMany(unittest.TestCase):
+    def check(self, outcomes, engine='lalr'):
+        self.assertEqual(len(outcomes), len(SOURCES))
+        for source, outcome in zip(SOURCES, outcomes):
+            try:
+                expected = parse_to_ast(source, engine)
+            except ParseError:
+                self.assertFalse(outcome.ok)
+                self.assertIsInstance(outcome.error, ParseError)
+                self.assertIsNone(outcome.ast)
+            else:
+                self.assertTrue(outcome.ok)
+                self.assertEqual(outcome.ast, expected)
+
+    def test_in_process(self):
+        self.check(parse_many(SOURCES, workers=1))
+
+    def test_pool_keeps_order(self):
+        self.check(parse_many(SOURCES, workers=2, chunksize=5))
+
+    def test_pool_other_engines(self):
+        for engine in ('earley', 'pratt'):
+            with self.subTest(engine=engine):
+                self.check(parse_many(SOURCES, workers=2, engine=engine, chunksize=8), engine)
+
+    def test_error_offsets_survive(self):
+        outcomes = parse_many(["1 +", "2 * 3"], workers=2, engine='pratt', chunksize=1)
+        self.assertIsInstance(outcomes[0].error, ParseErrorAt)
+        self.assertEqual(outcomes[0].error.offset, 3)
+        self.assertTrue(outcomes[1].ok)
+
+    def test_ambiguous_is_per_item(self):
+        outcome = parse_many(["1"], workers=1)[0]
+        self.assertTrue(outcome.ok)
+        self.assertIsInstance(pickle.loads(pickle.dumps(AmbiguousParse())), AmbiguousParse)
+
+    def test_empty(self):
+        self.assertEqual(parse_many([], workers=4), [])
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            parse_many(SOURCES, workers=0)
+        with self.assertRaises(ValueError):
+            parse_many(SOURCES, workers=2, engine='nope')
+
+
+class TestParseParallel(unittest.TestCase):
+    PROGRAMS = [
+        "; ".join(f"x := x + {i}; show tune [ note C4 for {i} seconds ] (x)" for i in range(1, 200)),
+        "(a; b); c; (d; e)",
+        "a; (b; c)",
+        "if a then b; c else note R for 1 seconds; show 1",
+        "if a then b; c elsenote R for 1 seconds; show 1",   # the scan misses this ';'
+        "x; if c then 1 elsenote C4 for 1 seconds; y; z; w",   # and here, mid-source
+        "let y = 1 in y; y end",
+        cooking,
+    ]
+
+    def test_same_as_serial(self):
+        for src in self.PROGRAMS:
+            for engine in ('lalr', 'pratt'):
+                with self.subTest(src=src[:30], engine=engine):
+                    try:
+                        expected = parse_to_ast(src, engine)
+                    except ParseError:
+                        with self.assertRaises(ParseError):
+                            parse_parallel(src, workers=2, engine=engine, segment_chars=40)
+                    else:
+                        self.assertEqual(parse_parallel(src, workers=2, engine=engine, segment_chars=40),
+                                         expected)
+
+    def test_missed_split_in_one_segment_is_not_nested(self):
+        # the scan takes "if ... elsenote ...; y" for one statement, which parses to a Block
+        src = "x; if c then 1 elsenote C4 for 1 seconds; y; z; w"
+        self.assertEqual(parse_parallel(src, workers=2, segment_chars=1), parse_to_ast(src))
+
+    def test_error_is_the_full_parse_error(self):
+        src = "show 1; show 2; show (3; show 4"
+        with self.assertRaises(ParseError) as serial:
+            parse_to_ast(src)
+        with self.assertRaises(ParseError) as parallel:
+            parse_parallel(src, workers=2, segment_chars=1)
+        self.assertEqual(str(parallel.exception), str(serial.exception))
+
+
+class TestChunks(unittest.TestCase):
+    def test_by_count(self):
+        self.assertEqual([len(c) for c in _chunks(["a"] * 10, 4, 10**6)], [4, 4, 2])
+
+    def test_by_size(self):
+        self.assertEqual([len(c) for c in _chunks(["a" * 10] * 5, 100, 25)], [3, 2])
+        self.assertEqual([len(c) for c in _chunks(["a" * 100, "b"], 100, 25)], [1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# testing the content-hash parse cache
+
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    import ast_codec
+    import parse_run
+    from parse_cache import ParseCache, GRAMMAR_FILES
+    from parse_run import parse_to_ast, ParseError
+
+
+def song(instrument: int) -> str:
+    return f"show tune [ note C4 for 1 seconds, volume(note D4 for 2 seconds, 90) ] ({instrument})"
+
+
+class TestParseCache(unittest.TestCase):
+    def test_hit_returns_same_ast(self):
+        cache = ParseCache()
+        first = cache.parse(song(1))
+        second = cache.parse(song(1))
+        self.assertIs(first, second)
+        self.assertEqual(first, parse_to_ast(song(1)))
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+    def test_different_source_misses(self):
+        cache = ParseCache()
+        a = cache.parse(song(1))
+        b = cache.parse(song(2))
+        self.assertNotEqual(a, b)
+        self.assertEqual(cache.stats.misses, 2)
+
+    def test_lru_by_entries(self):
+        cache = ParseCache(max_entries=2)
+        cache.parse(song(1))
+        cache.parse(song(2))
+        cache.parse(song(1))       # song(2) is now least recently used
+        cache.parse(song(3))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats.evictions, 1)
+        cache.parse(song(1))
+        self.assertEqual(cache.stats.hits, 2)
+        cache.parse(song(2))
+        self.assertEqual(cache.stats.misses, 4)
+
+    def test_lru_by_bytes(self):
+        cache = ParseCache(max_entries=None, max_bytes=1)
+        cache.parse(song(1))
+        cache.parse(song(2))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats.evictions, 2)
+        big = ParseCache(max_entries=None, max_bytes=10**6)
+        big.parse(song(1))
+        big.parse(song(2))
+        self.assertEqual(len(big), 2)
+        self.assertGreater(big.size_bytes, 0)
+
+    def test_parse_errors_not_cached(self):
+        cache = ParseCache()
+        for _ in range(2):
+            with self.assertRaises(ParseError):
+                cache.parse("1 +")
+        self.assertEqual((len(cache), cache.stats.misses), (0, 2))
+
+    def test_engine_is_part_of_key(self):
+        cache = ParseCache()
+        other = ParseCache(engine='earley')
+        self.assertNotEqual(cache.key("x"), other.key("x"))
+
+    def test_codec_version_is_part_of_key(self):
+        key = ParseCache().key("x")
+        with mock.patch('ast_codec.VERSION', ast_codec.VERSION + 1):
+            self.assertNotEqual(ParseCache().key("x"), key)
+
+
+class TestDiskTier(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_survives_restart(self):
+        ParseCache(disk_dir=self.dir).parse(song(5))
+        restarted = ParseCache(disk_dir=self.dir)
+        ast = restarted.parse(song(5))
+        self.assertEqual(ast, parse_to_ast(song(5)))
+        self.assertEqual((restarted.stats.disk_hits, restarted.stats.misses), (1, 0))
+        restarted.parse(song(5))
+        self.assertEqual(restarted.stats.hits, 1)
+
+    def test_corrupt_entry_is_reparsed(self):
+        cache = ParseCache(disk_dir=self.dir)
+        cache.parse(song(5))
+        for f in self.dir.rglob('*.ast'):
+            f.write_bytes(b'not an ast')
+        restarted = ParseCache(disk_dir=self.dir)
+        self.assertEqual(restarted.parse(song(5)), parse_to_ast(song(5)))
+        self.assertEqual(restarted.stats.misses, 1)
+        self.assertEqual(ParseCache(disk_dir=self.dir).parse(song(5)), parse_to_ast(song(5)))
+
+    def test_grammar_change_invalidates(self):
+        ParseCache(disk_dir=self.dir).parse(song(5))
+        grammars = self.dir / 'grammars'
+        grammars.mkdir()
+        for name in GRAMMAR_FILES:
+            shutil.copy(parse_run.GRAMMAR_DIR / name, grammars)
+        with open(grammars / 'expr_lalr.lark', 'a') as f:
+            f.write('\n// edited\n')
+        with mock.patch.object(parse_run, 'GRAMMAR_DIR', grammars):
+            restarted = ParseCache(disk_dir=self.dir)
+        restarted.parse(song(5))
+        self.assertEqual((restarted.stats.disk_hits, restarted.stats.misses), (0, 1))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# testing the on-disk cache of built LALR parsers
+
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    import parse_run
+    from parse_run import load_lalr, genAST, ToExpr
+
+
+class TestParserCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        shutil.copy(parse_run.GRAMMAR_DIR / 'expr_lalr.lark', self.tmp)
+        self.saved = parse_run.GRAMMAR_DIR, parse_run.PARSER_CACHE_DIR
+        parse_run.GRAMMAR_DIR = self.tmp
+        parse_run.PARSER_CACHE_DIR = self.tmp / 'cache'
+
+    def tearDown(self):
+        parse_run.GRAMMAR_DIR, parse_run.PARSER_CACHE_DIR = self.saved
+        shutil.rmtree(self.tmp)
+
+    def cache_files(self):
+        return sorted(p.name for p in parse_run.PARSER_CACHE_DIR.glob('*.lark'))
+
+    def test_build_writes_cache(self):
+        load_lalr('expr_lalr.lark')
+        self.assertEqual(len(self.cache_files()), 1)
+
+    def test_cached_parser_parses_the_same(self):
+        fresh = load_lalr('expr_lalr.lark')
+        cached = load_lalr('expr_lalr.lark')
+        s = "letfun f(x) = x * 2 in show f(3); tune [ note C4 for 1 seconds ] (1) end"
+        self.assertEqual(genAST(cached.parse(s)), genAST(fresh.parse(s)))
+
+    def test_cache_hit_skips_build(self):
+        load_lalr('expr_lalr.lark')
+        build = parse_run.build_lalr
+        def fail(grammar):
+            raise AssertionError("parser was rebuilt")
+        parse_run.build_lalr = fail
+        try:
+            # nor does lark itself rebuild it from the grammar
+            with mock.patch('lark.lark.load_grammar', side_effect=AssertionError("grammar was reloaded")):
+                p = load_lalr('expr_lalr.lark')
+                ast_parser = load_lalr('expr_lalr.lark', transformer=ToExpr())
+        finally:
+            parse_run.build_lalr = build
+        self.assertEqual(genAST(p.parse("x")), parse_run.Name("x"))
+        self.assertEqual(ast_parser.parse("1 + x"), parse_run.Add(parse_run.Lit(1), parse_run.Name("x")))
+
+    def test_grammar_change_invalidates(self):
+        load_lalr('expr_lalr.lark')
+        first = self.cache_files()
+        with open(self.tmp / 'expr_lalr.lark', 'a') as f:
+            f.write('\n// edited\n')
+        load_lalr('expr_lalr.lark')
+        self.assertEqual(len(self.cache_files()), 2)
+        self.assertNotEqual(first, self.cache_files())
+
+    def test_conflicts_are_never_cached(self):
+        # expr.lark's open-ended transpose operand is ambiguous under LALR
+        shutil.copy(self.saved[0] / 'expr.lark', self.tmp)
+        for attempt in range(2):
+            with self.subTest(attempt=attempt), self.assertRaises(parse_run.GrammarConflict):
+                load_lalr('expr.lark')
+        self.assertEqual(self.cache_files(), [])
+
+    def test_corrupt_cache_is_rebuilt(self):
+        load_lalr('expr_lalr.lark')
+        name, = self.cache_files()
+        (parse_run.PARSER_CACHE_DIR / name).write_bytes(b'garbage')
+        p = load_lalr('expr_lalr.lark')
+        self.assertEqual(genAST(p.parse("1 + 2")), parse_run.Add(parse_run.Lit(1), parse_run.Lit(2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# testing the hand-written parser (pratt.py) against the Earley one
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from parse_run import parse_to_ast, ParseError
+    from pratt import parse_pratt, ParseErrorAt
+    import test2
+    import test3
+    import test_lalr
+
+
+class PrattSameAsEarley(test_lalr.SameAsEarley):
+    def engine_parse(self, concrete:str):
+        return parse_to_ast(concrete, 'pratt')
+
+class TestPrattMilestone2(PrattSameAsEarley, test2.TestParsing):
+    pass
+
+class TestPrattMilestone3(PrattSameAsEarley, test3.TestParsing):
+    pass
+
+class TestPrattDSL(PrattSameAsEarley, test_lalr.TestLalrDSL):
+    def test_concat_chain_rejected(self):
+        t = "tune [ note C4 for 1 seconds ] (1)"
+        with self.assertRaises(ParseError):
+            parse_pratt(f"{t} ++ {t} ++ {t}")
+
+    def test_pitch_names_are_still_ids(self):
+        self.assertEqual(parse_pratt("let C4 = 1 in note C4 for C4 seconds end"),
+                         parse_to_ast("let C4 = 1 in note C4 for C4 seconds end"))
+
+    def test_cooking(self):
+        with redirect_stdout(None):
+            import parse_run
+        self.assertEqual(parse_pratt(parse_run.cooking), parse_to_ast(parse_run.cooking))
+
+
+class TestPrattErrors(unittest.TestCase):
+    def offset(self, source: str) -> int:
+        with self.assertRaises(ParseErrorAt) as cm:
+            parse_pratt(source)
+        return cm.exception.offset
+
+    def test_offset_of_bad_token(self):
+        self.assertEqual(self.offset("1 + * 2"), 4)
+        self.assertEqual(self.offset("let x = 1 in x"), 14)   # missing `end` at end of input
+
+    def test_offset_is_in_bytes(self):
+        self.assertEqual(self.offset("let é = 1 in 2 end"), 4)
+        self.assertEqual(self.offset("(1 + 2) ♪"), 8)
+        self.assertEqual(self.offset("1 + 2 ♪ + 3"), 6)
+
+    def test_message_names_offset(self):
+        with self.assertRaises(ParseErrorAt) as cm:
+            parse_pratt("note H4 for 1 seconds")
+        self.assertIn("at byte 5", str(cm.exception))
+
+    def test_reserved_word_as_name(self):
+        self.assertEqual(self.offset("let tune = 1 in 2 end"), 4)
+
+    def test_non_associative_comparison(self):
+        self.assertEqual(self.offset("x < y < z"), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
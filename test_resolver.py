@@ -0,0 +1,109 @@
+# testing lexical addressing and frame-based evaluation
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import Lit, Add, Name, Let, Letfun, App, Assign, Block, Import, \
+        lookupEnv, extendEnv, emptyEnv
+    from resolver import Local, SetLocal, BindLocal, LocalFun, resolve, evalResolved
+    from hashcons import Interner
+    from parse_run import parse_to_ast
+    import engine_tests
+    from engine_tests import outcome
+    import test_phase1_core
+
+
+class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+    '''The core-language suite again, run on resolved frames'''
+    engine = 'frames'
+
+
+class TestResolve(unittest.TestCase):
+    def test_addresses(self):
+        # x is in the program's frame, n in f's, so from f's body x is 1 frame out
+        program = resolve(parse_to_ast("let x = 1 in letfun f(n) = n + x in f(2) end end"))
+        self.assertEqual(program.size, 3)   # the parent link, x and f
+        let = program.expr
+        self.assertIsInstance(let, BindLocal)
+        self.assertEqual(let.slot, 1)
+        fun = let.bodyexpr
+        self.assertIsInstance(fun, LocalFun)
+        self.assertEqual((fun.slot, fun.size), (2, 2))
+        self.assertEqual(fun.bodyexpr, Add(Local(0, 1, "n"), Local(1, 1, "x")))
+        self.assertEqual(fun.inexpr, App(Local(0, 2, "f"), Lit(2)))
+
+    def test_shadowing_gets_new_slot(self):
+        program = resolve(parse_to_ast("let x = 1 in let x = x + 1 in x end end"))
+        inner = program.expr.bodyexpr
+        self.assertEqual(inner.defnexpr, Add(Local(0, 1, "x"), Lit(1)))
+        self.assertEqual(inner.bodyexpr, Local(0, 2, "x"))
+
+    def test_assign(self):
+        program = resolve(Let("x", Lit(1), Block((Assign("x", Lit(2)), Assign("y", Lit(3))))))
+        first, second = program.expr.bodyexpr.stmts
+        self.assertEqual(first, SetLocal(0, 1, "x", Lit(2)))
+        self.assertEqual(second, Assign("y", Lit(3)))   # not bound in the program
+
+    def test_free_names_unchanged(self):
+        expr = Add(Name("a"), Lit(1))
+        self.assertIs(resolve(expr).expr, expr)
+
+    def test_names_an_import_may_shadow_stay_names(self):
+        program = resolve(parse_to_ast('let y = 2 in let x = 1 in (import "m.mus"; x + y) end end'))
+        outer = program.expr
+        self.assertIsInstance(outer, Let)
+        self.assertIsInstance(outer.bodyexpr, Let)
+        self.assertEqual(outer.bodyexpr.bodyexpr.stmts[1], Add(Name("x"), Name("y")))
+        program = resolve(parse_to_ast('(let x = 1 in x end; import "m.mus"; x)'))
+        self.assertIsInstance(program.expr.stmts[0], BindLocal)   # the import is after its scope
+        fun = resolve(parse_to_ast('letfun f(n) = (import "m.mus"; n) in f(1) end')).expr
+        self.assertIsInstance(fun, Letfun)
+        self.assertEqual(fun.inexpr, App(Name("f"), Lit(1)))
+
+    def test_shared_subtrees(self):
+        # after hash-consing both Name("x")s are one node, but they resolve to different slots
+        expr = Interner().intern(parse_to_ast("let x = 1 in (let x = 2 in x end) + x end"))
+        self.assertEqual(evalResolved(resolve(expr)), 3)
+
+
+class TestEvalResolved(engine_tests.SameAsTree, unittest.TestCase):
+    engine = 'frames'
+
+    def test_closures_share_variables(self):
+        expr = parse_to_ast("let x = 5 in letfun g(y) = x := x + y in g(1); g(2); x end end")
+        self.assertEqual(outcome('frames', expr), 8)
+        expr = parse_to_ast("letfun mk(x) = letfun get(u) = x in get end in mk(1)(0) + mk(2)(0) end")
+        self.assertEqual(outcome('frames', expr), outcome('tree', expr))
+
+    def test_environment_for_free_names(self):
+        program = resolve(Let("y", Lit(1), Add(Name("x"), Name("y"))))
+        self.assertEqual(evalResolved(program, (("x", [41]),)), 42)
+        self.assertEqual(outcome('frames', Name("x")), ("EvalError", "unbound Name: x"))
+
+    def test_import(self):
+        for expr in [Import("no/such/module.tune"), Block((Lit(1), Import("no/such/module.tune")))]:
+            self.assertEqual(outcome('frames', expr), outcome('tree', expr))
+
+    def test_deep_environment(self):
+        lets = " ".join(f"let x{i} = {i} in" for i in range(500))
+        expr = parse_to_ast(lets + " x0 + x499" + " end" * 500)
+        self.assertEqual(outcome('frames', expr), 499)
+
+
+class TestLookupEnv(unittest.TestCase):
+    def test_innermost_binding(self):
+        env = extendEnv("x", 2, extendEnv("y", 3, extendEnv("x", 1, emptyEnv)))
+        self.assertEqual(lookupEnv("x", env), 2)
+        self.assertEqual(lookupEnv("y", env), 3)
+        self.assertIsNone(lookupEnv("z", env))
+
+    def test_long_environment(self):
+        env = emptyEnv
+        for i in range(5000):   # deeper than the recursion limit
+            env = extendEnv(f"x{i}", i, env)
+        self.assertEqual(lookupEnv("x0", env), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
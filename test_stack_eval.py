@@ -0,0 +1,58 @@
+# testing the explicit-stack evaluator
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import Lit, Add, Sub, Name, Let, Letfun, App, Note, Tune, Block, Import, evalInEnv
+    from stack_eval import evalIterative
+    from parse_run import parse_to_ast
+    import engine_tests
+    from engine_tests import outcome
+    import test_phase1_core
+
+
+class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+    '''The core-language suite again, run without recursion'''
+    engine = 'stack'
+
+
+class TestEvalIterative(engine_tests.SameAsTree, unittest.TestCase):
+    engine = 'stack'
+
+    def test_deep_add_chain(self):
+        expr = Lit(0)
+        for i in range(1, 10001):
+            expr = Add(expr, Lit(i))
+        self.assertEqual(evalIterative(expr), 10000 * 10001 // 2)
+        with self.assertRaises(RecursionError):
+            evalInEnv((), expr)
+
+    def test_deep_recursion(self):
+        expr = parse_to_ast("letfun f(n) = if n == 0 then 0 else 1 + f(n - 1) in f(5000) end")
+        self.assertEqual(evalIterative(expr), 5000)
+        with self.assertRaises(RecursionError):
+            evalInEnv((), expr)
+
+    def test_order_of_errors(self):
+        # the left operand's error wins, and the right one isn't evaluated
+        self.assertEqual(outcome('stack', Add(Name("a"), Name("b"))), ("EvalError", "unbound Name: a"))
+        self.assertEqual(outcome('stack', parse_to_ast("false && x")), False)
+        self.assertEqual(outcome('stack', parse_to_ast("true || x")), True)
+        for instrument in [500, 5]:
+            expr = Tune((Note("H9", Lit(1)),), Lit(instrument))
+            self.assertEqual(outcome('stack', expr), outcome('tree', expr))
+
+    def test_closures_shared_with_evalInEnv(self):
+        fun = evalInEnv((), Letfun("f", "x", Sub(Name("x"), Lit(1)), Name("f")))
+        self.assertEqual(evalIterative(App(Name("g"), Lit(5)), (("g", [fun]),)), 4)
+
+    def test_block_environment(self):
+        expr = Block((Let("x", Lit(1), Name("x")), Lit(2)))
+        self.assertEqual(evalIterative(expr), 2)
+        for expr in [Import("no/such/module.tune"), Block((Lit(1), Import("no/such/module.tune")))]:
+            self.assertEqual(outcome('stack', expr), outcome('tree', expr))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# testing streaming parse-and-run of top-level statements
+
+import io
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from statements import StatementSplitter, split_stream, statement_spans
+    from parse_run import stream_driver, cooking
+    import interp
+    from interp import extendEnv, newLoc, emptyEnv
+
+
+SCRIPT = '''x := 1; show tune [ note C4 for 1 seconds, notes "D4:1 E4:1" ] (1);
+let y = 2 in y; y end; if a then b; c else d; elsewhere; endless := "a;b";
+show track [ tune [note A4 for 1 seconds](2) ]'''
+
+
+def chunked(text: str, sizes: list[int]):
+    pos = 0
+    for n in sizes:
+        yield text[pos:pos + n]
+        pos += n
+    yield text[pos:]
+
+
+class TestSplitter(unittest.TestCase):
+    def expected(self, text):
+        return [text[s:e] for s, e in statement_spans(text)]
+
+    def test_whole_text(self):
+        self.assertEqual(list(split_stream([SCRIPT])), self.expected(SCRIPT))
+
+    def test_any_chunking(self):
+        rng = random.Random(12)
+        for _ in range(200):
+            sizes = [rng.randint(0, 12) for _ in range(rng.randint(0, 40))]
+            self.assertEqual(list(split_stream(chunked(SCRIPT, sizes))), self.expected(SCRIPT))
+
+    def test_one_character_at_a_time(self):
+        self.assertEqual(list(split_stream(SCRIPT)), self.expected(SCRIPT))
+
+    def test_statement_ready_at_its_semicolon(self):
+        splitter = StatementSplitter()
+        self.assertEqual(splitter.feed("show 1"), [])
+        self.assertEqual(splitter.feed("; show (2"), ["show 1"])
+        self.assertEqual(splitter.feed("; 3)"), [])
+        self.assertEqual(splitter.feed(";"), [" show (2; 3)"])
+        self.assertEqual(splitter.close(), "")
+
+    def test_keeps_only_current_statement(self):
+        splitter = StatementSplitter()
+        for _ in range(1000):
+            splitter.feed("show 12345; ")
+        self.assertLess(len(splitter.buffer), 20)
+
+
+class TestStreamDriver(unittest.TestCase):
+    def run_stream(self, chunks, env=emptyEnv) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            stream_driver(chunks, env=env)
+        return out.getvalue()
+
+    def test_output_before_input_ends(self):
+        out = io.StringIO()
+        def lines():
+            yield "show 1;\n"
+            self.assertEqual(out.getvalue(), "1\n")   # ran before the next line was read
+            yield "show 2;\n"
+            yield "3"
+        with redirect_stdout(out):
+            stream_driver(lines())
+        self.assertEqual(out.getvalue(), "1\n2\nResult: 3\n\n")
+
+    def test_env_carries_over(self):
+        env = extendEnv("x", newLoc(0), emptyEnv)
+        out = self.run_stream(["x := x + 1; sh", "ow x; x := x * 10;", " show x; x"], env)
+        self.assertEqual(out.split(), ["1", "10", "Result:", "10"])
+
+    def test_stops_at_parse_error(self):
+        out = self.run_stream(["show 1; show (; show 2"])
+        self.assertTrue(out.startswith("1\nparse error:"))
+        self.assertNotIn("\n2\n", out)
+
+    def test_stops_at_eval_error(self):
+        out = self.run_stream(["show 1; 1 + true; show 2"])
+        self.assertEqual(out.split()[:2], ["1", "ERROR:"])
+        self.assertNotIn("\n2\n", out)
+
+    def test_song(self):
+        # show writes the MIDI file and opens it in a viewer (os.startfile, Windows only)
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(interp, 'FILENAME', os.path.join(tmp, 'song.midi')), \
+                mock.patch.object(interp.os, 'startfile', create=True) as startfile:
+            out = self.run_stream(cooking.splitlines(keepends=True))
+        self.assertNotIn("error", out.lower())
+        self.assertTrue(startfile.called)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+# testing that evalInEnv runs tail calls without nesting Python calls
+
+import sys
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import EvalError, Lit, Ifnz, Letfun, App, Name, evaluate
+    from parse_run import parse_to_ast
+
+
+class TestTailCalls(unittest.TestCase):
+    def setUp(self):
+        # deeper than the recursion limit, so only a loop gets through
+        self.depth = sys.getrecursionlimit() * 10
+
+    def test_tail_recursion(self):
+        expr = parse_to_ast(f"letfun f(n) = if n == 0 then 42 else f(n - 1) in f({self.depth}) end")
+        self.assertEqual(evaluate(expr), 42)
+
+    def test_accumulator(self):
+        src = f"letfun f(n) = if n == 0 then 0 else (total := total + n; f(n - 1)) in f({self.depth}) end"
+        expr = parse_to_ast(f"let total = 0 in {src}; total end")
+        self.assertEqual(evaluate(expr), self.depth * (self.depth + 1) // 2)
+
+    def test_tail_call_in_let_body(self):
+        expr = parse_to_ast("letfun f(n) = if n == 0 then true else let m = n - 1 in f(m) end "
+                            f"in f({self.depth}) end")
+        self.assertEqual(evaluate(expr), True)
+
+    def test_non_tail_recursion_still_nests(self):
+        expr = parse_to_ast(f"letfun f(n) = if n == 0 then 0 else 1 + f(n - 1) in f({self.depth}) end")
+        self.assertRaises(RecursionError, evaluate, expr)
+
+    def test_ifnz_checks_innermost_branch(self):
+        # f's Ifnz is reached from the outer one's then branch; its else branch is the bad one
+        f = Letfun("f", "x", Ifnz(Name("x"), Lit(1), Lit("no")), App(Name("f"), Lit(0)))
+        with self.assertRaises(EvalError) as cm:
+            evaluate(Ifnz(Lit(1), f, Lit(0)))
+        self.assertEqual(str(cm.exception), "Ifnz else must be int or bool")
+        g = Letfun("g", "x", Name("x"), App(Name("g"), Lit(7)))
+        self.assertEqual(evaluate(Ifnz(Lit(1), g, Lit(0))), 7)
+        with self.assertRaises(EvalError) as cm:
+            evaluate(Ifnz(Lit(0), Lit(0), Lit("no")))
+        self.assertEqual(str(cm.exception), "Ifnz else must be int or bool")
+
+
+if __name__ == '__main__':
+    unittest.main()
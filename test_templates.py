@@ -0,0 +1,86 @@
+# testing program templates
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from templates import Template
+    from parse_run import parse_to_ast, cooking
+    from interp import Lit, Name, Add, Note, evalInEnv
+
+
+SONG = '''show track [
+    tune [ volume(note C4 for $length seconds, $level), notes "D4:1 E4:1" ] ($instrument),
+    tune [ note R for 4 seconds, repeat(tune [ note A3 for 2 seconds ](18), $times) ] (18)
+];
+transpose tune [ note C4 for 1 seconds ] (1) by $steps'''
+
+VALUES = {'length': 2, 'level': 90, 'instrument': 17, 'times': 3, 'steps': 2}
+
+
+def with_values(source: str, values: dict) -> str:
+    for name, v in values.items():
+        source = source.replace(f"${name}", f"({v})")
+    return source
+
+
+class TestTemplate(unittest.TestCase):
+    def test_params(self):
+        self.assertEqual(Template(SONG).params, frozenset(VALUES))
+
+    def test_same_as_parsing_the_text(self):
+        for engine in ('lalr', 'earley', 'pratt'):
+            with self.subTest(engine=engine):
+                t = Template(SONG, engine)
+                self.assertEqual(t.instantiate(VALUES), parse_to_ast(with_values(SONG, VALUES), engine))
+
+    def test_subtrees_without_holes_are_shared(self):
+        t = Template(SONG)
+        a = t.instantiate(VALUES)
+        b = t.instantiate(VALUES | {'level': 60})
+        tune_a, tune_b = a.stmts[0].expr.tracks, b.stmts[0].expr.tracks
+        self.assertIsNot(tune_a[0], tune_b[0])
+        self.assertIs(tune_a[0].notes[1], tune_b[0].notes[1])            # notes "..." part
+        self.assertIs(tune_a[1].notes[0], t.ast.stmts[0].expr.tracks[1].notes[0])
+        self.assertIs(a.stmts[1].tune, b.stmts[1].tune)
+        self.assertEqual(b.stmts[0].expr.tracks[0].notes[0].level, Lit(60))
+
+    def test_template_unchanged(self):
+        t = Template(SONG)
+        before = repr(t.ast)
+        t.instantiate(VALUES)
+        self.assertEqual(repr(t.ast), before)
+
+    def test_expr_and_bool_values(self):
+        t = Template("if $flag then $x else 0")
+        self.assertEqual(evalInEnv((), t.instantiate({'flag': True, 'x': Add(Lit(1), Lit(2))})), 3)
+        self.assertEqual(evalInEnv((), t.instantiate({'flag': False, 'x': 5})), 0)
+
+    def test_no_holes(self):
+        t = Template(cooking)
+        self.assertIs(t.instantiate({}), t.ast)
+
+    def test_strings_are_not_holes(self):
+        t = Template('tune [ notes "C4:1" ] ($i)')
+        self.assertEqual(t.params, {'i'})
+
+    def test_bad_values(self):
+        t = Template("$a + $b")
+        with self.assertRaisesRegex(ValueError, "b"):
+            t.instantiate({'a': 1})
+        with self.assertRaisesRegex(ValueError, "c"):
+            t.instantiate({'a': 1, 'b': 2, 'c': 3})
+
+    def test_hole_must_be_an_expression(self):
+        with self.assertRaises(ValueError):
+            Template("let $x = 1 in 2 end")
+        with self.assertRaises(ValueError):
+            Template("__hole__x")
+
+    def test_same_hole_twice(self):
+        t = Template("$x * $x")
+        self.assertEqual(evalInEnv((), t.instantiate({'x': 7})), 49)
+
+
+if __name__ == "__main__":
+    unittest.main()
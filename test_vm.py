@@ -0,0 +1,82 @@
+# testing the bytecode compiler and VM
+
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+with redirect_stdout(None), redirect_stderr(None):
+    from interp import EvalError, Lit, Add, Name, Let, Letfun, Note, Tune, Block, Import
+    from vm import Code, BytecodeCache, compile_program, disassemble, execute, OPNAMES
+    from parse_run import parse_to_ast
+    import engine_tests
+    from engine_tests import outcome
+    import test_phase1_core
+
+
+class TestPhase1Core(engine_tests.Phase1Core, test_phase1_core.TestEval):
+    '''The core-language suite again, run on the VM'''
+    engine = 'vm'
+
+
+class TestVM(engine_tests.SameAsTree, unittest.TestCase):
+    engine = 'vm'
+
+    def test_tree_checks_happen_in_order(self):
+        # the bad pitch is only reached after the instrument is checked
+        for instrument in [500, 5]:
+            expr = Tune((Note("H9", Lit(1)),), Lit(instrument))
+            self.assertEqual(outcome('vm', expr), outcome('tree', expr))
+        self.assertEqual(outcome('vm', Let("", Name("y"), Lit(1))), ("EvalError", "Name cannot be empty"))
+
+    def test_recursion_deeper_than_python(self):
+        expr = parse_to_ast("letfun f(n) = if n == 0 then 0 else 1 + f(n - 1) in f(50000) end")
+        self.assertEqual(execute(compile_program(expr)), 50000)
+
+    def test_environment_restored(self):
+        # the Let's binding of x is gone after its body, as is the letfun's f
+        expr = parse_to_ast("let x = 1 in (let x = 2 in x end) + x end")
+        self.assertEqual(execute(compile_program(expr)), 3)
+        expr = Block((Letfun("f", "x", Name("x"), Lit(0)), Name("f")))
+        self.assertEqual(outcome('vm', expr), ("EvalError", "unbound Name: f"))
+
+    def test_initial_environment(self):
+        code = compile_program(Add(Name("x"), Lit(1)))
+        self.assertEqual(execute(code, (("x", [41]),)), 42)
+
+    def test_disassemble(self):
+        code = compile_program(parse_to_ast("letfun f(n) = n * 2 in f(21) end"))
+        listing = disassemble(code)
+        self.assertIn("<program>:", listing)
+        self.assertIn("LETFUN", listing)
+        self.assertIn("f:", listing)
+        self.assertIn("mulValues", listing)
+        self.assertIn("RETURN", listing)
+        self.assertEqual(len(OPNAMES), len(set(OPNAMES)))
+
+    def test_import_outside_block(self):
+        expr = Import("no/such/module.tune")
+        self.assertEqual(outcome('vm', expr), outcome('tree', expr))
+
+
+class TestBytecodeCache(unittest.TestCase):
+    def test_keyed_by_ast(self):
+        cache = BytecodeCache()
+        a = cache.compile(parse_to_ast("1 + 2"))
+        b = cache.compile(parse_to_ast("1+2"))
+        self.assertIsInstance(a, Code)
+        self.assertIs(a, b)
+        self.assertIsNot(a, cache.compile(parse_to_ast("1 + 3")))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 2, 2))
+
+    def test_bounded(self):
+        cache = BytecodeCache(max_entries=2)
+        for i in range(5):
+            cache.compile(Lit(i))
+        self.assertEqual(len(cache), 2)
+        cache.compile(Lit(4))
+        self.assertEqual(cache.hits, 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,463 @@
+# A bytecode compiler and stack VM for Expr programs
+'''
+compile_program() turns an Expr into a Code object: a flat array of
+(opcode, argument) pairs plus the constants and names they refer to. A
+letfun's body is compiled into a Code of its own, which its Closure holds.
+execute() runs a Code with one loop over the instructions, an operand
+stack and a stack of call frames:
+
+    code = compile_program(parse_to_ast(source))
+    print(disassemble(code))
+    execute(code)
+
+or run(expr, engine='vm'). Calls between compiled functions push a frame
+rather than a Python call, so recursion depth is bounded by memory, not by
+Python's recursion limit.
+
+The operators are interp's functions on values, so results and EvalErrors
+are the same as evalInEnv's, raised at the same point of the evaluation. A
+check evalInEnv makes on the unevaluated tree (a Note's pitch, what a Tune
+may contain) is made at compile time and, if it fails, compiled into a FAIL
+instruction that raises its error when it is reached.
+
+BytecodeCache keeps compiled programs keyed by a hash of their AST (its
+ast_codec encoding), so the same program isn't compiled twice.
+'''
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import hashlib
+from typing import Any, Callable
+
+from ast_codec import dump_ast
+from interp import Expr, Env, Loc, Value, EvalError, Lit, Add, Sub, Mul, Div, Neg, And, Or, Not, Let, \
+    Name, Eq, Neq, Lt, LorE, Gt, GorE, If, Ifnz, Letfun, App, Assign, Seq, Block, Import, Show, Read, \
+    Note, Tune, ConcatTunes, Transpose, Repeat, Volume, Track, emptyEnv, extendEnv, newLoc, getLoc, \
+    setLoc, bindLetfun, evalInEnv, evalStatement, addValues, subValues, mulValues, divValues, negValue, \
+    boolOperand, eqValues, neqValues, ltValues, loreValues, gtValues, goreValues, ifCondition, \
+    ifnzCondition, ifnzResult, callee, callEnv, assignableLoc, showValue, readValue, checkPitch, \
+    noteValue, tuneInstrument, checkTuneItem, concatValues, checkTransposable, transposeSteps, \
+    TransposeNote, repeatValue, volumeValue, trackValue
+
+# ----- Instructions ----- #
+# plain ints rather than an IntEnum, as the dispatch loop compares them a lot
+
+OPNAMES = [
+    'CONST',          # push consts[arg]
+    'LOAD',           # push the value of names[arg]
+    'ASSIGNABLE',     # push the location of names[arg], checked by interp.assignableLoc
+    'STORE',          # pop a value and a location, store the value there, push it back
+    'BINARY',         # pop right and left, push BINARY_FUNCTIONS[arg](left, right)
+    'UNARY',          # replace the top value v with UNARY_FUNCTIONS[arg](v)
+    'POP',
+    'JUMP',           # go to instruction arg
+    'JUMP_IF_FALSE',  # pop; go to arg if the value is false (or 0)
+    'JUMP_IF_FALSE_OR_POP',  # go to arg, keeping the top value, if it is false, else pop it
+    'JUMP_IF_TRUE_OR_POP',   # the same, if it is true
+    'BIND',           # save the environment, then bind names[arg] to a popped value
+    'LETFUN',         # save the environment, then bind the function consts[arg] describes
+    'SAVE_ENV',       # save the environment (for a Block's imports)
+    'RESTORE_ENV',    # go back to the last saved environment
+    'IMPORT',         # bring module consts[arg] into the environment, push True
+    'CALL',           # pop an argument and a function and call it
+    'RETURN',         # return the top value to the caller
+    'READ',           # push an integer read from the user
+    'NOTE',           # pop a duration, push the note consts[arg] = (pitch, volume) describes
+    'TUNE',           # pop arg items and an instrument, push the Tune
+    'TRACK',          # pop arg tunes, push the Track
+    'FAIL',           # raise EvalError(consts[arg])
+]
+(CONST, LOAD, ASSIGNABLE, STORE, BINARY, UNARY, POP, JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP,
+ JUMP_IF_TRUE_OR_POP, BIND, LETFUN, SAVE_ENV, RESTORE_ENV, IMPORT, CALL, RETURN, READ, NOTE, TUNE,
+ TRACK, FAIL) = range(len(OPNAMES))
+
+def _transpose(steps: Value, tune: Value) -> Tune:
+    return TransposeNote(tune, steps)
+
+def _andOperand(value: Value) -> bool:
+    return boolOperand(value, "And")
+
+def _orOperand(value: Value) -> bool:
+    return boolOperand(value, "Or")
+
+def _not(value: Value) -> bool:
+    return not boolOperand(value, "Not")
+
+def _ifnzThen(value: Value) -> Value:
+    return ifnzResult(value, "then")
+
+def _ifnzElse(value: Value) -> Value:
+    return ifnzResult(value, "else")
+
+BINARY_FUNCTIONS = [addValues, subValues, mulValues, divValues, eqValues, neqValues, ltValues, loreValues,
+                    gtValues, goreValues, concatValues, repeatValue, volumeValue, _transpose]
+UNARY_FUNCTIONS = [negValue, _not, _andOperand, _orOperand, ifCondition, ifnzCondition, _ifnzThen,
+                   _ifnzElse, showValue, tuneInstrument, transposeSteps, callee]
+
+_BINARY = {Add: addValues, Sub: subValues, Mul: mulValues, Div: divValues, Eq: eqValues, Neq: neqValues,
+           Lt: ltValues, LorE: loreValues, Gt: gtValues, GorE: goreValues, ConcatTunes: concatValues,
+           Repeat: repeatValue, Volume: volumeValue}
+
+@dataclass(eq=False)
+class Code:
+    name: str      # the function's name, or '<program>'
+    code: array = field(default_factory=lambda: array('i'))   # opcode, argument, opcode, argument, ...
+    consts: list = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+
+    def __repr__(self) -> str:
+        return f"<Code {self.name}: {len(self.code) // 2} instructions>"
+
+# ----- Compiler ----- #
+
+class _Compiler:
+    def __init__(self, name: str):
+        self.out = Code(name)
+        self._names: dict[str, int] = {}
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        '''Appends an instruction, returning its index'''
+        self.out.code.extend((op, arg))
+        return len(self.out.code) // 2 - 1
+
+    def patch(self, at: int) -> None:
+        '''Points the jump at instruction index `at` to the next instruction'''
+        self.out.code[2 * at + 1] = len(self.out.code) // 2
+
+    def const(self, value) -> int:
+        self.out.consts.append(value)
+        return len(self.out.consts) - 1
+
+    def name(self, name: str) -> int:
+        if name not in self._names:
+            self._names[name] = len(self.out.names)
+            self.out.names.append(name)
+        return self._names[name]
+
+    def fail(self, message: str) -> None:
+        self.emit(FAIL, self.const(message))
+
+    def compile(self, expr: Expr) -> None:
+        fn = _BINARY.get(type(expr))
+        if fn is not None:
+            left, right = (getattr(expr, f) for f in expr.__match_args__)
+            self.compile(left)
+            self.compile(right)
+            self.emit(BINARY, BINARY_FUNCTIONS.index(fn))
+            return
+
+        match expr:
+            case Lit(v):
+                self.emit(CONST, self.const(v))
+
+            case Neg(e):
+                self.compile(e)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(negValue))
+
+            case Not(e):
+                self.compile(e)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(_not))
+
+            case And(l, r) | Or(l, r):
+                check = _andOperand if isinstance(expr, And) else _orOperand
+                self.compile(l)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(check))
+                jump = self.emit(JUMP_IF_FALSE_OR_POP if isinstance(expr, And) else JUMP_IF_TRUE_OR_POP)
+                self.compile(r)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(check))
+                self.patch(jump)
+
+            case Name(name):
+                self.emit(LOAD, self.name(name))
+
+            case Let(name, defn, body):
+                if name == "":
+                    return self.fail("Name cannot be empty")
+                if not isinstance(name, str):
+                    return self.fail("Name must be a string")
+                self.compile(defn)
+                self.emit(BIND, self.name(name))
+                self.compile(body)
+                self.emit(RESTORE_ENV)
+
+            case If(c, t, e) | Ifnz(c, t, e):
+                nz = isinstance(expr, Ifnz)
+                self.compile(c)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(ifnzCondition if nz else ifCondition))
+                to_else = self.emit(JUMP_IF_FALSE)
+                self.compile(t)
+                if nz:
+                    self.emit(UNARY, UNARY_FUNCTIONS.index(_ifnzThen))
+                to_end = self.emit(JUMP)
+                self.patch(to_else)
+                self.compile(e)
+                if nz:
+                    self.emit(UNARY, UNARY_FUNCTIONS.index(_ifnzElse))
+                self.patch(to_end)
+
+            case Letfun(n, p, b, i):
+                self.emit(LETFUN, self.const((n, p, compile_program(b, n))))
+                self.compile(i)
+                self.emit(RESTORE_ENV)
+
+            case App(f, a):
+                self.compile(f)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(callee))
+                self.compile(a)
+                self.emit(CALL)
+
+            case Assign(n, e1):
+                self.emit(ASSIGNABLE, self.name(n))
+                self.compile(e1)
+                self.emit(STORE)
+
+            case Seq(e1, e2):
+                self.compile(e1)
+                self.emit(POP)
+                self.compile(e2)
+
+            case Block(stmts):
+                imports = any(isinstance(stmt, Import) for stmt in stmts)
+                if imports:
+                    self.emit(SAVE_ENV)
+                for k, stmt in enumerate(stmts):
+                    if k:
+                        self.emit(POP)
+                    if isinstance(stmt, Import):
+                        self.emit(IMPORT, self.const(stmt))
+                    else:
+                        self.compile(stmt)
+                if imports:
+                    self.emit(RESTORE_ENV)
+
+            case Import():
+                self.emit(SAVE_ENV)
+                self.emit(IMPORT, self.const(expr))
+                self.emit(RESTORE_ENV)
+
+            case Show(e):
+                self.compile(e)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(showValue))
+
+            case Read():
+                self.emit(READ)
+
+            # ----- Domain-specific extension (Tunes) ----- #
+            case Note(name, d, volume):
+                try:
+                    checkPitch(name)
+                except EvalError as e:
+                    return self.fail(str(e))
+                self.compile(d)
+                self.emit(NOTE, self.const((name, volume)))
+
+            case Tune(n, ins):
+                if not isinstance(n, tuple):
+                    return self.fail("Tunes must be a list of notes")
+                self.compile(ins)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(tuneInstrument))
+                for note in n:
+                    try:
+                        checkTuneItem(type(note))
+                    except EvalError as e:
+                        return self.fail(str(e))
+                    self.compile(note)
+                self.emit(TUNE, len(n))
+
+            case Transpose(t, s):
+                try:
+                    checkTransposable(type(t))
+                except EvalError as e:
+                    return self.fail(str(e))
+                self.compile(s)
+                self.emit(UNARY, UNARY_FUNCTIONS.index(transposeSteps))
+                self.compile(t)
+                self.emit(BINARY, BINARY_FUNCTIONS.index(_transpose))
+
+            case Track(t):
+                for e in t:
+                    self.compile(e)
+                self.emit(TRACK, len(t))
+
+            case _:
+                self.fail(f"unknown expression: {expr}")
+
+def compile_program(expr: Expr, name: str = '<program>') -> Code:
+    '''The bytecode of expr, ending with RETURN'''
+    c = _Compiler(name)
+    c.compile(expr)
+    c.emit(RETURN)
+    return c.out
+
+# ----- Disassembler ----- #
+
+def disassemble(code: Code) -> str:
+    '''A listing of code and, after it, of the functions it defines'''
+    lines = [f"{code.name}:"]
+    nested = []
+    ops = code.code
+    for i in range(0, len(ops), 2):
+        op, arg = ops[i], ops[i + 1]
+        text = f"{i // 2:5}  {OPNAMES[op]:<22}"
+        if op == CONST:
+            text += f"{arg} ({code.consts[arg]!r})"
+        elif op in (LOAD, ASSIGNABLE, BIND):
+            text += f"{arg} ({code.names[arg]})"
+        elif op == BINARY:
+            text += f"{arg} ({BINARY_FUNCTIONS[arg].__name__})"
+        elif op == UNARY:
+            text += f"{arg} ({UNARY_FUNCTIONS[arg].__name__})"
+        elif op in (JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP):
+            text += f"-> {arg}"
+        elif op == LETFUN:
+            n, p, body = code.consts[arg]
+            text += f"{arg} ({n}({p}))"
+            nested.append(body)
+        elif op in (IMPORT, NOTE, FAIL):
+            text += f"{arg} ({code.consts[arg]})"
+        elif op in (TUNE, TRACK):
+            text += f"{arg}"
+        lines.append(text.rstrip())
+    for body in nested:
+        lines.append("")
+        lines.append(disassemble(body))
+    return "\n".join(lines)
+
+# ----- Execution ----- #
+
+def execute(code: Code, env: Env[Loc[Value]] = emptyEnv) -> Value:
+    '''Runs code in env and returns its value'''
+    stack: list = []
+    saved: list[Env[Loc[Value]]] = []   # environments to go back to
+    frames: list[tuple] = []            # the callers' (code, ip, env, saved depth)
+    binary, unary = BINARY_FUNCTIONS, UNARY_FUNCTIONS
+    ops, consts, names = code.code, code.consts, code.names
+    ip = 0
+    while True:
+        op = ops[ip]
+        arg = ops[ip + 1]
+        ip += 2
+        if op == LOAD:
+            name = names[arg]
+            for n, loc in env:
+                if n == name:
+                    stack.append(getLoc(loc))
+                    break
+            else:
+                raise EvalError(f"unbound Name: {name}")
+        elif op == CONST:
+            stack.append(consts[arg])
+        elif op == BINARY:
+            right = stack.pop()
+            stack[-1] = binary[arg](stack[-1], right)
+        elif op == UNARY:
+            stack[-1] = unary[arg](stack[-1])
+        elif op == JUMP_IF_FALSE:
+            if not stack.pop():
+                ip = 2 * arg
+        elif op == JUMP:
+            ip = 2 * arg
+        elif op == CALL:
+            value = stack.pop()
+            fun = stack.pop()
+            body = fun.body
+            if isinstance(body, Code):
+                frames.append((ops, consts, names, ip, env, len(saved)))
+                env = callEnv(fun, value)
+                ops, consts, names = body.code, body.consts, body.names
+                ip = 0
+            elif callable(body):
+                stack.append(body(callEnv(fun, value)))
+            else:
+                stack.append(evalInEnv(callEnv(fun, value), body))   # e.g. a function from an imported module
+        elif op == RETURN:
+            if not frames:
+                return stack.pop()
+            ops, consts, names, ip, env, depth = frames.pop()
+            del saved[depth:]
+        elif op == BIND:
+            saved.append(env)
+            env = extendEnv(names[arg], newLoc(stack.pop()), env)
+        elif op == RESTORE_ENV:
+            env = saved.pop()
+        elif op == LETFUN:
+            saved.append(env)
+            n, p, body = consts[arg]
+            env = bindLetfun(env, n, p, body)
+        elif op == POP:
+            stack.pop()
+        elif op == JUMP_IF_FALSE_OR_POP:
+            if stack[-1]:
+                stack.pop()
+            else:
+                ip = 2 * arg
+        elif op == JUMP_IF_TRUE_OR_POP:
+            if stack[-1]:
+                ip = 2 * arg
+            else:
+                stack.pop()
+        elif op == ASSIGNABLE:
+            stack.append(assignableLoc(env, names[arg]))
+        elif op == STORE:
+            value = stack.pop()
+            setLoc(stack[-1], value)
+            stack[-1] = value
+        elif op == NOTE:
+            pitch, volume = consts[arg]
+            stack[-1] = noteValue(pitch, stack[-1], volume)
+        elif op == TUNE:
+            items = stack[len(stack) - arg:]
+            del stack[len(stack) - arg:]
+            stack[-1] = Tune(tuple(items), stack[-1] - 1)
+        elif op == TRACK:
+            items = stack[len(stack) - arg:]
+            del stack[len(stack) - arg:]
+            stack.append(trackValue(items))
+        elif op == SAVE_ENV:
+            saved.append(env)
+        elif op == IMPORT:
+            env, value = evalStatement(env, consts[arg])
+            stack.append(value)
+        elif op == READ:
+            stack.append(readValue())
+        elif op == FAIL:
+            raise EvalError(consts[arg])
+        else:
+            raise EvalError(f"bad opcode {op}")
+
+# ----- Cache ----- #
+
+class BytecodeCache:
+    '''Compiled programs, keyed by a hash of their AST; the least recently
+    used ones are dropped beyond max_entries. compiler makes what is cached
+    (a Code by default).'''
+    def __init__(self, max_entries: int = 256, compiler: Callable[[Expr], Any] | None = None):
+        self.max_entries = max_entries
+        self.compiler = compiler or compile_program
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, expr: Expr) -> bytes:
+        return hashlib.sha256(dump_ast(expr)).digest()
+
+    def compile(self, expr: Expr) -> Any:
+        key = self.key(expr)
+        code = self._entries.get(key)
+        if code is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return code
+        self.misses += 1
+        code = self._entries[key] = self.compiler(expr)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return code
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+bytecode_cache = BytecodeCache()